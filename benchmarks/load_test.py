@@ -0,0 +1,173 @@
+# load_test.py - нагрузочный тест сервера
+#
+# Открывает N одновременных соединений, каждое регистрирует своего игрока
+# и выполняет смесь запросов клиента (скорборд, добавление матчей,
+# дельта-синхронизация, профиль). В конце печатает пропускную способность
+# и задержки.
+#
+#   python benchmarks/load_test.py --clients 200 --requests 50
+#   python benchmarks/load_test.py --spawn-server   # поднять сервер во временной базе
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from protocol import encode_message, read_message
+
+# Действия с хешированием пароля (PBKDF2), их задержка выводится отдельно
+PASSWORD_ACTIONS = ('register', 'login')
+
+MAPS = ["Mirage", "Dust II", "Inferno", "Nuke", "Overpass", "Vertigo", "Ancient", "Anubis"]
+
+
+def random_match(elo):
+    result = random.choice("WLT")
+    change = random.randint(9, 25) if result == 'W' else random.randint(25, 35) if result == 'L' else 0
+    elo_after = elo + change if result == 'W' else elo - change if result == 'L' else elo
+    kills, deaths = random.randint(5, 35), random.randint(5, 30)
+    return {
+        'match_id': uuid.uuid4().hex,
+        'result': result,
+        'elo_before': elo,
+        'elo_after': elo_after,
+        'elo_change': change,
+        'kills': kills,
+        'deaths': deaths,
+        'kd': round(kills / deaths, 2),
+        'hs': round(random.uniform(20, 70), 1),
+        'map': random.choice(MAPS),
+        'date': time.strftime("%Y-%m-%d %H:%M")
+    }
+
+
+class LoadClient:
+    """Один виртуальный игрок"""
+
+    def __init__(self, host, port, nickname, stats):
+        self.host = host
+        self.port = port
+        self.nickname = nickname
+        self.stats = stats
+        self.elo = 1050
+        self.version = 0
+        self.request_id = 0
+
+    async def call(self, data):
+        self.request_id += 1
+        data['request_id'] = self.request_id
+        started = time.perf_counter()
+        self.writer.write(encode_message(data))
+        await self.writer.drain()
+        response = await read_message(self.reader)
+        latency = time.perf_counter() - started
+        self.stats['latencies'].append(latency)
+        if data['action'] in PASSWORD_ACTIONS:
+            self.stats['password_latencies'].append(latency)
+        if not response.get('success'):
+            self.stats['errors'] += 1
+        return response
+
+    async def run(self, requests):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            await self.call({'action': 'register', 'nickname': self.nickname, 'password': 'load'})
+            await self.call({'action': 'login', 'nickname': self.nickname, 'password': 'load'})
+
+            for _ in range(requests):
+                roll = random.random()
+                if roll < 0.4:
+                    await self.call({'action': 'get_leaderboard',
+                                     'sort_by': random.choice(['elo', 'wins', 'avg_kd']), 'limit': 100})
+                elif roll < 0.7:
+                    match = random_match(self.elo)
+                    self.elo = match['elo_after']
+                    response = await self.call({
+                        'action': 'update_stats', 'nickname': self.nickname, 'mode': 'delta',
+                        'base_version': self.version, 'summary': {'elo': self.elo}, 'matches': [match]})
+                    self.version = response.get('version', self.version)
+                elif roll < 0.9:
+                    await self.call({'action': 'get_stats', 'nickname': self.nickname,
+                                     'since_version': max(0, self.version - 5)})
+                else:
+                    await self.call({'action': 'batch', 'requests': [
+                        {'action': 'get_detailed_player_profile', 'nickname': self.nickname},
+                        {'action': 'get_elo_history', 'nickname': self.nickname, 'limit': 100},
+                        {'action': 'get_map_statistics', 'nickname': self.nickname},
+                        {'action': 'get_time_statistics', 'nickname': self.nickname},
+                        {'action': 'get_season_comparison', 'nickname': self.nickname}
+                    ]})
+        finally:
+            self.writer.close()
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def report_latency(title, latencies):
+    print(f"{title} p50/p95/p99: {percentile(latencies, 0.5) * 1000:.1f} / "
+          f"{percentile(latencies, 0.95) * 1000:.1f} / {percentile(latencies, 0.99) * 1000:.1f} мс")
+
+
+async def run_load(host, port, clients, requests):
+    run_id = uuid.uuid4().hex[:6]
+    stats = {'latencies': [], 'password_latencies': [], 'errors': 0}
+    load_clients = [LoadClient(host, port, f"load_{run_id}_{i}", stats) for i in range(clients)]
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(client.run(requests) for client in load_clients),
+                                   return_exceptions=True)
+    elapsed = time.perf_counter() - started
+
+    failed_clients = [r for r in results if isinstance(r, Exception)]
+    latencies = stats['latencies']
+    print(f"Клиентов: {clients}, запросов: {len(latencies)}, время: {elapsed:.2f} с")
+    print(f"Пропускная способность: {len(latencies) / elapsed:.0f} запросов/с")
+    report_latency("Задержка", latencies)
+    report_latency("  login/register", stats['password_latencies'])
+    other = list(latencies)
+    for latency in stats['password_latencies']:
+        other.remove(latency)
+    report_latency("  остальные запросы", other)
+    print(f"Ошибок в ответах: {stats['errors']}, упавших клиентов: {len(failed_clients)}")
+    if failed_clients:
+        print(f"Первая ошибка: {failed_clients[0]!r}")
+
+
+async def main_async(args):
+    if not args.spawn_server:
+        await run_load(args.host, args.port, args.clients, args.requests)
+        return
+
+    from server import GameServer, ServerProtocolHandler
+
+    with tempfile.TemporaryDirectory() as tmp:
+        handler = ServerProtocolHandler(GameServer(os.path.join(tmp, 'load.db')))
+        server = await asyncio.start_server(handler.handle_client, '127.0.0.1', 0, backlog=1024)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            await run_load('127.0.0.1', port, args.clients, args.requests)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест сервера FaceIt Scoreboard")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5555)
+    parser.add_argument('--clients', type=int, default=100)
+    parser.add_argument('--requests', type=int, default=50, help="запросов на клиента")
+    parser.add_argument('--spawn-server', action='store_true',
+                        help="запустить сервер в этом процессе на временной базе")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
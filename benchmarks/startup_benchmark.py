@@ -0,0 +1,77 @@
+# startup_benchmark.py - время холодного запуска клиента
+#
+# Каждый замер - отдельный процесс Python (холодный импорт модулей) во
+# временной папке, чтобы не трогать локальные файлы клиента. Замеряется
+# импорт client.py, создание окна с вкладками до первой отрисовки и
+# загружен ли matplotlib к этому моменту. Сравниваются ленивые вкладки
+# и создание всех вкладок сразу. Нужен дисплей (Tk).
+#
+#   python benchmarks/startup_benchmark.py --runs 5
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Код одного замера, выполняется в отдельном процессе
+MEASURE = r"""
+import json, sys, time
+sys.path.insert(0, {root!r})
+started = time.perf_counter()
+import client
+imported = time.perf_counter()
+root = client.tk.Tk()
+app = client.FaceItOnlineTracker(root, lazy_tabs={lazy})
+root.update()
+shown = time.perf_counter()
+app.supervisor.stop()
+app.executor.shutdown()
+root.destroy()
+print(json.dumps({{
+    'import': imported - started,
+    'window': shown - imported,
+    'total': shown - started,
+    'matplotlib': 'matplotlib' in sys.modules
+}}))
+"""
+
+
+def measure(lazy, runs):
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for _ in range(runs):
+            # Локальные данные клиента создаются в пустой папке при каждом запуске
+            for name in os.listdir(workdir):
+                os.remove(os.path.join(workdir, name))
+            output = subprocess.run([sys.executable, '-c', MEASURE.format(root=ROOT, lazy=lazy)],
+                                    cwd=workdir, capture_output=True, text=True, check=True).stdout
+            results.append(json.loads(output.strip().splitlines()[-1]))
+    return results
+
+
+def report(title, results):
+    def median_ms(key):
+        return statistics.median(result[key] for result in results) * 1000
+
+    print(f"{title}:")
+    print(f"  импорт client.py:   {median_ms('import'):7.1f} мс")
+    print(f"  окно с вкладками:   {median_ms('window'):7.1f} мс")
+    print(f"  всего до отрисовки: {median_ms('total'):7.1f} мс")
+    print(f"  matplotlib загружен: {'да' if any(r['matplotlib'] for r in results) else 'нет'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Время холодного запуска клиента")
+    parser.add_argument('--runs', type=int, default=5, help="замеров на каждый режим (берется медиана)")
+    args = parser.parse_args()
+
+    report("Все вкладки сразу", measure(False, args.runs))
+    report("Ленивые вкладки", measure(True, args.runs))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+# cache.py - кэш ответов сервера для действий только на чтение
+#
+# Ключ кэша - действие и его параметры. У каждого действия свой TTL,
+# при переполнении вытесняются давно не использованные записи (LRU).
+# Действия записи сбрасывают записи, которые они могли изменить.
+import copy
+import json
+import threading
+import time
+from collections import OrderedDict
+
+# Время жизни ответов в секундах
+CACHE_TTLS = {
+    'get_active_seasons': 300,
+    'get_season_comparison': 300,
+    'get_map_statistics': 120,
+    'get_time_statistics': 120,
+    'get_elo_history': 60,
+    'get_detailed_player_profile': 60,
+    'check_premium_status': 60,
+    'get_stats': 30,
+    'get_tournaments': 30,
+    'get_leaderboard': 10
+}
+
+# Действия, ответ на которые относится к одному игроку (параметр nickname)
+PLAYER_ACTIONS = {
+    'get_stats', 'get_elo_history', 'get_detailed_player_profile', 'get_map_statistics',
+    'get_time_statistics', 'get_season_comparison', 'check_premium_status'
+}
+
+PLAYER_STATS_ACTIONS = (
+    'get_stats', 'get_leaderboard', 'get_elo_history', 'get_detailed_player_profile',
+    'get_map_statistics', 'get_time_statistics', 'get_season_comparison'
+)
+
+# Какие кэшированные действия устаревают после действия записи
+INVALIDATIONS = {
+    'update_stats': PLAYER_STATS_ACTIONS,
+    'admin_delete_match': PLAYER_STATS_ACTIONS,
+    'admin_delete_matches': PLAYER_STATS_ACTIONS,
+    'admin_ban_player': ('get_leaderboard', 'get_detailed_player_profile'),
+    'admin_unban_player': ('get_leaderboard', 'get_detailed_player_profile'),
+    'admin_ban_players': ('get_leaderboard', 'get_detailed_player_profile'),
+    'admin_unban_players': ('get_leaderboard', 'get_detailed_player_profile'),
+    'admin_change_role': ('get_detailed_player_profile',),
+    'grant_premium': ('check_premium_status', 'get_detailed_player_profile'),
+    'create_season': ('get_active_seasons', 'get_season_comparison'),
+    'create_tournament': ('get_tournaments',),
+    'register_for_tournament': ('get_tournaments',)
+}
+
+# Параметр запроса записи, в котором указан затронутый игрок
+TARGET_FIELDS = ('target_nickname', 'nickname')
+
+
+def cache_key(request):
+    """Ключ кэша: действие и параметры без служебных полей"""
+    params = {key: value for key, value in request.items() if key != 'request_id'}
+    return json.dumps(params, sort_keys=True, ensure_ascii=False)
+
+
+class ResponseCache:
+    """Потокобезопасный LRU-кэш ответов с TTL по действиям"""
+
+    def __init__(self, max_entries=256, ttls=None):
+        self.max_entries = max_entries
+        self.ttls = ttls if ttls is not None else CACHE_TTLS
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def is_cacheable(self, request):
+        return request.get('action') in self.ttls
+
+    def get(self, request):
+        """Ответ из кэша или None"""
+        if not self.is_cacheable(request):
+            return None
+
+        key = cache_key(request)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry['expires'] < time.monotonic():
+                if entry is not None:
+                    del self.entries[key]
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            response = entry['response']
+
+        # Вызывающий код может менять ответ, поэтому отдаем копию
+        return copy.deepcopy(response)
+
+    def put(self, request, response):
+        """Сохранение успешного ответа"""
+        if not self.is_cacheable(request):
+            return
+        if not isinstance(response, dict) or not response.get('success'):
+            return
+
+        entry = {
+            'action': request['action'],
+            'nickname': request.get('nickname'),
+            'expires': time.monotonic() + self.ttls[request['action']],
+            'response': copy.deepcopy(response)
+        }
+        with self.lock:
+            self.entries[cache_key(request)] = entry
+            self.entries.move_to_end(cache_key(request))
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate_for(self, request):
+        """Сброс записей, которые мог изменить запрос записи"""
+        actions = INVALIDATIONS.get(request.get('action'))
+        if not actions:
+            return
+
+        target = next((request[field] for field in TARGET_FIELDS if request.get(field)), None)
+        self.invalidate_actions(actions, target)
+
+    def invalidate_actions(self, actions, nickname=None):
+        """Сброс записей указанных действий (для действий игрока - только по nickname)"""
+        with self.lock:
+            for key in [key for key, entry in self.entries.items()
+                        if entry['action'] in actions and
+                        (nickname is None or entry['action'] not in PLAYER_ACTIONS or
+                         entry['nickname'] == nickname)]:
+                del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
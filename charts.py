@@ -0,0 +1,197 @@
+# charts.py - графики клиента на matplotlib
+#
+# matplotlib импортируется только при первом построении графика: импорт
+# вместе с бэкендом Tk занимает заметную часть запуска клиента, а график
+# нужен не в каждой сессии. Наличие пакета проверяется без импорта.
+#
+# EloChart создает фигуру и холст один раз, дальше меняются только данные
+# линии (set_data) и холст перерисовывается при простое Tk (draw_idle).
+# Колесо мыши приближает участок графика; для длинной истории, прореженной
+# сервером, по приближенному участку запрашиваются точные точки (on_zoom).
+import importlib.util
+import time
+import tkinter as tk
+from tkinter import ttk
+
+MATPLOTLIB_AVAILABLE = importlib.util.find_spec('matplotlib') is not None
+
+# (Figure, FigureCanvasTkAgg) после первого импорта, False - импорт не удался
+_matplotlib_classes = None
+
+
+def load_matplotlib():
+    """Классы matplotlib для графиков в Tk или None, если matplotlib недоступен"""
+    global _matplotlib_classes
+    if _matplotlib_classes is None:
+        _matplotlib_classes = False
+        if MATPLOTLIB_AVAILABLE:
+            try:
+                from matplotlib.figure import Figure
+                from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+                _matplotlib_classes = (Figure, FigureCanvasTkAgg)
+            except ImportError as e:
+                print(f"[!] Не удалось загрузить matplotlib: {e}")
+    return _matplotlib_classes or None
+
+
+class EloChart:
+    """График ELO, который создается один раз и обновляется на месте.
+    
+    max_points - сколько последних матчей показывать (None - все),
+    on_zoom(x0, x1) - запрос точных точек для приближенного участка.
+    """
+
+    # Задержка перед запросом точных точек, пока колесо еще крутят (мс)
+    ZOOM_DELAY = 300
+    # Минимальная ширина приближенного участка, матчей
+    MIN_SPAN = 5
+
+    def __init__(self, parent, title='Изменение ELO', max_points=100, figsize=(8, 4), markersize=3,
+                 on_zoom=None):
+        self.parent = parent
+        self.title = title
+        self.max_points = max_points
+        self.figsize = figsize
+        self.markersize = markersize
+        self.on_zoom = on_zoom
+
+        # Номера матчей (ось X) и ELO после них
+        self.xs = []
+        self.elos = []
+        # Приближенный участок (x0, x1) и точные точки для него (xs, elos)
+        self.view = None
+        self.detail = None
+        self._zoom_job = None
+        # Время последней загрузки истории с сервера (time.monotonic)
+        self.loaded_at = None
+
+        self.axes = None
+        self.line = None
+        self.canvas = None
+        self.message = None
+
+    def age(self):
+        """Секунд с последней загрузки истории (None - еще не загружалась)"""
+        if self.loaded_at is None:
+            return None
+        return time.monotonic() - self.loaded_at
+
+    def set_history(self, elos, xs=None):
+        """История с сервера; xs - номера матчей, если история прорежена"""
+        self.elos = list(elos)
+        self.xs = list(xs) if xs is not None else list(range(len(self.elos)))
+        if self.max_points:
+            del self.elos[:-self.max_points]
+            del self.xs[:-self.max_points]
+        self.view = None
+        self.detail = None
+        self.loaded_at = time.monotonic()
+        self.redraw()
+
+    def append(self, elos):
+        """Новые точки, известные локально, без запроса к серверу"""
+        start = self.xs[-1] + 1 if self.xs else 0
+        self.xs.extend(range(start, start + len(elos)))
+        self.elos.extend(elos)
+        if self.max_points:
+            # Окно последних max_points матчей, как у истории с сервера
+            del self.elos[:-self.max_points]
+            del self.xs[:-self.max_points]
+        self.redraw()
+
+    def show_detail(self, xs, elos):
+        """Точные точки для приближенного участка"""
+        if self.view is None or not self.parent.winfo_exists():
+            return
+        self.detail = (list(xs), list(elos))
+        self.redraw()
+
+    def _visible_data(self):
+        """Общий ряд, в котором приближенный участок заменен точными точками"""
+        if not (self.view and self.detail and self.detail[0]):
+            return self.xs, self.elos
+        detail_xs, detail_elos = self.detail
+        first, last = detail_xs[0], detail_xs[-1]
+        before = [i for i, x in enumerate(self.xs) if x < first]
+        after = [i for i, x in enumerate(self.xs) if x > last]
+        xs = [self.xs[i] for i in before] + detail_xs + [self.xs[i] for i in after]
+        elos = [self.elos[i] for i in before] + detail_elos + [self.elos[i] for i in after]
+        return xs, elos
+
+    def show_message(self, text):
+        """Текст вместо графика (ошибка загрузки, нет данных)"""
+        if self.canvas:
+            self.canvas.get_tk_widget().pack_forget()
+        if self.message is None:
+            self.message = ttk.Label(self.parent)
+        self.message.config(text=text)
+        self.message.pack(pady=20)
+
+    def _create_canvas(self):
+        matplotlib_classes = load_matplotlib()
+        if not matplotlib_classes:
+            return False
+        Figure, FigureCanvasTkAgg = matplotlib_classes
+
+        figure = Figure(figsize=self.figsize, dpi=100)
+        self.axes = figure.add_subplot(111)
+        self.line, = self.axes.plot([], [], marker='o', linestyle='-', linewidth=2,
+                                    markersize=self.markersize)
+        self.axes.set_xlabel('Матч')
+        self.axes.set_ylabel('ELO')
+        self.axes.set_title(self.title)
+        self.axes.grid(True, alpha=0.3)
+        self.canvas = FigureCanvasTkAgg(figure, self.parent)
+        self.canvas.mpl_connect('scroll_event', self._on_scroll)
+        return True
+
+    def _on_scroll(self, event):
+        """Приближение и отдаление по оси X вокруг курсора"""
+        if event.xdata is None or len(self.xs) < 2:
+            return
+        full_x0, full_x1 = self.xs[0], self.xs[-1]
+        x0, x1 = self.view or (full_x0, full_x1)
+        scale = 0.8 if event.button == 'up' else 1.25
+        x0 = max(full_x0, event.xdata - (event.xdata - x0) * scale)
+        x1 = min(full_x1, event.xdata + (x1 - event.xdata) * scale)
+        if x1 - x0 < self.MIN_SPAN:
+            return
+
+        if x0 <= full_x0 and x1 >= full_x1:
+            self.view = None
+            self.detail = None
+        else:
+            self.view = (x0, x1)
+        self.redraw()
+
+        if self.on_zoom:
+            widget = self.canvas.get_tk_widget()
+            if self._zoom_job:
+                widget.after_cancel(self._zoom_job)
+            self._zoom_job = widget.after(self.ZOOM_DELAY, self._request_detail)
+
+    def _request_detail(self):
+        self._zoom_job = None
+        if self.view:
+            self.on_zoom(*self.view)
+
+    def redraw(self):
+        if not self.elos:
+            self.show_message("Нет данных для отображения")
+            return
+        if self.canvas is None and not self._create_canvas():
+            self.show_message("Не удалось загрузить matplotlib")
+            return
+
+        if self.message is not None:
+            self.message.pack_forget()
+        widget = self.canvas.get_tk_widget()
+        if not widget.winfo_manager():
+            widget.pack(fill=tk.BOTH, expand=True)
+
+        self.line.set_data(*self._visible_data())
+        self.axes.relim()
+        self.axes.autoscale_view()
+        if self.view:
+            self.axes.set_xlim(*self.view)
+        self.canvas.draw_idle()
@@ -1,21 +1,57 @@
 # client.py - полная версия с админ-панелью
 import tkinter as tk
 from tkinter import ttk, messagebox
-import json
-import socket
 import threading
+import math
 from datetime import datetime, timedelta
-import os
-try:
-    from matplotlib.figure import Figure
-    from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-    MATPLOTLIB_AVAILABLE = True
-except ImportError:
-    MATPLOTLIB_AVAILABLE = False
+import uuid
+from connection import ServerConnection
+from executor import RequestExecutor
+from local_store import LocalStore
+from local_db import MatchDatabase, SQLITE_AVAILABLE
+from cache import ResponseCache, PLAYER_STATS_ACTIONS
+from tables import TableReconciler, VirtualTable
+from levels import level_from_elo, levels_from_elos
+from stats_engine import compute_aggregates
+from outbox import Outbox
+from supervisor import ConnectionSupervisor, is_idempotent
+from charts import MATPLOTLIB_AVAILABLE, EloChart
+
+# Содержимое вкладок создается при первом открытии вкладки
+LAZY_TABS = True
+
+# Через сколько секунд график ELO заново загружается с сервера
+ELO_CHART_MAX_AGE = 300
+
+# Сколько точек истории ELO запрашивать для графика профиля (сервер прореживает)
+ELO_CHART_POINTS = 400
+
+MAPS = ["Mirage", "Dust II", "Inferno", "Nuke", "Overpass",
+        "Vertigo", "Ancient", "Anubis", "Cache", "Train"]
+
+# Размер страницы списка матчей в админ-панели
+ADMIN_MATCHES_PAGE = 100
+
+# Через сколько повторить отправку очереди, если сервер не ответил (мс)
+OUTBOX_RETRY_DELAY = 5000
+
+def parse_nicknames(text):
+    """Ники из строки через запятую, без повторов (в нике может быть пробел)"""
+    return list(dict.fromkeys(part.strip() for part in text.split(',') if part.strip()))
+
+
+def bulk_result_message(response):
+    """Итог массового действия: сообщение сервера и ники, к которым оно не применилось"""
+    lines = [response.get('message', 'Готово')]
+    for nickname, reason in (response.get('failed') or {}).items():
+        lines.append(f"{nickname}: {reason}")
+    return "\n".join(lines)
+
 
 class FaceItOnlineTracker:
-    def __init__(self, root):
+    def __init__(self, root, lazy_tabs=LAZY_TABS):
         self.root = root
+        self.lazy_tabs = lazy_tabs
         self.root.title("FaceIt Online Scoreboard")
         self.root.geometry("1400x900")
         self.root.configure(bg="white")
@@ -23,31 +59,47 @@ class FaceItOnlineTracker:
         # Настройки сервера
         self.server_host = "26.90.218.164"
         self.server_port = 5555
-        self.socket = None
+        self.connection = None
         self.connected = False
+        # Логин и пароль текущей сессии для повторного входа после переподключения
+        self.session_credentials = None
+        
+        # Кэш ответов на запросы чтения
+        self.response_cache = ResponseCache()
         self.current_user = None
         self.current_role = None
         
-        # Локальные данные
+        # Локальные данные: снимок + журнал матчей
         self.local_data_file = "faceit_local.json"
+        self.local_store = LocalStore(self.local_data_file)
         
-        # Уровни FaceIt
-        self.levels = {
-            1: {"min_elo": 0, "max_elo": 500, "color": "#808080"},
-            2: {"min_elo": 501, "max_elo": 750, "color": "#006400"},
-            3: {"min_elo": 751, "max_elo": 900, "color": "#006400"},
-            4: {"min_elo": 901, "max_elo": 1050, "color": "#00008B"},
-            5: {"min_elo": 1051, "max_elo": 1200, "color": "#00008B"},
-            6: {"min_elo": 1201, "max_elo": 1350, "color": "#800080"},
-            7: {"min_elo": 1351, "max_elo": 1530, "color": "#800080"},
-            8: {"min_elo": 1531, "max_elo": 1750, "color": "#FFD700"},
-            9: {"min_elo": 1751, "max_elo": 2000, "color": "#FFD700"},
-            10: {"min_elo": 2001, "max_elo": 10000, "color": "#FF4500"}
-        }
+        # Запросы записи, ожидающие подключения к серверу
+        self.outbox = Outbox("faceit_outbox.jsonl")
+        self.replay_lock = threading.Lock()
+        self.outbox_retry_job = None
+        
+        # Индексированная база матчей для истории и аналитики офлайн
+        self.match_db_file = "faceit_matches.db"
+        self.match_db = None
         
         # Локальные данные
         self.load_local_data()
         
+        # Фоновое выполнение сетевых запросов
+        self.executor = RequestExecutor(self.root)
+        
+        # Переподключение и проверка соединения в фоне
+        self.supervisor = ConnectionSupervisor(
+            self.open_connection, self.heartbeat,
+            on_state=lambda connected, delay: self.executor.post(
+                self.on_connection_state, (connected, delay)))
+        self.scoreboard_refresh_job = None
+        
+        # Данные таблиц, обновляемые push-сообщениями сервера
+        self.tournaments_data = []
+        self.current_chat_partner = None
+        self.chat_message_ids = set()
+        
         # Установка стилей
         self.setup_styles()
         
@@ -106,15 +158,44 @@ class FaceItOnlineTracker:
         
     def load_local_data(self):
         """Загрузка локальных данных"""
-        if os.path.exists(self.local_data_file):
-            try:
-                with open(self.local_data_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    self.local_stats = data
-            except:
-                self.local_stats = self.get_default_stats()
-        else:
+        try:
+            self.local_stats = self.local_store.load(self.get_default_stats())
+        except Exception as e:
+            print(f"Ошибка загрузки локальных данных: {e}")
             self.local_stats = self.get_default_stats()
+        
+        if self.ensure_match_ids():
+            self.save_local_data()
+        
+        # Средние, накопленные округлением, пересчитываем точно по матчам
+        self.recompute_local_stats()
+        
+        self.open_match_db()
+    
+    def recompute_local_stats(self):
+        """Пересчет сводной статистики по match_details.
+        
+        Выполняется, только если в истории есть все матчи: у старых данных
+        сводка может учитывать матчи, деталей которых нет.
+        """
+        details = self.local_stats.get('match_details', [])
+        if not details or len(details) < self.local_stats.get('matches', 0):
+            return False
+        
+        self.local_stats.update(compute_aggregates(details)['summary'])
+        return True
+    
+    def open_match_db(self):
+        """Открытие локальной базы матчей (если доступен sqlite3)"""
+        if not SQLITE_AVAILABLE:
+            return
+        
+        try:
+            self.match_db = MatchDatabase(self.match_db_file)
+            self.match_db.sync(self.local_stats.get('match_details', []))
+        except Exception as e:
+            print(f"Локальная база матчей недоступна: {e}")
+            self.match_db = None
     
     def get_default_stats(self):
         """Статистика по умолчанию"""
@@ -131,58 +212,300 @@ class FaceItOnlineTracker:
             "total_deaths": 0,
             "avg_kills": 0.0,
             "match_history": [],
-            "match_details": []
+            "match_details": [],
+            "sync_version": 0
         }
     
     def save_local_data(self):
-        """Сохранение локальных данных"""
+        """Сохранение локальных данных (полный снимок)"""
         try:
-            with open(self.local_data_file, 'w', encoding='utf-8') as f:
-                json.dump(self.local_stats, f, ensure_ascii=False, indent=2)
+            self.local_store.save(self.local_stats)
+            if self.match_db:
+                self.match_db.sync(self.local_stats.get('match_details', []))
         except Exception as e:
             print(f"Ошибка сохранения локальных данных: {e}")
     
+    def save_match_locally(self, match):
+        """Дописывание нового матча в журнал без перезаписи всего файла"""
+        try:
+            self.local_store.append_match(self.local_stats, match)
+            if self.match_db:
+                self.match_db.add_match(match, len(self.local_stats['match_details']) - 1)
+        except Exception as e:
+            print(f"Ошибка сохранения матча: {e}")
+    
     def connect_to_server(self):
-        """Подключение к серверу"""
-        def connect():
-            try:
-                self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                self.socket.connect((self.server_host, self.server_port))
-                self.connected = True
-                
-                # Тестовый запрос
-                response = self.send_request({'action': 'ping'})
-                if response and isinstance(response, dict) and response.get('success'):
-                    print("[*] Успешно подключено к серверу")
-                else:
-                    self.connected = False
-                    print("[!] Ошибка подключения к серверу")
-                    
-            except Exception as e:
-                self.connected = False
-                print(f"[!] Ошибка подключения: {e}")
+        """Подключение к серверу (в фоне, с автоматическим переподключением)"""
+        self.supervisor.start()
+    
+    def open_connection(self):
+        """Открытие соединения и восстановление сессии (поток супервизора)"""
+        if self.connection:
+            self.connection.close()
+        self.connected = False
+        
+        self.connection = ServerConnection(self.server_host, self.server_port)
+        # Push-сообщения приходят в потоке чтения, обрабатываем в главном потоке
+        self.connection.on_push = lambda message: self.executor.post(self.on_push_message, message)
+        self.connection.on_close = self.on_connection_lost
+        self.connection.connect()
+        self.connected = True
+        
+        # Тестовый запрос
+        response = self.send_request({'action': 'ping'}, use_cache=False, retry=False)
+        if not (response and isinstance(response, dict) and response.get('success')):
+            self.connected = False
+            print("[!] Ошибка подключения к серверу")
+            return False
+        
+        print("[*] Успешно подключено к серверу")
+        
+        # Компактная кодировка больших ответов, если сервер ее поддерживает
+        try:
+            encoding, compression = self.connection.negotiate()
+            print(f"[*] Кодировка протокола: {encoding}, сжатие: {compression or 'нет'}")
+        except TimeoutError as e:
+            print(f"[!] Кодировка не согласована, используется JSON: {e}")
+        
+        # Сервер не помнит сессию - входим заново с сохраненными данными
+        if self.session_credentials:
+            nickname, password = self.session_credentials
+            response = self.send_request({'action': 'login', 'nickname': nickname, 'password': password},
+                                         use_cache=False, retry=False)
+            if not (response and response.get('success')):
+                print(f"[!] Повторный вход не выполнен: {(response or {}).get('message')}")
+        
+        self.subscribe('leaderboard')
+        self.subscribe('tournaments')
+        if self.current_user:
+            self.subscribe('chat', self.current_user)
+        return True
+    
+    def heartbeat(self):
+        """Проверка соединения (поток супервизора)"""
+        response = self.send_request({'action': 'ping'}, timeout=5, use_cache=False, retry=False)
+        return bool(response and isinstance(response, dict) and response.get('success'))
+    
+    def on_connection_lost(self):
+        """Разрыв, замеченный потоком чтения"""
+        self.connected = False
+        self.supervisor.connection_lost()
+    
+    def on_connection_state(self, state):
+        """Смена состояния соединения (в главном потоке)"""
+        connected, retry_delay = state
+        if connected:
+            # Отправляем то, что накопилось без соединения
+            self.executor.submit(self.replay_outbox, lambda result: None)
+        self.update_connection_status(retry_delay)
+    
+    def subscribe(self, channel, nickname=None):
+        """Подписка на push-сообщения канала"""
+        request = {'action': 'subscribe', 'channel': channel}
+        if nickname:
+            request['nickname'] = nickname
+        response = self.send_request(request, use_cache=False, retry=False)
+        return bool(response and isinstance(response, dict) and response.get('success'))
+    
+    def unsubscribe(self, channel):
+        """Отписка от канала"""
+        if self.connected:
+            self.request_async({'action': 'unsubscribe', 'channel': channel},
+                               lambda response: None, use_cache=False)
+    
+    def on_push_message(self, message):
+        """Обработка push-сообщения сервера (в главном потоке)"""
+        channel = message.get('push')
+        event = message.get('event')
+        data = message.get('data') or {}
+        
+        if channel == 'leaderboard':
+            self.response_cache.invalidate_actions(('get_leaderboard',))
+            self.response_cache.invalidate_actions(PLAYER_STATS_ACTIONS, data.get('nickname'))
+            self.apply_leaderboard_push(event, data)
+        elif channel == 'tournaments':
+            self.response_cache.invalidate_actions(('get_tournaments',))
+            self.apply_tournament_push(data)
+        elif channel == 'chat':
+            self.apply_chat_push(data)
+    
+    def apply_leaderboard_push(self, event, player):
+        """Обновление видимых страниц скорборда после изменения игрока"""
+        if not hasattr(self, 'scoreboard_view') or self.scoreboard_refresh_job:
+            return
         
-        # Запускаем в отдельном потоке
-        thread = threading.Thread(target=connect)
-        thread.daemon = True
-        thread.start()
+        # Серию изменений (например, пакет матчей) объединяем в одну перезагрузку
+        def refresh():
+            self.scoreboard_refresh_job = None
+            self.scoreboard_view.refresh()
+        
+        self.scoreboard_refresh_job = self.root.after(500, refresh)
+    
+    def apply_tournament_push(self, tournament):
+        """Обновление строки турнира"""
+        tournaments = [t for t in self.tournaments_data if t.get('id') != tournament.get('id')]
+        tournaments.append(tournament)
+        tournaments.sort(key=lambda t: t.get('start_date', ''))
+        self.tournaments_data = tournaments
+        
+        # Пока вкладка не открывалась, только запоминаем данные
+        if hasattr(self, 'tournaments_tree'):
+            self.render_tournaments()
+    
+    def apply_chat_push(self, message):
+        """Новое сообщение в открытом чате и в списке чатов"""
+        if not self.current_user or not hasattr(self, 'messages_text'):
+            return
+        
+        sender = message.get('sender')
+        receiver = message.get('receiver')
+        other_player = receiver if sender == self.current_user else sender
+        
+        if other_player not in self.chats_listbox.get(0, tk.END):
+            self.chats_listbox.insert(0, other_player)
+        
+        # Сообщение могло уже прийти вместе с перезагрузкой чата
+        if other_player == self.current_chat_partner and message.get('id') not in self.chat_message_ids:
+            self.chat_message_ids.add(message.get('id'))
+            self.messages_text.insert(tk.END, f"[{message.get('time', '')}] {sender}: {message.get('text', '')}\n")
+            self.messages_text.see(tk.END)
     
-    def send_request(self, data, timeout=5):
-        """Отправка запроса на сервер"""
+    def send_write(self, request):
+        """Отправка запроса записи через очередь.
+        
+        Запрос сначала сохраняется в outbox с ключом идемпотентности, поэтому
+        при обрыве связи он будет отправлен повторно без дубликатов.
+        Возвращает ответ сервера или None, если запрос остался в очереди.
+        """
+        request = self.outbox.add(request)
         if not self.connected:
             return None
-            
+        
+        # Более ранние запросы не должны отстать от нового - отправляем всю очередь по порядку
+        if len(self.outbox) > 1 or not self.replay_lock.acquire(blocking=False):
+            self.executor.submit(self.replay_outbox, lambda result: None)
+            return None
         try:
-            self.socket.settimeout(timeout)
-            self.socket.send(json.dumps(data).encode('utf-8'))
-            
-            response = self.socket.recv(65536).decode('utf-8')
-            return json.loads(response)
-            
-        except Exception as e:
-            print(f"Ошибка отправки запроса: {e}")
-            self.connected = False
+            response = self.send_request(request, use_cache=False)
+        finally:
+            self.replay_lock.release()
+        if response is None:
+            self.schedule_outbox_retry()
+            return None
+        self.outbox.done(request['idempotency_key'])
+        return response
+    
+    def schedule_outbox_retry(self):
+        """Повтор отправки очереди, если сервер не ответил, а соединение не разорвалось"""
+        if self.outbox_retry_job is None:
+            self.outbox_retry_job = self.root.after(OUTBOX_RETRY_DELAY, self.retry_outbox)
+    
+    def retry_outbox(self):
+        self.outbox_retry_job = None
+        # При разрыве очередь отправится после переподключения
+        if self.connected and len(self.outbox):
+            self.executor.submit(self.replay_outbox, lambda result: None)
+    
+    def replay_outbox(self):
+        """Отправка отложенных запросов по порядку (вызывается из фонового потока)"""
+        if not self.replay_lock.acquire(blocking=False):
+            return
+        sent = 0
+        try:
+            for request in self.outbox.pending():
+                response = self.send_request(request, use_cache=False, retry=False)
+                if response is None:
+                    # Нет ответа: при разрыве остальное отправим после переподключения,
+                    # иначе (таймаут) повторим позже, сохраняя порядок
+                    self.executor.post(lambda _: self.schedule_outbox_retry(), None)
+                    return
+                if isinstance(response, dict) and not response.get('success'):
+                    print(f"[!] Отложенный запрос {request.get('action')} отклонен: {response.get('message')}")
+                self.outbox.done(request['idempotency_key'])
+                sent += 1
+            
+            # Матчи хранятся локально и отправляются по match_id (повтор не создаст дубликат)
+            if self.current_user and any('seq' not in match for match in self.local_stats.get('match_details', [])):
+                response = self.send_request(self.build_sync_request(), use_cache=False, retry=False)
+                if response and isinstance(response, dict) and response.get('success'):
+                    self.executor.post(self.apply_sync_ack, response)
+                    sent += 1
+        finally:
+            self.replay_lock.release()
+            if sent:
+                print(f"[*] Отправлено отложенных запросов: {sent}")
+    
+    def send_request(self, data, timeout=5, use_cache=True, retry=True):
+        """Отправка запроса на сервер.
+        
+        Если соединение оборвалось, а запрос можно безопасно повторить,
+        он повторяется после переподключения (ждем не дольше timeout).
+        """
+        if use_cache:
+            cached = self.response_cache.get(data)
+            if cached is not None:
+                return cached
+        
+        if not self.connected:
             return None
+        
+        while True:
+            try:
+                # Запрос можно отправлять из любого потока: ответ вернется по request_id
+                response = self.connection.request(data, timeout)
+                break
+            except TimeoutError as e:
+                # Таймаут одного запроса не означает разрыва соединения
+                print(f"Ошибка отправки запроса: {e}")
+                return None
+            except Exception as e:
+                print(f"Ошибка отправки запроса: {e}")
+                self.connected = False
+                self.supervisor.connection_lost()
+                if not (retry and is_idempotent(data) and self.supervisor.wait_connected(timeout)):
+                    return None
+                # Повторяем один раз на новом соединении
+                retry = False
+        
+        # Запись делает устаревшими связанные ответы в кэше
+        self.response_cache.invalidate_for(data)
+        if use_cache:
+            self.response_cache.put(data, response)
+        return response
+    
+    def send_batch(self, requests, timeout=10):
+        """Отправка нескольких запросов за один round trip.
+        
+        Сервер принимает {'action': 'batch', 'requests': [...]} и возвращает
+        {'success': True, 'results': [...]} в том же порядке.
+        """
+        # Отправляем только то, чего нет в кэше
+        results = [self.response_cache.get(request) for request in requests]
+        missing = [i for i, result in enumerate(results) if result is None]
+        if not missing:
+            return results
+        
+        response = self.send_request({'action': 'batch',
+                                      'requests': [requests[i] for i in missing]}, timeout)
+        
+        if isinstance(response, dict):
+            batch_results = response.get('results')
+            if not (response.get('success') and isinstance(batch_results, list) and
+                    len(batch_results) == len(missing)):
+                # Сервер ответил, но batch не поддерживает: отправляем запросы по одному
+                batch_results = [self.send_request(requests[i], timeout) for i in missing]
+            
+            for i, result in zip(missing, batch_results):
+                self.response_cache.invalidate_for(requests[i])
+                self.response_cache.put(requests[i], result)
+                results[i] = result
+        
+        return results
+    
+    def request_async(self, data, callback, timeout=5, owner=None, use_cache=True):
+        """Отправка запроса в фоне, callback(response) вызывается в главном потоке"""
+        return self.executor.submit(self.send_request, callback, data, timeout, use_cache,
+                                    owner=owner)
     
     def create_interface(self):
         """Создание интерфейса"""
@@ -266,20 +589,41 @@ class FaceItOnlineTracker:
         tab_control.add(self.tournaments_tab, text="🏅 Турниры")
         
         tab_control.pack(expand=1, fill="both")
+        self.notebook = tab_control
+        
+        # Вкладка -> функция, создающая ее содержимое
+        self.tab_builders = {
+            str(self.stats_tab): self.create_stats_tab,
+            str(self.scoreboard_tab): self.create_scoreboard_tab,
+            str(self.history_tab): self.create_history_tab,
+            str(self.match_tab): self.create_match_tab,
+            str(self.seasons_tab): self.create_seasons_tab,
+            str(self.premium_tab): self.create_premium_tab,
+            str(self.chat_tab): self.create_chat_tab,
+            str(self.tournaments_tab): self.create_tournaments_tab
+        }
         
-        # Создание содержимого вкладок
-        self.create_stats_tab()
-        self.create_scoreboard_tab()
-        self.create_history_tab()
-        self.create_match_tab()
-        self.create_seasons_tab()
-        self.create_premium_tab()
-        self.create_chat_tab()
-        self.create_tournaments_tab()
+        if self.lazy_tabs:
+            # Сразу нужна только вкладка статистики, остальные - при первом открытии
+            self.build_tab(self.stats_tab)
+            tab_control.bind("<<NotebookTabChanged>>", self.on_tab_changed)
+        else:
+            for tab in list(self.tab_builders):
+                self.build_tab(tab)
         
         # Обновляем данные
         self.update_display()
     
+    def build_tab(self, tab):
+        """Создание содержимого вкладки, если оно еще не создано"""
+        builder = self.tab_builders.pop(str(tab), None)
+        if builder:
+            builder()
+    
+    def on_tab_changed(self, event):
+        """Переключение вкладки: создаем ее содержимое при первом открытии"""
+        self.build_tab(self.notebook.select())
+    
     def create_stats_tab(self):
         """Создание вкладки статистики"""
         container = ttk.Frame(self.stats_tab, padding=20)
@@ -363,8 +707,16 @@ class FaceItOnlineTracker:
         ttk.Button(sync_frame, text="📤 Загрузить с сервера", 
                   command=self.load_from_server).pack(side=tk.LEFT, padx=5)
         
+        # Статус фоновой загрузки
+        self.sync_status_var = tk.StringVar()
+        ttk.Label(container, textvariable=self.sync_status_var).pack()
+        
         # График ELO (будет создан после авторизации)
         self.elo_chart_frame = None
+        self.elo_chart = None
+        # (число локальных матчей, match_id последнего) на момент загрузки графика
+        self.elo_chart_position = None
+        self.elo_chart_loading = False
         
         # Кнопка просмотра детального профиля (будет показана после авторизации)
         self.profile_button = None
@@ -397,6 +749,14 @@ class FaceItOnlineTracker:
         ttk.Button(filter_frame, text="Обновить", 
                   command=self.update_scoreboard).pack(side=tk.LEFT)
         
+        ttk.Button(filter_frame, text="Мое место", 
+                  command=self.show_my_rank).pack(side=tk.LEFT, padx=(5, 0))
+        
+        # Статус загрузки
+        self.scoreboard_status_var = tk.StringVar()
+        ttk.Label(filter_frame, textvariable=self.scoreboard_status_var,
+                 width=14).pack(side=tk.LEFT, padx=(10, 0))
+        
         # Таблица лидеров
         table_frame = ttk.Frame(container)
         table_frame.pack(fill=tk.BOTH, expand=True)
@@ -426,10 +786,11 @@ class FaceItOnlineTracker:
             self.scoreboard_tree.heading(col, text=col)
             self.scoreboard_tree.column(col, width=width, anchor=anchor)
         
-        # Добавляем прокрутку
-        scrollbar = ttk.Scrollbar(table_frame, orient="vertical", 
-                                 command=self.scoreboard_tree.yview)
-        self.scoreboard_tree.configure(yscrollcommand=scrollbar.set)
+        # Прокрутка по всему скорборду: в таблице только видимые строки,
+        # остальные подгружаются страницами
+        scrollbar = ttk.Scrollbar(table_frame, orient="vertical")
+        self.scoreboard_view = VirtualTable(self.scoreboard_tree, scrollbar,
+                                            self.load_scoreboard_page, self.make_scoreboard_row)
         
         self.scoreboard_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
@@ -465,6 +826,7 @@ class FaceItOnlineTracker:
         
         self.history_tree = ttk.Treeview(table_frame, columns=columns, 
                                         show="headings", height=20)
+        self.history_table = TableReconciler(self.history_tree)
         
         # Настройка колонок
         column_config = [
@@ -491,6 +853,9 @@ class FaceItOnlineTracker:
         
         self.history_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        # Вкладка могла создаться уже после загрузки статистики
+        self.update_history_display()
     
     def create_match_tab(self):
         """Создание вкладки нового матча"""
@@ -547,10 +912,8 @@ class FaceItOnlineTracker:
             row=4, column=0, sticky=tk.W, pady=15, padx=(0, 20))
         
         self.match_map_var = tk.StringVar()
-        maps = ["Mirage", "Dust II", "Inferno", "Nuke", "Overpass", 
-                "Vertigo", "Ancient", "Anubis", "Cache", "Train"]
         map_combo = ttk.Combobox(form_frame, textvariable=self.match_map_var,
-                                values=maps, state="readonly", width=15, font=("Arial", 12))
+                                values=MAPS, state="readonly", width=15, font=("Arial", 12))
         map_combo.grid(row=4, column=1, pady=15)
         
         # Кнопка добавления
@@ -565,26 +928,26 @@ class FaceItOnlineTracker:
                                 font=("Arial", 10))
         status_label.pack()
     
-    def update_connection_status(self):
-        """Обновление статуса подключения"""
+    def update_connection_status(self, retry_delay=None):
+        """Обновление статуса подключения (вызывается при смене состояния)"""
+        if not hasattr(self, 'status_var'):
+            return
+        
         if self.connected:
             self.status_var.set("Подключено")
             self.status_indicator.config(foreground="green")
+        elif retry_delay:
+            self.status_var.set(f"Переподключение через {retry_delay:.0f} с")
+            self.status_indicator.config(foreground="orange")
         else:
             self.status_var.set("Отключено")
             self.status_indicator.config(foreground="red")
-        
-        # Обновляем каждые 5 секунд
-        self.root.after(5000, self.update_connection_status)
     
     def reconnect(self):
-        """Переподключение к серверу"""
-        self.connected = False
-        self.update_connection_status()
-        self.connect_to_server()
-        
-        # Ждем немного и обновляем статус
-        self.root.after(1000, self.update_connection_status)
+        """Переподключение к серверу без ожидания задержки"""
+        self.status_var.set("Подключение...")
+        self.status_indicator.config(foreground="orange")
+        self.supervisor.reconnect_now()
     
     def register(self):
         """Регистрация нового пользователя"""
@@ -612,6 +975,8 @@ class FaceItOnlineTracker:
                 self.current_user = nickname
                 self.current_role = 'player'
                 self.user_info_var.set(f"Игрок: {nickname}")
+                self.request_async({'action': 'subscribe', 'channel': 'chat', 'nickname': nickname},
+                                   lambda response: None, use_cache=False)
             else:
                 messagebox.showerror("Ошибка", response.get('message', 'Ошибка регистрации'))
         else:
@@ -641,6 +1006,9 @@ class FaceItOnlineTracker:
                 messagebox.showinfo("Успех", response.get('message', 'Вход выполнен!'))
                 self.current_user = nickname
                 self.current_role = response.get('role', 'player')
+                self.session_credentials = (nickname, password)
+                self.request_async({'action': 'subscribe', 'channel': 'chat', 'nickname': nickname},
+                                   lambda response: None, use_cache=False)
                 
                 role_text = {
                     'admin': 'Админ',
@@ -657,6 +1025,9 @@ class FaceItOnlineTracker:
                 # Добавляем график ELO и кнопку профиля
                 self.add_stats_analytics()
                 
+                # Неотправленные матчи уходят на сервер после входа
+                self.executor.submit(self.replay_outbox, lambda result: None)
+                
             else:
                 messagebox.showerror("Ошибка", response.get('message', 'Ошибка входа'))
         else:
@@ -664,8 +1035,7 @@ class FaceItOnlineTracker:
     
     def add_admin_tab(self):
         """Добавление админ-панели"""
-        # Получаем текущий notebook
-        notebook = self.root.winfo_children()[1]  # Первый child после connection_frame
+        notebook = self.notebook
         
         # Создаем админ-панель
         self.admin_tab = ttk.Frame(notebook)
@@ -750,51 +1120,71 @@ class FaceItOnlineTracker:
         ttk.Label(dialog, text="Список игроков", 
                  font=("Arial", 16, "bold")).pack(pady=20)
         
-        # Получаем список игроков
-        response = self.send_request({
-            'action': 'admin_get_players',
-            'nickname': self.current_user,
-            'limit': 50,
-            'offset': 0
-        })
+        status_var = tk.StringVar(value="⏳ Загрузка...")
+        ttk.Label(dialog, textvariable=status_var).pack()
         
-        if response and response.get('success'):
-            players = response.get('players', [])
-            
-            # Создаем таблицу
-            table_frame = ttk.Frame(dialog)
-            table_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=10)
-            
-            # Treeview
-            columns = ("Ник", "ELO", "Роль", "Матчи", "Бан")
-            tree = ttk.Treeview(table_frame, columns=columns, show="headings", height=15)
-            
-            for col in columns:
-                tree.heading(col, text=col)
-                tree.column(col, width=150, anchor="center")
-            
-            # Добавляем игроков
-            for player in players:
-                ban_status = "✅" if not player.get('is_banned') else "❌"
-                role_icon = {
-                    'admin': '🛡️',
-                    'moderator': '👮',
-                    'player': '👤'
-                }.get(player.get('role', 'player'), '👤')
-                
-                tree.insert("", "end", values=(
-                    player.get('nickname', ''),
-                    player.get('elo', 0),
-                    f"{role_icon} {player.get('role', 'player')}",
-                    player.get('matches', 0),
-                    ban_status
-                ))
-            
-            scrollbar = ttk.Scrollbar(table_frame, orient="vertical", command=tree.yview)
-            tree.configure(yscrollcommand=scrollbar.set)
+        # Создаем таблицу
+        table_frame = ttk.Frame(dialog)
+        table_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=10)
+        
+        # Treeview
+        columns = ("Ник", "ELO", "Роль", "Матчи", "Бан")
+        tree = ttk.Treeview(table_frame, columns=columns, show="headings", height=15)
+        
+        for col in columns:
+            tree.heading(col, text=col)
+            tree.column(col, width=150, anchor="center")
+        
+        def make_row(index, player):
+            ban_status = "✅" if not player.get('is_banned') else "❌"
+            role_icon = {
+                'admin': '🛡️',
+                'moderator': '👮',
+                'player': '👤'
+            }.get(player.get('role', 'player'), '👤')
+            
+            return (player.get('nickname', ''), (
+                player.get('nickname', ''),
+                player.get('elo', 0),
+                f"{role_icon} {player.get('role', 'player')}",
+                player.get('matches', 0),
+                ban_status
+            ), ())
+        
+        def load_page(offset, limit, callback, fresh=False):
+            # Страницы списка игроков подгружаются по мере прокрутки
+            def on_response(response):
+                if response and response.get('success'):
+                    callback(response.get('players', []), response.get('total'))
+                    status_var.set(f"Всего игроков: {response.get('total', 0)}")
+                else:
+                    callback(None, None)
+                    status_var.set("Не удалось загрузить список игроков")
             
-            tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-            scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+            self.request_async({
+                'action': 'admin_get_players',
+                'nickname': self.current_user,
+                'limit': limit,
+                'offset': offset
+            }, on_response, owner=dialog, use_cache=not fresh)
+        
+        scrollbar = ttk.Scrollbar(table_frame, orient="vertical")
+        view = VirtualTable(tree, scrollbar, load_page, make_row)
+        
+        tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        view.render()
+        
+        # Массовые действия над выбранными игроками (ключ строки - ник)
+        def selected_nicknames():
+            return [item for item in tree.selection() if not item.startswith("__loading_")]
+        
+        button_frame = ttk.Frame(dialog)
+        button_frame.pack(pady=(0, 10))
+        ttk.Button(button_frame, text="Забанить выбранных", style="Danger.TButton",
+                  command=lambda: self.show_ban_dialog(selected_nicknames())).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Разбанить выбранных", style="Success.TButton",
+                  command=lambda: self.show_unban_dialog(selected_nicknames())).pack(side=tk.LEFT, padx=5)
     
     def show_change_role_dialog(self):
         """Диалог изменения роли"""
@@ -845,8 +1235,8 @@ class FaceItOnlineTracker:
         ttk.Button(dialog, text="Применить", 
                   command=apply_role, style="Primary.TButton").pack(pady=20)
     
-    def show_ban_dialog(self):
-        """Диалог бана игрока"""
+    def show_ban_dialog(self, nicknames=()):
+        """Диалог бана игроков (несколько ников - через запятую)"""
         dialog = tk.Toplevel(self.root)
         dialog.title("Бан игрока")
         dialog.geometry("400x300")
@@ -856,8 +1246,8 @@ class FaceItOnlineTracker:
         ttk.Label(dialog, text="Бан игрока", 
                  font=("Arial", 14, "bold")).pack(pady=20)
         
-        ttk.Label(dialog, text="Никнейм игрока:").pack(anchor=tk.W, padx=20, pady=(10, 0))
-        nickname_var = tk.StringVar()
+        ttk.Label(dialog, text="Никнеймы игроков (через запятую):").pack(anchor=tk.W, padx=20, pady=(10, 0))
+        nickname_var = tk.StringVar(value=", ".join(nicknames))
         nickname_entry = ttk.Entry(dialog, textvariable=nickname_var, width=30)
         nickname_entry.pack(padx=20, pady=(5, 10))
         
@@ -872,8 +1262,8 @@ class FaceItOnlineTracker:
         days_entry.pack(padx=20, pady=(5, 10))
         
         def apply_ban():
-            nickname = nickname_var.get().strip()
-            if not nickname:
+            targets = parse_nicknames(nickname_var.get())
+            if not targets:
                 messagebox.showerror("Ошибка", "Введите никнейм игрока")
                 return
             
@@ -886,24 +1276,24 @@ class FaceItOnlineTracker:
                 return
             
             response = self.send_request({
-                'action': 'admin_ban_player',
+                'action': 'admin_ban_players',
                 'admin_nickname': self.current_user,
-                'target_nickname': nickname,
+                'target_nicknames': targets,
                 'reason': reason_var.get(),
                 'days': days
             })
             
             if response and response.get('success'):
-                messagebox.showinfo("Успех", response.get('message', 'Игрок забанен'))
+                messagebox.showinfo("Успех", bulk_result_message(response))
                 dialog.destroy()
             else:
-                messagebox.showerror("Ошибка", response.get('message', 'Ошибка бана'))
+                messagebox.showerror("Ошибка", (response or {}).get('message', 'Ошибка бана'))
         
         ttk.Button(dialog, text="Забанить", 
                   command=apply_ban, style="Danger.TButton").pack(pady=20)
     
-    def show_unban_dialog(self):
-        """Диалог разбана игрока"""
+    def show_unban_dialog(self, nicknames=()):
+        """Диалог разбана игроков (несколько ников - через запятую)"""
         dialog = tk.Toplevel(self.root)
         dialog.title("Разбан игрока")
         dialog.geometry("300x200")
@@ -913,173 +1303,285 @@ class FaceItOnlineTracker:
         ttk.Label(dialog, text="Разбан игрока", 
                  font=("Arial", 14, "bold")).pack(pady=20)
         
-        ttk.Label(dialog, text="Никнейм игрока:").pack(anchor=tk.W, padx=20, pady=(10, 0))
-        nickname_var = tk.StringVar()
+        ttk.Label(dialog, text="Никнеймы игроков (через запятую):").pack(anchor=tk.W, padx=20, pady=(10, 0))
+        nickname_var = tk.StringVar(value=", ".join(nicknames))
         nickname_entry = ttk.Entry(dialog, textvariable=nickname_var, width=30)
         nickname_entry.pack(padx=20, pady=(5, 10))
         
         def apply_unban():
-            nickname = nickname_var.get().strip()
-            if not nickname:
+            targets = parse_nicknames(nickname_var.get())
+            if not targets:
                 messagebox.showerror("Ошибка", "Введите никнейм игрока")
                 return
             
             response = self.send_request({
-                'action': 'admin_unban_player',
+                'action': 'admin_unban_players',
                 'admin_nickname': self.current_user,
-                'target_nickname': nickname
+                'target_nicknames': targets
             })
             
             if response and response.get('success'):
-                messagebox.showinfo("Успех", response.get('message', 'Игрок разбанен'))
+                messagebox.showinfo("Успех", bulk_result_message(response))
                 dialog.destroy()
             else:
-                messagebox.showerror("Ошибка", response.get('message', 'Ошибка разбана'))
+                messagebox.showerror("Ошибка", (response or {}).get('message', 'Ошибка разбана'))
         
         ttk.Button(dialog, text="Разбанить", 
                   command=apply_unban, style="Success.TButton").pack(pady=20)
     
     def show_match_management(self):
-        """Показать управление матчами"""
+        """Управление матчами: фильтры и подгрузка страниц при прокрутке"""
         dialog = tk.Toplevel(self.root)
         dialog.title("Управление матчами")
-        dialog.geometry("1000x600")
+        dialog.geometry("1100x650")
         dialog.transient(self.root)
         
-        ttk.Label(dialog, text="Последние матчи", 
-                 font=("Arial", 16, "bold")).pack(pady=20)
+        ttk.Label(dialog, text="Матчи", 
+                 font=("Arial", 16, "bold")).pack(pady=(20, 10))
         
-        # Получаем список матчей
-        response = self.send_request({
-            'action': 'admin_get_matches',
-            'nickname': self.current_user,
-            'limit': 30
-        })
+        # Панель фильтров
+        filter_frame = ttk.Frame(dialog)
+        filter_frame.pack(fill=tk.X, padx=20)
         
-        if response and response.get('success'):
-            matches = response.get('matches', [])
-            
-            # Создаем таблицу
-            table_frame = ttk.Frame(dialog)
-            table_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=10)
-            
-            # Treeview
-            columns = ("ID", "Игрок", "Результат", "Убийства", "Смерти", "HS%", "Статус")
-            tree = ttk.Treeview(table_frame, columns=columns, show="headings", height=15)
-            
-            column_config = [
-                ("ID", 50, "center"),
-                ("Игрок", 120, "center"),
-                ("Результат", 80, "center"),
-                ("Убийства", 80, "center"),
-                ("Смерти", 80, "center"),
-                ("HS%", 80, "center"),
-                ("Статус", 100, "center")
-            ]
-            
-            for col, width, anchor in column_config:
-                tree.heading(col, text=col)
-                tree.column(col, width=width, anchor=anchor)
-            
-            # Добавляем матчи
-            for match in matches:
-                result_icon = {
-                    'W': '✅',
-                    'L': '❌',
-                    'T': '⚫'
-                }.get(match.get('result', 'W'), '❓')
-                
-                status_icon = '✅' if match.get('is_verified') else '❓'
-                
-                tree.insert("", "end", values=(
-                    match.get('id', ''),
-                    match.get('player', ''),
-                    f"{result_icon} {match.get('result', '')}",
-                    match.get('kills', 0),
-                    match.get('deaths', 0),
-                    f"{match.get('hs_percentage', 0):.1f}%",
-                    status_icon
-                ))
+        ttk.Label(filter_frame, text="Игрок:").pack(side=tk.LEFT)
+        player_var = tk.StringVar()
+        ttk.Entry(filter_frame, textvariable=player_var, width=14).pack(side=tk.LEFT, padx=(2, 8))
+        
+        ttk.Label(filter_frame, text="Статус:").pack(side=tk.LEFT)
+        status_var = tk.StringVar(value="Все")
+        ttk.Combobox(filter_frame, textvariable=status_var, values=["Все", "Непроверенные", "Проверенные"],
+                     state="readonly", width=14).pack(side=tk.LEFT, padx=(2, 8))
+        
+        ttk.Label(filter_frame, text="Карта:").pack(side=tk.LEFT)
+        map_var = tk.StringVar(value="Все")
+        ttk.Combobox(filter_frame, textvariable=map_var, values=["Все"] + MAPS,
+                     state="readonly", width=10).pack(side=tk.LEFT, padx=(2, 8))
+        
+        ttk.Label(filter_frame, text="Результат:").pack(side=tk.LEFT)
+        result_var = tk.StringVar(value="Все")
+        ttk.Combobox(filter_frame, textvariable=result_var, values=["Все", "W", "L", "T"],
+                     state="readonly", width=5).pack(side=tk.LEFT, padx=(2, 8))
+        
+        ttk.Label(filter_frame, text="С (ГГГГ-ММ-ДД):").pack(side=tk.LEFT)
+        date_from_var = tk.StringVar()
+        ttk.Entry(filter_frame, textvariable=date_from_var, width=11).pack(side=tk.LEFT, padx=(2, 8))
+        
+        ttk.Label(filter_frame, text="По:").pack(side=tk.LEFT)
+        date_to_var = tk.StringVar()
+        ttk.Entry(filter_frame, textvariable=date_to_var, width=11).pack(side=tk.LEFT, padx=(2, 8))
+        
+        load_status_var = tk.StringVar()
+        ttk.Label(dialog, textvariable=load_status_var).pack(pady=(5, 0))
+        
+        # Таблица
+        table_frame = ttk.Frame(dialog)
+        table_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=10)
+        
+        columns = ("ID", "Игрок", "Результат", "Убийства", "Смерти", "HS%", "Карта", "Дата", "Статус")
+        tree = ttk.Treeview(table_frame, columns=columns, show="headings", height=15)
+        
+        column_config = [
+            ("ID", 60, "center"),
+            ("Игрок", 120, "center"),
+            ("Результат", 80, "center"),
+            ("Убийства", 80, "center"),
+            ("Смерти", 80, "center"),
+            ("HS%", 80, "center"),
+            ("Карта", 100, "center"),
+            ("Дата", 130, "center"),
+            ("Статус", 80, "center")
+        ]
+        
+        for col, width, anchor in column_config:
+            tree.heading(col, text=col)
+            tree.column(col, width=width, anchor=anchor)
+        
+        table = TableReconciler(tree)
+        scrollbar = ttk.Scrollbar(table_frame, orient="vertical", command=tree.yview)
+        tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        # Загруженные матчи (id -> матч) и курсор следующей страницы;
+        # generation отбрасывает ответы, пришедшие после смены фильтров
+        state = {'matches': {}, 'cursor': None, 'done': False, 'loading': False,
+                 'generation': 0, 'filters': {}}
+        
+        def make_row(match):
+            result_icon = {
+                'W': '✅',
+                'L': '❌',
+                'T': '⚫'
+            }.get(match.get('result', 'W'), '❓')
+            
+            return (match.get('id', ''), (
+                match.get('id', ''),
+                match.get('player', ''),
+                f"{result_icon} {match.get('result', '')}",
+                match.get('kills', 0),
+                match.get('deaths', 0),
+                f"{match.get('hs_percentage', 0):.1f}%",
+                match.get('map') or 'N/A',
+                match.get('date') or 'N/A',
+                '✅' if match.get('is_verified') else '❓'
+            ), ())
+        
+        def render():
+            table.update([make_row(match) for match in state['matches'].values()])
+            suffix = "" if state['done'] else " (прокрутите вниз, чтобы загрузить еще)"
+            load_status_var.set(f"Загружено матчей: {len(state['matches'])}{suffix}")
+        
+        def load_more():
+            if state['loading'] or state['done']:
+                return
+            state['loading'] = True
+            generation = state['generation']
+            load_status_var.set("⏳ Загрузка матчей...")
+            
+            request = {
+                'action': 'admin_get_matches',
+                'nickname': self.current_user,
+                'limit': ADMIN_MATCHES_PAGE,
+                'after_id': state['cursor']
+            }
+            request.update(state['filters'])
+            self.request_async(request, lambda response: on_page(generation, response), owner=dialog)
+        
+        def on_page(generation, response):
+            if generation != state['generation']:
+                return
+            state['loading'] = False
+            if not response or not response.get('success'):
+                load_status_var.set((response or {}).get('message', "Не удалось загрузить матчи"))
+                return
             
-            scrollbar = ttk.Scrollbar(table_frame, orient="vertical", command=tree.yview)
-            tree.configure(yscrollcommand=scrollbar.set)
+            for match in response.get('matches', []):
+                state['matches'][match['id']] = match
+            state['cursor'] = response.get('next_cursor')
+            state['done'] = state['cursor'] is None
+            render()
+            
+            # Таблица еще не заполнила окно - прокручивать нечего, грузим дальше
+            tree.update_idletasks()
+            if tree.yview()[1] >= 1.0:
+                load_more()
+        
+        def on_tree_scroll(first, last):
+            scrollbar.set(first, last)
+            if float(last) > 0.9:
+                load_more()
+        
+        tree.configure(yscrollcommand=on_tree_scroll)
+        
+        def read_filters():
+            """Фильтры запроса из панели или None при ошибке ввода"""
+            filters = {}
+            if player_var.get().strip():
+                filters['player'] = player_var.get().strip()
+            if status_var.get() != "Все":
+                filters['verified'] = status_var.get() == "Проверенные"
+            if map_var.get() != "Все":
+                filters['map'] = map_var.get()
+            if result_var.get() != "Все":
+                filters['result'] = result_var.get()
+            for var, key, time_part in ((date_from_var, 'date_from', "00:00"), (date_to_var, 'date_to', "23:59")):
+                value = var.get().strip()
+                if not value:
+                    continue
+                try:
+                    datetime.strptime(value, "%Y-%m-%d")
+                except ValueError:
+                    messagebox.showerror("Ошибка", "Дата должна быть в формате ГГГГ-ММ-ДД", parent=dialog)
+                    return None
+                filters[key] = f"{value} {time_part}"
+            return filters
+        
+        def apply_filters():
+            filters = read_filters()
+            if filters is None:
+                return
+            state.update(matches={}, cursor=None, done=False, loading=False, filters=filters)
+            state['generation'] += 1
+            render()
+            load_more()
+        
+        ttk.Button(filter_frame, text="Применить", command=apply_filters,
+                  style="Primary.TButton").pack(side=tk.LEFT, padx=5)
+        
+        # Контекстное меню
+        menu = tk.Menu(dialog, tearoff=0)
+        
+        def selected_ids():
+            """id матчей выбранных строк (Ctrl/Shift - несколько строк)"""
+            return [int(item) for item in tree.selection()]
+        
+        def set_verified(verify):
+            match_ids = selected_ids()
+            if not match_ids:
+                return
             
-            tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-            scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+            def on_response(response):
+                if response and response.get('success'):
+                    missing = set(response.get('missing', []))
+                    for match_id in match_ids:
+                        if match_id not in missing and match_id in state['matches']:
+                            state['matches'][match_id]['is_verified'] = verify
+                    render()
+                    messagebox.showinfo("Успех", response.get('message', 'Статус матчей обновлен'), parent=dialog)
+                else:
+                    messagebox.showerror("Ошибка", (response or {}).get('message', 'Ошибка обновления'),
+                                         parent=dialog)
             
-            # Контекстное меню
-            menu = tk.Menu(dialog, tearoff=0)
+            # Все выбранные матчи - один запрос и одна транзакция на сервере
+            self.request_async({
+                'action': 'admin_verify_matches',
+                'admin_nickname': self.current_user,
+                'match_ids': match_ids,
+                'verify': verify
+            }, on_response, owner=dialog)
+        
+        def delete_selected():
+            match_ids = selected_ids()
+            if not match_ids:
+                return
             
-            def verify_selected():
-                selection = tree.selection()
-                if selection:
-                    item = selection[0]
-                    values = tree.item(item)['values']
-                    match_id = values[0]
-                    
-                    response = self.send_request({
-                        'action': 'admin_verify_match',
-                        'admin_nickname': self.current_user,
-                        'match_id': match_id,
-                        'verify': True
-                    })
-                    
-                    if response and response.get('success'):
-                        messagebox.showinfo("Успех", "Матч подтвержден")
-                        tree.set(item, "Статус", "✅")
-            
-            def unverify_selected():
-                selection = tree.selection()
-                if selection:
-                    item = selection[0]
-                    values = tree.item(item)['values']
-                    match_id = values[0]
-                    
-                    response = self.send_request({
-                        'action': 'admin_verify_match',
-                        'admin_nickname': self.current_user,
-                        'match_id': match_id,
-                        'verify': False
-                    })
-                    
-                    if response and response.get('success'):
-                        messagebox.showinfo("Успех", "Матч отклонен")
-                        tree.set(item, "Статус", "❓")
-            
-            def delete_selected():
-                selection = tree.selection()
-                if selection:
-                    item = selection[0]
-                    values = tree.item(item)['values']
-                    match_id = values[0]
-                    
-                    # Подтверждение удаления
-                    if not messagebox.askyesno("Подтверждение", f"Вы уверены, что хотите удалить матч #{match_id}?"):
-                        return
-                    
-                    response = self.send_request({
-                        'action': 'admin_delete_match',
-                        'admin_nickname': self.current_user,
-                        'match_id': match_id
-                    })
-                    
-                    if response and response.get('success'):
-                        messagebox.showinfo("Успех", "Матч удален")
-                        tree.delete(item)
-                    else:
-                        messagebox.showerror("Ошибка", response.get('message', 'Ошибка удаления матча'))
+            # Подтверждение удаления
+            question = (f"Вы уверены, что хотите удалить матч #{match_ids[0]}?" if len(match_ids) == 1 else
+                        f"Вы уверены, что хотите удалить выбранные матчи ({len(match_ids)})?")
+            if not messagebox.askyesno("Подтверждение", question, parent=dialog):
+                return
             
-            menu.add_command(label="Подтвердить матч", command=verify_selected)
-            menu.add_command(label="Отклонить матч", command=unverify_selected)
-            menu.add_command(label="Удалить матч", command=delete_selected)
+            def on_response(response):
+                if response and response.get('success'):
+                    for match_id in match_ids:
+                        state['matches'].pop(match_id, None)
+                    render()
+                    messagebox.showinfo("Успех", response.get('message', 'Матчи удалены'), parent=dialog)
+                else:
+                    messagebox.showerror("Ошибка", (response or {}).get('message', 'Ошибка удаления матчей'),
+                                         parent=dialog)
             
-            def show_context_menu(event):
-                item = tree.identify_row(event.y)
-                if item:
+            self.request_async({
+                'action': 'admin_delete_matches',
+                'admin_nickname': self.current_user,
+                'match_ids': match_ids
+            }, on_response, owner=dialog)
+        
+        menu.add_command(label="Подтвердить выбранные", command=lambda: set_verified(True))
+        menu.add_command(label="Отклонить выбранные", command=lambda: set_verified(False))
+        menu.add_command(label="Удалить выбранные", command=delete_selected)
+        
+        def show_context_menu(event):
+            item = tree.identify_row(event.y)
+            if item:
+                # Щелчок вне выделения выбирает одну строку, внутри - сохраняет выделение
+                if item not in tree.selection():
                     tree.selection_set(item)
-                    menu.post(event.x_root, event.y_root)
-            
-            tree.bind("<Button-3>", show_context_menu)
+                menu.post(event.x_root, event.y_root)
+        
+        tree.bind("<Button-3>", show_context_menu)
+        
+        # Первая страница без фильтров
+        load_more()
     
     def show_server_stats(self):
         """Показать статистику сервера"""
@@ -1409,10 +1911,14 @@ class FaceItOnlineTracker:
         """Выход пользователя"""
         self.current_user = None
         self.current_role = None
+        self.session_credentials = None
+        self.current_chat_partner = None
         self.user_info_var.set("Гость")
+        self.response_cache.clear()
+        self.unsubscribe('chat')
         
         # Удаляем админ-панель если она есть
-        notebook = self.root.winfo_children()[1]
+        notebook = self.notebook
         for tab_id in notebook.tabs():
             if "🛡️ Админ-панель" in notebook.tab(tab_id, "text"):
                 notebook.forget(tab_id)
@@ -1422,11 +1928,7 @@ class FaceItOnlineTracker:
     
     def get_current_level(self):
         """Определение текущего уровня по ELO"""
-        elo = self.local_stats.get('elo', 1050)
-        for level, data in self.levels.items():
-            if data["min_elo"] <= elo <= data["max_elo"]:
-                return level
-        return 1
+        return level_from_elo(self.local_stats.get('elo', 1050))
     
     def get_random_elo_change(self, result='W'):
         """Случайное изменение ELO"""
@@ -1467,19 +1969,23 @@ class FaceItOnlineTracker:
         # Обновляем историю
         self.update_history_display()
         
-        # Обновляем график ELO если доступен
-        if MATPLOTLIB_AVAILABLE and hasattr(self, 'elo_chart_frame') and self.elo_chart_frame:
-            self.update_elo_chart()
+        # Дописываем новые матчи в график ELO
+        self.update_elo_chart()
     
     def update_history_display(self):
         """Обновление отображения истории"""
-        # Очищаем таблицу
-        for item in self.history_tree.get_children():
-            self.history_tree.delete(item)
+        if not hasattr(self, 'history_table'):
+            # Вкладка еще не открывалась - заполнится при создании
+            return
         
-        # Добавляем матчи
-        match_details = self.local_stats.get('match_details', [])
-        for i, match in enumerate(reversed(match_details[-50:]), 1):
+        # Добавляем матчи (из индексированной базы, если она есть)
+        if self.match_db:
+            recent_matches = self.match_db.recent_matches(50)
+        else:
+            recent_matches = list(reversed(self.local_stats.get('match_details', [])[-50:]))
+        
+        rows = []
+        for i, match in enumerate(recent_matches, 1):
             result_text = "Победа ✅" if match.get('result') == 'W' else \
                          "Поражение ❌" if match.get('result') == 'L' else "Ничья ⚫"
             
@@ -1487,7 +1993,8 @@ class FaceItOnlineTracker:
             elo_change_text = f"+{elo_change}" if match.get('result') == 'W' else \
                              f"-{elo_change}" if match.get('result') == 'L' else "0"
             
-            self.history_tree.insert("", "end", values=(
+            # Ключ строки - идентификатор матча (у старых матчей без него - позиция)
+            rows.append((match.get('match_id') or f"#{i}", (
                 i,
                 result_text,
                 match.get('elo_after', 0),
@@ -1496,83 +2003,102 @@ class FaceItOnlineTracker:
                 match.get('deaths', 0),
                 f"{match.get('kd', 0):.2f}",
                 f"{match.get('hs', 0):.1f}%",
-                match.get('map', 'N/A'),
-                match.get('date', 'N/A')
-            ))
+                match.get('map') or 'N/A',
+                match.get('date') or 'N/A'
+            ), ()))
+        
+        self.history_table.update(rows)
     
     def update_scoreboard(self, event=None):
         """Обновление скорборда"""
+        if not hasattr(self, 'scoreboard_view'):
+            return
+        
         if not self.connected:
             messagebox.showinfo("Информация", "Нет подключения к серверу")
             return
         
-        # Очищаем таблицу
-        for item in self.scoreboard_tree.get_children():
-            self.scoreboard_tree.delete(item)
+        if event is not None:
+            # Сменилась сортировка - загруженные страницы больше не нужны
+            self.scoreboard_view.reset()
+        else:
+            self.scoreboard_view.refresh()
+    
+    def load_scoreboard_page(self, offset, limit, callback, fresh=False):
+        """Фоновая загрузка страницы скорборда для VirtualTable.
         
-        # Получаем данные с сервера
-        response = self.send_request({
+        fresh - перезагрузка кнопкой "Обновить" или по push-сообщению: в обход кэша ответов.
+        """
+        if not self.connected:
+            callback(None, None)
+            return
+        
+        self.scoreboard_status_var.set("⏳ Загрузка...")
+        
+        def on_response(response):
+            if response and isinstance(response, dict) and response.get('success'):
+                page = response.get('leaderboard', [])
+                # Уровни всей страницы одним проходом
+                for player, level in zip(page, levels_from_elos([p.get('elo', 0) for p in page])):
+                    player['level'] = level
+                callback(page, response.get('total'))
+            else:
+                callback(None, None)
+            if not self.scoreboard_view.is_loading:
+                self.scoreboard_status_var.set("" if response else "Нет ответа")
+        
+        self.request_async({
             'action': 'get_leaderboard',
             'sort_by': self.sort_var.get(),
-            'limit': 100
-        })
-        
-        if not response:
-            messagebox.showerror("Ошибка", "Нет ответа от сервера")
+            'offset': offset,
+            'limit': limit
+        }, on_response, use_cache=not fresh)
+    
+    def make_scoreboard_row(self, index, player):
+        """Строка скорборда для места index (с 0), ключ - ник игрока"""
+        nickname = player.get('nickname', 'Unknown')
+        elo = player.get('elo', 0)
+        wins = player.get('wins', 0)
+        losses = player.get('losses', 0)
+        win_percentage = player.get('win_percentage', 0)
+        avg_kd = player.get('avg_kd', 0)
+        avg_hs = player.get('avg_hs', 0)
+        avg_kills = player.get('avg_kills', 0)
+        
+        return (nickname, (
+            index + 1,
+            nickname,
+            player.get('level') or level_from_elo(elo),
+            elo,
+            wins,
+            losses,
+            f"{win_percentage:.1f}%",
+            f"{avg_kd:.2f}",
+            f"{avg_hs:.1f}%",
+            f"{avg_kills:.1f}"
+        ), ())
+    
+    def show_my_rank(self):
+        """Переход к своей строке скорборда"""
+        if not self.current_user:
+            messagebox.showerror("Ошибка", "Сначала войдите в систему")
             return
-        
-        # Обработка ответа
-        if isinstance(response, dict) and response.get('success'):
-            leaderboard = response.get('leaderboard', [])
-        elif isinstance(response, list):
-            # Если сервер возвращает список напрямую
-            leaderboard = response
-        else:
-            messagebox.showerror("Ошибка", "Не удалось загрузить скорборд")
+        if not self.connected:
+            messagebox.showerror("Ошибка", "Нет подключения к серверу")
             return
         
-        # Добавляем данные в таблицу
-        for i, player in enumerate(leaderboard, 1):
-            # Получаем данные игрока
-            if isinstance(player, dict):
-                nickname = player.get('nickname', 'Unknown')
-                elo = player.get('elo', 0)
-                wins = player.get('wins', 0)
-                losses = player.get('losses', 0)
-                win_percentage = player.get('win_percentage', 0)
-                avg_kd = player.get('avg_kd', 0)
-                avg_hs = player.get('avg_hs', 0)
-                avg_kills = player.get('avg_kills', 0)
+        def on_response(response):
+            if response and response.get('success'):
+                self.scoreboard_view.scroll_to(response['rank'] - 1, key=self.current_user)
+                self.scoreboard_status_var.set(f"Место: {response['rank']} из {response['total']}")
             else:
-                # Если это не словарь, пропускаем
-                continue
-            
-            # Определяем уровень
-            level = 1
-            for lvl, data in self.levels.items():
-                if data["min_elo"] <= elo <= data["max_elo"]:
-                    level = lvl
-                    break
-            
-            # Форматируем данные
-            win_rate = f"{win_percentage:.1f}%"
-            kd = f"{avg_kd:.2f}"
-            hs = f"{avg_hs:.1f}%"
-            avg_kills_fmt = f"{avg_kills:.1f}"
-            
-            # Вставляем строку
-            self.scoreboard_tree.insert("", "end", values=(
-                i,
-                nickname,
-                level,
-                elo,
-                wins,
-                losses,
-                win_rate,
-                kd,
-                hs,
-                avg_kills_fmt
-            ))
+                messagebox.showerror("Ошибка", (response or {}).get('message', 'Нет ответа от сервера'))
+        
+        self.request_async({
+            'action': 'get_rank',
+            'nickname': self.current_user,
+            'sort_by': self.sort_var.get()
+        }, on_response, use_cache=False)
     
     def sync_with_server(self):
         """Синхронизация с сервером"""
@@ -1584,12 +2110,8 @@ class FaceItOnlineTracker:
             messagebox.showerror("Ошибка", "Нет подключения к серверу")
             return
         
-        # Отправляем статистику на сервер
-        response = self.send_request({
-            'action': 'update_stats',
-            'nickname': self.current_user,
-            'stats': self.local_stats
-        })
+        # Отправляем на сервер только еще не подтвержденные матчи
+        response = self.send_request(self.build_sync_request())
         
         if response:
             if isinstance(response, list):
@@ -1599,6 +2121,7 @@ class FaceItOnlineTracker:
                     messagebox.showerror("Ошибка", response[1])
             elif isinstance(response, dict):
                 if response.get('success'):
+                    self.apply_sync_ack(response)
                     messagebox.showinfo("Успех", "Статистика синхронизирована с сервером")
                 else:
                     messagebox.showerror("Ошибка", "Ошибка синхронизации")
@@ -1615,13 +2138,25 @@ class FaceItOnlineTracker:
             messagebox.showerror("Ошибка", "Нет подключения к серверу")
             return
         
-        response = self.send_request({
+        self.sync_status_var.set("⏳ Загрузка статистики с сервера...")
+        # Запрашиваем только изменения после последней известной версии
+        self.request_async({
             'action': 'get_stats',
-            'nickname': self.current_user
-        })
+            'nickname': self.current_user,
+            'since_version': self.local_stats.get('sync_version', 0)
+        }, self.on_server_stats_loaded, use_cache=False)
+    
+    def on_server_stats_loaded(self, response):
+        """Применение статистики, загруженной с сервера"""
+        self.sync_status_var.set("")
         
         if response:
-            if isinstance(response, dict) and response.get('success'):
+            if isinstance(response, dict) and response.get('success') and 'version' in response:
+                changes = self.apply_server_delta(response)
+                self.save_local_data()
+                self.update_display()
+                messagebox.showinfo("Успех", f"Статистика загружена с сервера (изменений: {changes})")
+            elif isinstance(response, dict) and response.get('success'):
                 server_stats = response.get('stats')
                 if server_stats:
                     # Обновляем локальную статистику
@@ -1653,6 +2188,107 @@ class FaceItOnlineTracker:
         else:
             messagebox.showerror("Ошибка", "Нет ответа от сервера")
     
+    def get_stats_summary(self):
+        """Сводная статистика без истории матчей и служебных полей"""
+        return {key: value for key, value in self.local_stats.items()
+                if key not in ('match_details', 'match_history', 'sync_version')}
+    
+    def ensure_match_ids(self):
+        """Выдача идентификаторов матчам, сохраненным старыми версиями клиента"""
+        assigned = 0
+        for match in self.local_stats.get('match_details', []):
+            if 'match_id' not in match:
+                match['match_id'] = uuid.uuid4().hex
+                assigned += 1
+        return assigned
+    
+    def build_sync_request(self):
+        """Запрос инкрементальной синхронизации.
+        
+        Матч считается синхронизированным, когда сервер присвоил ему seq.
+        Сервер пропускает уже известные match_id, поэтому повторная отправка безопасна.
+        """
+        pending = [match for match in self.local_stats.get('match_details', [])
+                   if 'seq' not in match]
+        return {
+            'action': 'update_stats',
+            'nickname': self.current_user,
+            'mode': 'delta',
+            'base_version': self.local_stats.get('sync_version', 0),
+            'summary': self.get_stats_summary(),
+            'matches': pending
+        }
+    
+    def apply_sync_ack(self, response):
+        """Отметка матчей, подтвержденных сервером"""
+        acked = response.get('acked', {})
+        updates = {}
+        for match in self.local_stats.get('match_details', []):
+            if match.get('match_id') in acked:
+                match['seq'] = acked[match['match_id']]
+                updates[match['match_id']] = {'seq': match['seq']}
+        
+        # Версию можно сдвинуть, только если между нашей версией и записью
+        # на сервере не появилось чужих изменений (например, с другого ПК)
+        if 'version' in response and \
+                response.get('previous_version') == self.local_stats.get('sync_version', 0):
+            self.local_stats['sync_version'] = response['version']
+        
+        try:
+            self.local_store.append_patch(self.local_stats, updates)
+        except Exception as e:
+            print(f"Ошибка сохранения локальных данных: {e}")
+    
+    def apply_server_delta(self, response):
+        """Применение изменений с сервера, возвращает количество изменений"""
+        match_details = self.local_stats.setdefault('match_details', [])
+        by_id = {match.get('match_id'): match for match in match_details}
+        changes = 0
+        
+        # Новые матчи (в том числе добавленные с другого устройства)
+        for match in response.get('new_matches', []):
+            local_match = by_id.get(match.get('match_id'))
+            if local_match is not None:
+                local_match['seq'] = match.get('seq')
+            else:
+                match_details.append(match)
+                changes += 1
+        
+        # Матчи, удаленные на сервере (например, администратором)
+        deleted = set(response.get('deleted_matches', []))
+        if deleted:
+            before = len(match_details)
+            match_details[:] = [m for m in match_details if m.get('match_id') not in deleted]
+            changes += before - len(match_details)
+        
+        match_details.sort(key=lambda m: (m.get('seq') is None, m.get('seq') or 0))
+        
+        # Сводка сервера верна, только если все локальные матчи уже на сервере
+        server_stats = response.get('stats') or {}
+        if all('seq' in match for match in match_details):
+            for key in self.get_stats_summary():
+                if key in server_stats:
+                    self.local_stats[key] = server_stats[key]
+        
+        self.local_stats['sync_version'] = response['version']
+        return changes
+    
+    def add_match_to_summary(self, match):
+        """Добавление матча к сводке без полной истории (для старых данных)"""
+        stats = self.local_stats
+        result_field = {'W': 'wins', 'L': 'losses'}.get(match['result'], 'ties')
+        stats[result_field] = stats.get(result_field, 0) + 1
+        
+        old_matches = stats.get('matches', 0)
+        matches = old_matches + 1
+        stats['matches'] = matches
+        stats['total_kills'] = stats.get('total_kills', 0) + match['kills']
+        stats['total_deaths'] = stats.get('total_deaths', 0) + match['deaths']
+        stats['avg_kd'] = round((stats.get('avg_kd', 0) * old_matches + match['kd']) / matches, 2)
+        stats['avg_hs'] = round((stats.get('avg_hs', 0) * old_matches + match['hs']) / matches, 1)
+        stats['avg_kills'] = round(stats['total_kills'] / matches, 1)
+        stats['win_percentage'] = round(stats.get('wins', 0) / matches * 100, 1)
+    
     def add_match_online(self):
         """Добавление матча с синхронизацией на сервер"""
         try:
@@ -1692,39 +2328,14 @@ class FaceItOnlineTracker:
         elo_change = self.get_random_elo_change(result_char)
         
         if result_char == "W":
-            self.local_stats['wins'] = self.local_stats.get('wins', 0) + 1
             self.local_stats['elo'] = self.local_stats.get('elo', 1050) + elo_change
         elif result_char == "L":
-            self.local_stats['losses'] = self.local_stats.get('losses', 0) + 1
             self.local_stats['elo'] = self.local_stats.get('elo', 1050) - elo_change
         else:
-            self.local_stats['ties'] = self.local_stats.get('ties', 0) + 1
             elo_change = 0
         
-        self.local_stats['matches'] = self.local_stats.get('matches', 0) + 1
-        
-        # Обновляем общую статистику
-        self.local_stats['total_kills'] = self.local_stats.get('total_kills', 0) + kills
-        self.local_stats['total_deaths'] = self.local_stats.get('total_deaths', 0) + deaths
-        
-        # Пересчитываем средние значения
-        old_matches = self.local_stats['matches'] - 1
-        self.local_stats['avg_kd'] = round(
-            (self.local_stats.get('avg_kd', 0) * old_matches + kd_ratio) / self.local_stats['matches'], 2
-        )
-        
-        self.local_stats['avg_hs'] = round(
-            (self.local_stats.get('avg_hs', 0) * old_matches + hs) / self.local_stats['matches'], 1
-        )
-        
-        self.local_stats['avg_kills'] = round(
-            self.local_stats['total_kills'] / self.local_stats['matches'], 1
-        )
-        
-        # Процент побед
-        self.local_stats['win_percentage'] = round(
-            (self.local_stats['wins'] / self.local_stats['matches']) * 100, 1
-        )
+        # Полная ли история матчей (до добавления нового)
+        history_complete = len(self.local_stats.get('match_details', [])) >= self.local_stats.get('matches', 0)
         
         # Сохраняем детали матча
         match_detail = {
@@ -1737,24 +2348,28 @@ class FaceItOnlineTracker:
             'kd': kd_ratio,
             'hs': hs,
             'map': map_name,
-            'date': datetime.now().strftime("%Y-%m-%d %H:%M")
+            'date': datetime.now().strftime("%Y-%m-%d %H:%M"),
+            'match_id': uuid.uuid4().hex
         }
         
         if 'match_details' not in self.local_stats:
             self.local_stats['match_details'] = []
         self.local_stats['match_details'].append(match_detail)
         
-        # Сохраняем локально
-        self.save_local_data()
+        if history_complete:
+            # Все агрегаты точно по истории матчей
+            self.recompute_local_stats()
+        else:
+            # В истории не все матчи - обновляем сводку по новому матчу
+            self.add_match_to_summary(match_detail)
+        
+        # Сохраняем локально (одна строка в журнале)
+        self.save_match_locally(match_detail)
         
         # Синхронизируем с сервером
         if self.connected:
-            response = self.send_request({
-                'action': 'update_stats',
-                'nickname': self.current_user,
-                'stats': self.local_stats,
-                'match': match_detail
-            })
+            # Вместе с новым матчем уйдут и ранее не отправленные
+            response = self.send_request(self.build_sync_request())
             
             if response:
                 if isinstance(response, list):
@@ -1764,15 +2379,16 @@ class FaceItOnlineTracker:
                         self.add_status_var.set(f"⚠️ {response[1]}")
                 elif isinstance(response, dict):
                     if response.get('success'):
+                        self.apply_sync_ack(response)
                         self.add_status_var.set("✅ Матч добавлен и синхронизирован!")
                     else:
                         self.add_status_var.set("⚠️ Матч добавлен локально, но не синхронизирован")
                 else:
                     self.add_status_var.set("⚠️ Матч добавлен локально, но не синхронизирован")
             else:
-                self.add_status_var.set("⚠️ Матч добавлен только локально")
+                self.add_status_var.set("⚠️ Матч сохранен и будет отправлен при подключении")
         else:
-            self.add_status_var.set("⚠️ Матч добавлен только локально")
+            self.add_status_var.set("⚠️ Матч сохранен и будет отправлен при подключении")
         
         # Очищаем поля
         self.match_result_var.set("")
@@ -1807,10 +2423,9 @@ class FaceItOnlineTracker:
                               "Ничьи", "Винрейт", "K/D", "HS%", "AVG убийств"]
                     writer.writerow(headers)
                     
-                    # Данные
-                    for item in self.scoreboard_tree.get_children():
-                        values = self.scoreboard_tree.item(item)['values']
-                        writer.writerow(values)
+                    # Данные: все загруженные страницы, а не только видимые строки
+                    for index, player in self.scoreboard_view.cached_items():
+                        writer.writerow(self.make_scoreboard_row(index, player)[1])
                 
                 messagebox.showinfo("Успех", f"Скорборд экспортирован в {filename}")
                 
@@ -1821,13 +2436,12 @@ class FaceItOnlineTracker:
         """Сравнение с другим игроком"""
         # Получаем выбранного игрока
         selection = self.scoreboard_tree.selection()
-        if not selection:
+        if not selection or selection[0].startswith("__loading_"):
             messagebox.showinfo("Информация", "Выберите игрока для сравнения")
             return
         
-        item = selection[0]
-        values = self.scoreboard_tree.item(item)['values']
-        player_nickname = values[1]  # Второй столбец - ник
+        # Ключ строки скорборда - ник игрока
+        player_nickname = selection[0]
         
         # Получаем статистику игрока
         if self.connected:
@@ -1911,10 +2525,7 @@ class FaceItOnlineTracker:
     
     def get_level_from_elo(self, elo):
         """Определение уровня по ELO"""
-        for level, data in self.levels.items():
-            if data["min_elo"] <= elo <= data["max_elo"]:
-                return level
-        return 1
+        return level_from_elo(elo)
     
     def create_seasons_tab(self):
         """Создание вкладки сезонов"""
@@ -2048,6 +2659,9 @@ class FaceItOnlineTracker:
     
     def update_seasons(self):
         """Обновление списка сезонов"""
+        if not hasattr(self, 'seasons_tree'):
+            return
+        
         if not self.connected:
             messagebox.showinfo("Информация", "Нет подключения к серверу")
             return
@@ -2157,7 +2771,7 @@ class FaceItOnlineTracker:
     
     def update_chats_list(self):
         """Обновление списка чатов"""
-        if not self.current_user:
+        if not self.current_user or not hasattr(self, 'chats_listbox'):
             return
         
         if not self.connected:
@@ -2196,7 +2810,9 @@ class FaceItOnlineTracker:
         })
         
         if response and response.get('success'):
+            self.current_chat_partner = other_player
             messages = response.get('messages', [])
+            self.chat_message_ids = {msg.get('id') for msg in messages}
             self.messages_text.delete(1.0, tk.END)
             for msg in messages:
                 sender = msg.get('sender', 'Unknown')
@@ -2218,18 +2834,17 @@ class FaceItOnlineTracker:
             messagebox.showerror("Ошибка", "Введите получателя и сообщение")
             return
         
-        if not self.connected:
-            messagebox.showerror("Ошибка", "Нет подключения к серверу")
-            return
-        
-        response = self.send_request({
+        response = self.send_write({
             'action': 'send_message',
             'sender_nickname': self.current_user,
             'receiver_nickname': receiver,
             'message_text': message_text
         })
         
-        if response and response.get('success'):
+        if response is None:
+            self.message_var.set("")
+            messagebox.showinfo("Информация", "Сообщение в очереди и будет отправлено автоматически")
+        elif response.get('success'):
             self.message_var.set("")
             self.load_chat_messages(receiver)
         else:
@@ -2264,6 +2879,7 @@ class FaceItOnlineTracker:
         
         columns = ("Название", "Начало", "Конец", "Участники", "Призовой фонд", "Статус")
         self.tournaments_tree = ttk.Treeview(table_frame, columns=columns, show="headings", height=15)
+        self.tournaments_table = TableReconciler(self.tournaments_tree)
         
         for col in columns:
             self.tournaments_tree.heading(col, text=col)
@@ -2283,10 +2899,14 @@ class FaceItOnlineTracker:
         
         ttk.Button(button_frame, text="Зарегистрироваться на турнир", 
                   command=self.register_for_selected_tournament).pack(side=tk.LEFT, padx=5)
+        
+        # Турниры, пришедшие push-сообщениями до открытия вкладки
+        if self.tournaments_data:
+            self.render_tournaments()
     
     def update_tournaments(self):
         """Обновление списка турниров"""
-        if not self.connected:
+        if not self.connected or not hasattr(self, 'tournaments_tree'):
             return
         
         status = self.tournament_status_var.get()
@@ -2298,26 +2918,33 @@ class FaceItOnlineTracker:
         })
         
         if response and response.get('success'):
-            tournaments = response.get('tournaments', [])
-            for item in self.tournaments_tree.get_children():
-                self.tournaments_tree.delete(item)
-            
-            for tour in tournaments:
-                status_text = {
-                    'planned': 'Запланирован',
-                    'ongoing': 'Идет',
-                    'finished': 'Завершен',
-                    'cancelled': 'Отменен'
-                }.get(tour.get('status', 'planned'), 'Неизвестно')
-                
-                self.tournaments_tree.insert("", "end", values=(
-                    tour.get('name', ''),
-                    tour.get('start_date', ''),
-                    tour.get('end_date', ''),
-                    f"{tour.get('current_players', 0)}/{tour.get('max_players', 16)}",
-                    tour.get('prize_pool', 'Нет'),
-                    status_text
-                ), tags=(tour.get('id'),))
+            self.tournaments_data = response.get('tournaments', [])
+            self.render_tournaments()
+    
+    def render_tournaments(self):
+        """Отрисовка таблицы турниров с учетом фильтра по статусу"""
+        status = self.tournament_status_var.get()
+        rows = []
+        for tour in self.tournaments_data:
+            if status != "all" and tour.get('status') != status:
+                continue
+            status_text = {
+                'planned': 'Запланирован',
+                'ongoing': 'Идет',
+                'finished': 'Завершен',
+                'cancelled': 'Отменен'
+            }.get(tour.get('status', 'planned'), 'Неизвестно')
+            
+            rows.append((tour.get('id'), (
+                tour.get('name', ''),
+                tour.get('start_date', ''),
+                tour.get('end_date', ''),
+                f"{tour.get('current_players', 0)}/{tour.get('max_players', 16)}",
+                tour.get('prize_pool', 'Нет'),
+                status_text
+            ), (tour.get('id'),)))
+        
+        self.tournaments_table.update(rows)
     
     def on_tournament_double_click(self, event):
         """Обработка двойного клика на турнир"""
@@ -2347,13 +2974,15 @@ class FaceItOnlineTracker:
         
         tournament_id = int(tags[0])
         
-        response = self.send_request({
+        response = self.send_write({
             'action': 'register_for_tournament',
             'nickname': self.current_user,
             'tournament_id': tournament_id
         })
         
-        if response and response.get('success'):
+        if response is None:
+            messagebox.showinfo("Информация", "Заявка в очереди и будет отправлена автоматически")
+        elif response.get('success'):
             messagebox.showinfo("Успех", response.get('message', 'Регистрация успешна!'))
             self.update_tournaments()
         else:
@@ -2378,22 +3007,64 @@ class FaceItOnlineTracker:
             messagebox.showerror("Ошибка", "Нет подключения к серверу")
             return
         
-        response = self.send_request({
-            'action': 'get_detailed_player_profile',
-            'nickname': nickname
-        })
+        # Окно открывается сразу, данные подгружаются в фоне
+        dialog = tk.Toplevel(self.root)
+        dialog.title(f"Профиль: {nickname}")
+        dialog.geometry("700x600")
+        dialog.transient(self.root)
+        
+        loading_label = ttk.Label(dialog, text="⏳ Загрузка профиля...", font=("Arial", 12))
+        loading_label.pack(pady=40)
+        
+        # Закрытие окна отменяет загрузку
+        self.executor.submit(
+            self.fetch_player_profile,
+            lambda responses: self.fill_player_profile(dialog, loading_label, nickname, responses),
+            nickname, owner=dialog)
+    
+    def fetch_player_profile(self, nickname):
+        """Загрузка всех данных профиля (выполняется в фоновом потоке)"""
+        requests = {
+            'profile': {'action': 'get_detailed_player_profile', 'nickname': nickname},
+            'season_comparison': {'action': 'get_season_comparison', 'nickname': nickname}
+        }
+        if MATPLOTLIB_AVAILABLE:
+            requests['elo_history'] = {'action': 'get_elo_history', 'nickname': nickname,
+                                       'points': ELO_CHART_POINTS}
+        
+        # Свою статистику по картам и времени считаем по локальной базе
+        local = {}
+        if nickname == self.current_user and self.match_db:
+            local['map_statistics'] = {'success': True, 'stats': self.match_db.map_statistics()}
+            local['time_statistics'] = {'success': True, 'stats': self.match_db.time_statistics()}
+        elif nickname == self.current_user:
+            # Без sqlite3 карты считаем по истории в памяти
+            maps = compute_aggregates(self.local_stats.get('match_details', []))['maps']
+            local['map_statistics'] = {'success': True, 'stats': maps}
+            requests['time_statistics'] = {'action': 'get_time_statistics', 'nickname': nickname}
+        else:
+            requests['map_statistics'] = {'action': 'get_map_statistics', 'nickname': nickname}
+            requests['time_statistics'] = {'action': 'get_time_statistics', 'nickname': nickname}
+        
+        # Все запросы профиля уходят одним сообщением
+        results = self.send_batch(list(requests.values()))
+        responses = dict(zip(requests.keys(), results))
+        responses.update(local)
+        return responses
+    
+    def fill_player_profile(self, dialog, loading_label, nickname, responses):
+        """Заполнение окна профиля загруженными данными"""
+        responses = responses or {}
+        response = responses.get('profile')
         
         if not response or not response.get('success'):
+            dialog.destroy()
             messagebox.showerror("Ошибка", "Не удалось загрузить профиль")
             return
         
+        loading_label.destroy()
         profile = response.get('profile', {})
         
-        dialog = tk.Toplevel(self.root)
-        dialog.title(f"Профиль: {nickname}")
-        dialog.geometry("700x600")
-        dialog.transient(self.root)
-        
         # Создаем notebook для вкладок
         notebook = ttk.Notebook(dialog)
         notebook.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
@@ -2431,67 +3102,66 @@ AVG убийств: {profile.get('avg_kills', 0):.1f}
         if MATPLOTLIB_AVAILABLE:
             elo_tab = ttk.Frame(notebook)
             notebook.add(elo_tab, text="График ELO")
-            self.create_elo_chart(elo_tab, nickname)
+            self.create_elo_chart(elo_tab, nickname, responses.get('elo_history'))
         
         # Вкладка статистики по картам
         maps_tab = ttk.Frame(notebook)
         notebook.add(maps_tab, text="Статистика по картам")
-        self.create_map_statistics_tab(maps_tab, nickname)
+        self.create_map_statistics_tab(maps_tab, responses.get('map_statistics'))
         
         # Вкладка статистики по времени
         time_tab = ttk.Frame(notebook)
         notebook.add(time_tab, text="Статистика по времени")
-        self.create_time_statistics_tab(time_tab, nickname)
+        self.create_time_statistics_tab(time_tab, responses.get('time_statistics'))
         
         # Вкладка сравнения сезонов
         seasons_tab = ttk.Frame(notebook)
         notebook.add(seasons_tab, text="Сравнение сезонов")
-        self.create_season_comparison_tab(seasons_tab, nickname)
+        self.create_season_comparison_tab(seasons_tab, responses.get('season_comparison'))
     
-    def create_elo_chart(self, parent, nickname):
+    def create_elo_chart(self, parent, nickname, response):
         """Создание графика изменения ELO"""
         if not MATPLOTLIB_AVAILABLE:
             ttk.Label(parent, text="Для отображения графика установите matplotlib:\npip install matplotlib").pack(pady=20)
             return
         
-        response = self.send_request({
-            'action': 'get_elo_history',
-            'nickname': nickname,
-            'limit': 100
-        })
-        
         if not response or not response.get('success'):
             ttk.Label(parent, text="Не удалось загрузить историю ELO").pack(pady=20)
             return
         
+        # Вся карьера, прореженная сервером; при приближении - точные точки участка
         history = response.get('history', [])
-        if not history:
-            ttk.Label(parent, text="Нет данных для отображения").pack(pady=20)
+        chart = EloChart(parent, title=f'Изменение ELO: {nickname}', max_points=None,
+                         figsize=(10, 6), markersize=4,
+                         on_zoom=lambda x0, x1: self.load_elo_detail(chart, nickname, history, x0, x1))
+        # Старый сервер не прореживает и не возвращает index
+        chart.set_history([h['elo'] for h in history],
+                          [h.get('index', i) for i, h in enumerate(history)])
+    
+    def load_elo_detail(self, chart, nickname, history, x0, x1):
+        """Загрузка точных точек ELO для приближенного участка графика"""
+        if not history or 'index' not in history[0]:
             return
         
-        fig = Figure(figsize=(10, 6), dpi=100)
-        ax = fig.add_subplot(111)
+        # Участок задается номерами матчей: даты офлайн-матчей могут идти не по порядку
+        index_from = max(0, math.floor(x0))
+        index_to = math.ceil(x1)
         
-        elos = [h['elo'] for h in history]
-        dates = [h['date'] for h in history]
+        def on_loaded(response):
+            if response and response.get('success') and response.get('history'):
+                detail = response['history']
+                chart.show_detail([h['index'] for h in detail], [h['elo'] for h in detail])
         
-        ax.plot(range(len(elos)), elos, marker='o', linestyle='-', linewidth=2, markersize=4)
-        ax.set_xlabel('Матч')
-        ax.set_ylabel('ELO')
-        ax.set_title(f'Изменение ELO: {nickname}')
-        ax.grid(True, alpha=0.3)
-        
-        canvas = FigureCanvasTkAgg(fig, parent)
-        canvas.draw()
-        canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+        self.request_async({
+            'action': 'get_elo_history',
+            'nickname': nickname,
+            'points': ELO_CHART_POINTS,
+            'index_from': index_from,
+            'index_to': index_to
+        }, on_loaded)
     
-    def create_map_statistics_tab(self, parent, nickname):
+    def create_map_statistics_tab(self, parent, response):
         """Создание вкладки статистики по картам"""
-        response = self.send_request({
-            'action': 'get_map_statistics',
-            'nickname': nickname
-        })
-        
         if not response or not response.get('success'):
             ttk.Label(parent, text="Не удалось загрузить статистику по картам").pack(pady=20)
             return
@@ -2529,13 +3199,8 @@ AVG убийств: {profile.get('avg_kills', 0):.1f}
         tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
     
-    def create_time_statistics_tab(self, parent, nickname):
+    def create_time_statistics_tab(self, parent, response):
         """Создание вкладки статистики по времени"""
-        response = self.send_request({
-            'action': 'get_time_statistics',
-            'nickname': nickname
-        })
-        
         if not response or not response.get('success'):
             ttk.Label(parent, text="Не удалось загрузить статистику по времени").pack(pady=20)
             return
@@ -2561,13 +3226,8 @@ AVG убийств: {profile.get('avg_kills', 0):.1f}
             best_day = max(day_stats, key=lambda x: x.get('win_rate', 0))
             ttk.Label(days_frame, text=f"Лучший день: {day_names[best_day.get('day', 0)]} (Винрейт: {best_day.get('win_rate', 0):.1f}%)").pack()
     
-    def create_season_comparison_tab(self, parent, nickname):
+    def create_season_comparison_tab(self, parent, response):
         """Создание вкладки сравнения сезонов"""
-        response = self.send_request({
-            'action': 'get_season_comparison',
-            'nickname': nickname
-        })
-        
         if not response or not response.get('success'):
             ttk.Label(parent, text="Не удалось загрузить сравнение сезонов").pack(pady=20)
             return
@@ -2610,12 +3270,15 @@ AVG убийств: {profile.get('avg_kills', 0):.1f}
         
         container = self.stats_tab.winfo_children()[0]  # Получаем контейнер вкладки
         
-        # График ELO (если доступен matplotlib)
+        # График ELO (если доступен matplotlib), один на все сессии
         if MATPLOTLIB_AVAILABLE:
-            chart_frame = ttk.LabelFrame(container, text="График изменения ELO", padding=10)
-            chart_frame.pack(fill=tk.BOTH, expand=True, pady=20)
-            self.elo_chart_frame = chart_frame
-            self.update_elo_chart()
+            if self.elo_chart is None:
+                chart_frame = ttk.LabelFrame(container, text="График изменения ELO", padding=10)
+                chart_frame.pack(fill=tk.BOTH, expand=True, pady=20)
+                self.elo_chart_frame = chart_frame
+                self.elo_chart = EloChart(chart_frame)
+            # Новый вход - история другого игрока
+            self.update_elo_chart(refresh=True)
         
         # Кнопка просмотра детального профиля
         if not self.profile_button:
@@ -2623,56 +3286,73 @@ AVG убийств: {profile.get('avg_kills', 0):.1f}
                           command=lambda: self.show_detailed_player_profile(self.current_user))
             self.profile_button.pack(pady=10)
     
-    def update_elo_chart(self):
-        """Обновление графика ELO на вкладке статистики"""
-        if not MATPLOTLIB_AVAILABLE or not self.current_user or not self.connected:
-            return
+    def update_elo_chart(self, refresh=False):
+        """Обновление графика ELO на вкладке статистики.
         
-        if not self.elo_chart_frame:
+        Матчи, добавленные после загрузки графика, дописываются из локальной
+        истории. С сервера история загружается заново при входе, если
+        локальная история изменилась не только добавлением матчей, и раз
+        в ELO_CHART_MAX_AGE секунд.
+        """
+        if not MATPLOTLIB_AVAILABLE or not self.current_user or not self.elo_chart:
             return
         
-        # Очищаем предыдущий график
-        for widget in self.elo_chart_frame.winfo_children():
-            widget.destroy()
-        
-        response = self.send_request({
-            'action': 'get_elo_history',
-            'nickname': self.current_user,
-            'limit': 100
-        })
+        age = self.elo_chart.age()
+        if not refresh and age is not None and age < ELO_CHART_MAX_AGE:
+            new_elos = self.new_elo_chart_points()
+            if new_elos is not None:
+                if new_elos:
+                    self.elo_chart.append(new_elos)
+                return
         
-        if not response or not response.get('success'):
-            ttk.Label(self.elo_chart_frame, text="Не удалось загрузить историю ELO").pack(pady=20)
+        if not self.connected or self.elo_chart_loading:
             return
         
-        history = response.get('history', [])
-        if not history:
-            ttk.Label(self.elo_chart_frame, text="Нет данных для отображения").pack(pady=20)
-            return
+        self.elo_chart_loading = True
+        nickname = self.current_user
         
-        fig = Figure(figsize=(8, 4), dpi=100)
-        ax = fig.add_subplot(111)
+        def on_loaded(response):
+            self.elo_chart_loading = False
+            if nickname != self.current_user:
+                return
+            if not response or not response.get('success'):
+                if self.elo_chart.age() is None:
+                    self.elo_chart.show_message("Не удалось загрузить историю ELO")
+                return
+            self.elo_chart.set_history([h['elo'] for h in response.get('history', [])])
+            self.elo_chart_position = self.local_match_position()
         
-        elos = [h['elo'] for h in history]
+        self.request_async({
+            'action': 'get_elo_history',
+            'nickname': nickname,
+            'limit': self.elo_chart.max_points
+        }, on_loaded, use_cache=False)
+    
+    def local_match_position(self):
+        """Число локальных матчей и match_id последнего из них"""
+        details = self.local_stats.get('match_details', [])
+        return len(details), details[-1].get('match_id') if details else None
+    
+    def new_elo_chart_points(self):
+        """ELO после матчей, добавленных с загрузки графика; None - график устарел"""
+        if self.elo_chart_position is None:
+            return None
         
-        ax.plot(range(len(elos)), elos, marker='o', linestyle='-', linewidth=2, markersize=3)
-        ax.set_xlabel('Матч')
-        ax.set_ylabel('ELO')
-        ax.set_title('Изменение ELO')
-        ax.grid(True, alpha=0.3)
+        count, last_id = self.elo_chart_position
+        details = self.local_stats.get('match_details', [])
+        if len(details) < count or (count and details[count - 1].get('match_id') != last_id):
+            # Матчи удалены или история заменена синхронизацией
+            return None
         
-        canvas = FigureCanvasTkAgg(fig, self.elo_chart_frame)
-        canvas.draw()
-        canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+        self.elo_chart_position = self.local_match_position()
+        return [match['elo_after'] for match in details[count:] if match.get('elo_after') is not None]
     
     def on_player_double_click(self, event):
         """Обработка двойного клика на игрока в скорборде"""
         selection = self.scoreboard_tree.selection()
-        if selection:
-            item = selection[0]
-            values = self.scoreboard_tree.item(item)['values']
-            player_nickname = values[1]  # Второй столбец - ник
-            self.show_detailed_player_profile(player_nickname)
+        if selection and not selection[0].startswith("__loading_"):
+            # Ключ строки - ник игрока
+            self.show_detailed_player_profile(selection[0])
 
 if __name__ == "__main__":
     root = tk.Tk()
@@ -2680,6 +3360,8 @@ if __name__ == "__main__":
     
     def on_closing():
         app.save_local_data()
+        app.supervisor.stop()
+        app.executor.shutdown()
         root.destroy()
     
     root.protocol("WM_DELETE_WINDOW", on_closing)
@@ -0,0 +1,165 @@
+# connection.py - мультиплексированное соединение с сервером
+#
+# Все запросы идут через один сокет. Каждый запрос получает request_id,
+# сервер возвращает его в ответе, а фоновый поток чтения раздает ответы
+# ожидающим вызовам. Поэтому запросы из разных потоков не перемешиваются.
+# Push-сообщения сервера (без request_id, с полем 'push') передаются в
+# обработчик on_push - он вызывается из потока чтения.
+import socket
+import threading
+import itertools
+
+from protocol import send_message, recv_message, ENCODINGS, COMPRESSIONS, FLAG_JSON
+
+
+class _PendingRequest:
+    """Ожидающий ответа запрос"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.response = None
+        self.error = None
+
+
+class ServerConnection:
+    """Потокобезопасное соединение с сервером"""
+
+    def __init__(self, host, port, connect_timeout=5):
+        self.host = host
+        self.port = port
+        self.connect_timeout = connect_timeout
+        self.sock = None
+        self.closed = True
+
+        self._ids = itertools.count(1)
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._reader = None
+        self.on_push = None
+        # Вызывается из потока чтения при потере соединения (не при close())
+        self.on_close = None
+        # Кодировка исходящих кадров; входящие разбираются по их флагам
+        self.flags = FLAG_JSON
+
+    @property
+    def connected(self):
+        return not self.closed
+
+    def connect(self):
+        """Открытие сокета и запуск потока чтения"""
+        sock = socket.create_connection((self.host, self.port), timeout=self.connect_timeout)
+        sock.settimeout(None)
+        self.sock = sock
+        self.closed = False
+        self.flags = FLAG_JSON
+
+        self._reader = threading.Thread(target=self._read_loop, args=(sock,))
+        self._reader.daemon = True
+        self._reader.start()
+
+    def close(self):
+        """Закрытие соединения"""
+        sock = self.sock
+        self.closed = True
+        if sock:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+        self._fail_pending(ConnectionError("Соединение закрыто"))
+
+    def request(self, data, timeout=5):
+        """Отправка запроса и ожидание ответа с тем же request_id"""
+        if self.closed:
+            raise ConnectionError("Нет соединения с сервером")
+
+        request_id = next(self._ids)
+        pending = _PendingRequest()
+        with self._pending_lock:
+            self._pending[request_id] = pending
+
+        try:
+            message = dict(data)
+            message['request_id'] = request_id
+            with self._send_lock:
+                send_message(self.sock, message, self.flags)
+
+            if not pending.event.wait(timeout):
+                raise TimeoutError(f"Нет ответа на '{data.get('action')}' за {timeout} с")
+        finally:
+            with self._pending_lock:
+                self._pending.pop(request_id, None)
+
+        if pending.error:
+            raise pending.error
+        return pending.response
+
+    def negotiate(self, encodings=('columnar', 'json'), compression=('zlib',), timeout=5):
+        """Согласование кодировки и сжатия с сервером; возвращает (кодировка, сжатие).
+        
+        Старый сервер отвечает ошибкой на неизвестное действие - тогда
+        остается обычный JSON без сжатия.
+        """
+        response = self.request({'action': 'negotiate', 'encodings': list(encodings),
+                                 'compression': list(compression)}, timeout)
+        if not response.get('success'):
+            response = {}
+        encoding = response.get('encoding')
+        if encoding not in ENCODINGS:
+            encoding = 'json'
+        chosen_compression = response.get('compression')
+        if chosen_compression not in COMPRESSIONS:
+            chosen_compression = None
+
+        self.flags = ENCODINGS[encoding]
+        if chosen_compression:
+            self.flags |= COMPRESSIONS[chosen_compression]
+        return encoding, chosen_compression
+
+    def _read_loop(self, sock):
+        """Фоновое чтение ответов и раздача их по request_id"""
+        try:
+            while True:
+                message = recv_message(sock)
+                self._dispatch(message)
+        except Exception as e:
+            if sock is self.sock and not self.closed:
+                self.closed = True
+                self._fail_pending(ConnectionError(f"Соединение потеряно: {e}"))
+                if self.on_close:
+                    self.on_close()
+
+    def _dispatch(self, message):
+        """Передача ответа ожидающему запросу"""
+        request_id = message.pop('request_id', None) if isinstance(message, dict) else None
+
+        if request_id is None and isinstance(message, dict) and 'push' in message:
+            if self.on_push:
+                try:
+                    self.on_push(message)
+                except Exception as e:
+                    print(f"Ошибка обработки push-сообщения: {e}")
+            return
+
+        with self._pending_lock:
+            pending = self._pending.get(request_id)
+            if pending is None and request_id is None and len(self._pending) == 1:
+                # Сервер без поддержки request_id: ответ может быть только на единственный запрос
+                pending = next(iter(self._pending.values()))
+
+        if pending is None:
+            print(f"[!] Ответ на неизвестный запрос: {request_id}")
+            return
+
+        pending.response = message
+        pending.event.set()
+
+    def _fail_pending(self, error):
+        """Завершение всех ожидающих запросов ошибкой"""
+        with self._pending_lock:
+            pending_list = list(self._pending.values())
+        for pending in pending_list:
+            pending.error = error
+            pending.event.set()
@@ -0,0 +1,44 @@
+# downsample.py - прореживание рядов для графиков
+#
+# Largest-Triangle-Three-Buckets (LTTB): ряд делится на threshold - 2
+# корзины, из каждой берется точка, образующая наибольший треугольник с
+# выбранной точкой предыдущей корзины и средним следующей. Первая и
+# последняя точки сохраняются. В отличие от среднего по корзине, пики и
+# провалы ELO остаются на графике.
+
+
+def lttb_indices(xs, ys, threshold):
+    """Индексы точек, оставляемых при прореживании до threshold точек"""
+    size = len(xs)
+    if threshold >= size or threshold < 3:
+        return list(range(size))
+
+    selected = [0]
+    bucket_size = (size - 2) / (threshold - 2)
+    previous = 0
+    for bucket in range(threshold - 2):
+        start = int(bucket * bucket_size) + 1
+        stop = int((bucket + 1) * bucket_size) + 1
+
+        # Среднее следующей корзины (для последней - последняя точка)
+        next_start = stop
+        next_stop = min(int((bucket + 2) * bucket_size) + 1, size)
+        if next_start >= size - 1:
+            next_start, next_stop = size - 1, size
+        count = next_stop - next_start
+        avg_x = sum(xs[next_start:next_stop]) / count
+        avg_y = sum(ys[next_start:next_stop]) / count
+
+        prev_x, prev_y = xs[previous], ys[previous]
+        best, best_area = start, -1.0
+        for index in range(start, stop):
+            # Удвоенная площадь треугольника (сравниваем без деления на 2)
+            area = abs((prev_x - avg_x) * (ys[index] - prev_y) -
+                       (prev_x - xs[index]) * (avg_y - prev_y))
+            if area > best_area:
+                best, best_area = index, area
+        selected.append(best)
+        previous = best
+
+    selected.append(size - 1)
+    return selected
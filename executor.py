@@ -0,0 +1,85 @@
+# executor.py - выполнение сетевых запросов вне главного потока Tk
+#
+# Запросы выполняются в пуле потоков, а результаты складываются в очередь,
+# которую главный поток забирает через root.after. Виджеты Tk трогаются
+# только из главного потока.
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+
+class RequestHandle:
+    """Дескриптор фонового запроса, позволяет отменить доставку результата"""
+
+    def __init__(self):
+        self.cancelled = False
+        self.future = None
+
+    def cancel(self):
+        """Отмена запроса: если он еще не начат, он не выполнится,
+        а результат уже выполненного не будет передан в callback"""
+        self.cancelled = True
+        if self.future:
+            self.future.cancel()
+
+
+class RequestExecutor:
+    """Пул фоновых запросов с доставкой результатов в главный поток"""
+
+    def __init__(self, root, max_workers=4, poll_interval=30):
+        self.root = root
+        self.poll_interval = poll_interval
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="request")
+        self.results = queue.Queue()
+        self.root.after(self.poll_interval, self._poll)
+
+    def submit(self, func, callback, *args, owner=None):
+        """Выполнить func(*args) в фоне и вызвать callback(result) в главном потоке.
+
+        Если передан owner (например, диалог), запрос отменяется при его закрытии.
+        """
+        handle = RequestHandle()
+
+        def run():
+            if handle.cancelled:
+                return
+            try:
+                result = func(*args)
+            except Exception as e:
+                print(f"Ошибка фонового запроса: {e}")
+                result = None
+            self.results.put((handle, callback, result))
+
+        handle.future = self.pool.submit(run)
+
+        if owner is not None:
+            def on_destroy(event):
+                if event.widget is owner:
+                    handle.cancel()
+            owner.bind("<Destroy>", on_destroy, add="+")
+
+        return handle
+
+    def post(self, callback, value):
+        """Вызвать callback(value) в главном потоке (можно звать из любого потока)"""
+        self.results.put((RequestHandle(), callback, value))
+
+    def _poll(self):
+        """Доставка готовых результатов в главный поток"""
+        while True:
+            try:
+                handle, callback, result = self.results.get_nowait()
+            except queue.Empty:
+                break
+
+            if handle.cancelled:
+                continue
+            try:
+                callback(result)
+            except Exception as e:
+                print(f"Ошибка обработки ответа: {e}")
+
+        self.root.after(self.poll_interval, self._poll)
+
+    def shutdown(self):
+        """Остановка пула без ожидания зависших запросов"""
+        self.pool.shutdown(wait=False, cancel_futures=True)
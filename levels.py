@@ -0,0 +1,44 @@
+# levels.py - уровни FaceIt по ELO
+#
+# Уровень определяется по отсортированным нижним границам уровней 2..10:
+# level = 1 + число границ <= elo. Диапазоны полуоткрытые, поэтому дробные
+# и отрицательные значения тоже попадают ровно в один уровень.
+from bisect import bisect_right
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+LEVELS = {
+    1: {"min_elo": 0, "max_elo": 500, "color": "#808080"},
+    2: {"min_elo": 501, "max_elo": 750, "color": "#006400"},
+    3: {"min_elo": 751, "max_elo": 900, "color": "#006400"},
+    4: {"min_elo": 901, "max_elo": 1050, "color": "#00008B"},
+    5: {"min_elo": 1051, "max_elo": 1200, "color": "#00008B"},
+    6: {"min_elo": 1201, "max_elo": 1350, "color": "#800080"},
+    7: {"min_elo": 1351, "max_elo": 1530, "color": "#800080"},
+    8: {"min_elo": 1531, "max_elo": 1750, "color": "#FFD700"},
+    9: {"min_elo": 1751, "max_elo": 2000, "color": "#FFD700"},
+    10: {"min_elo": 2001, "max_elo": 10000, "color": "#FF4500"}
+}
+
+# Нижние границы уровней 2..10 по возрастанию
+LEVEL_THRESHOLDS = [LEVELS[level]["min_elo"] for level in sorted(LEVELS)[1:]]
+
+if NUMPY_AVAILABLE:
+    _THRESHOLDS_ARRAY = np.array(LEVEL_THRESHOLDS)
+
+
+def level_from_elo(elo):
+    """Уровень по ELO"""
+    return 1 + bisect_right(LEVEL_THRESHOLDS, elo or 0)
+
+
+def levels_from_elos(elos):
+    """Уровни для списка ELO за один проход (через NumPy, если он есть)"""
+    if NUMPY_AVAILABLE:
+        values = np.asarray([elo or 0 for elo in elos], dtype=float)
+        return (np.searchsorted(_THRESHOLDS_ARRAY, values, side='right') + 1).tolist()
+    return [1 + bisect_right(LEVEL_THRESHOLDS, elo or 0) for elo in elos]
@@ -0,0 +1,171 @@
+# local_db.py - локальная база матчей на SQLite
+#
+# Дублирует local_stats['match_details'] в индексированную таблицу, чтобы
+# историю, статистику по картам и по времени можно было считать запросами
+# без полного перебора списка и без обращения к серверу.
+import threading
+from datetime import datetime
+
+from stats_engine import RESULT_CODES
+
+try:
+    import sqlite3
+    SQLITE_AVAILABLE = True
+except ImportError:
+    SQLITE_AVAILABLE = False
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS matches (
+    match_id TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    result TEXT NOT NULL,
+    elo_before INTEGER,
+    elo_after INTEGER,
+    elo_change INTEGER,
+    kills INTEGER,
+    deaths INTEGER,
+    kd REAL,
+    hs REAL,
+    map TEXT,
+    date TEXT,
+    hour INTEGER,
+    weekday INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_matches_position ON matches(position);
+CREATE INDEX IF NOT EXISTS idx_matches_date ON matches(date);
+CREATE INDEX IF NOT EXISTS idx_matches_map ON matches(map, result);
+CREATE INDEX IF NOT EXISTS idx_matches_result ON matches(result);
+"""
+
+COLUMNS = ('match_id', 'position', 'result', 'elo_before', 'elo_after', 'elo_change',
+           'kills', 'deaths', 'kd', 'hs', 'map', 'date', 'hour', 'weekday')
+
+
+def _match_row(match, position):
+    """Строка таблицы из словаря матча"""
+    hour = weekday = None
+    try:
+        played = datetime.strptime(match.get('date') or '', "%Y-%m-%d %H:%M")
+        hour = played.hour
+        weekday = (played.weekday() + 1) % 7  # 0 = воскресенье, как на сервере
+    except ValueError:
+        pass
+
+    # Неизвестный результат считается ничьей, как в stats_engine
+    result = match.get('result')
+    if result not in RESULT_CODES:
+        result = 'T'
+
+    return (match.get('match_id'), position, result,
+            match.get('elo_before'), match.get('elo_after'), match.get('elo_change', 0),
+            match.get('kills', 0), match.get('deaths', 0), match.get('kd', 0.0),
+            match.get('hs', 0.0), match.get('map'), match.get('date'), hour, weekday)
+
+
+def _win_rate(wins, matches):
+    return round(wins / matches * 100, 1) if matches else 0.0
+
+
+class MatchDatabase:
+    """Индексированная копия истории матчей"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        # Запросы профиля выполняются из фоновых потоков
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        with self.lock, self.conn:
+            self.conn.executescript(SCHEMA)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def sync(self, match_details):
+        """Приведение базы в соответствие со списком матчей.
+
+        Пересборка выполняется, только если состав матчей изменился.
+        """
+        with self.lock:
+            ids = [row[0] for row in self.conn.execute(
+                "SELECT match_id FROM matches ORDER BY position")]
+            if ids == [match.get('match_id') for match in match_details]:
+                return False
+
+            with self.conn:
+                self.conn.execute("DELETE FROM matches")
+                self.conn.executemany(
+                    f"INSERT OR REPLACE INTO matches ({', '.join(COLUMNS)}) "
+                    f"VALUES ({', '.join('?' * len(COLUMNS))})",
+                    [_match_row(match, i) for i, match in enumerate(match_details)])
+            return True
+
+    def add_match(self, match, position):
+        """Добавление одного матча"""
+        with self.lock, self.conn:
+            self.conn.execute(
+                f"INSERT OR REPLACE INTO matches ({', '.join(COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(COLUMNS))})",
+                _match_row(match, position))
+
+    def recent_matches(self, limit=50):
+        """Последние матчи, новые первыми"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT * FROM matches ORDER BY position DESC LIMIT ?", (limit,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def matches_between(self, date_from, date_to):
+        """Матчи за период (даты в формате YYYY-MM-DD HH:MM)"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT * FROM matches WHERE date >= ? AND date <= ? ORDER BY date",
+                (date_from, date_to)).fetchall()
+        return [dict(row) for row in rows]
+
+    def map_statistics(self):
+        """Статистика по картам в формате ответа get_map_statistics"""
+        with self.lock:
+            rows = self.conn.execute("""
+                SELECT map,
+                       COUNT(*) AS total_matches,
+                       SUM(result = 'W') AS wins,
+                       SUM(result = 'L') AS losses,
+                       AVG(kills) AS avg_kills,
+                       AVG(deaths) AS avg_deaths
+                FROM matches
+                WHERE map IS NOT NULL
+                GROUP BY map
+                ORDER BY total_matches DESC
+            """).fetchall()
+
+        return [{
+            'map': row['map'],
+            'total_matches': row['total_matches'],
+            'wins': row['wins'],
+            'losses': row['losses'],
+            'win_rate': _win_rate(row['wins'], row['total_matches']),
+            'avg_kills': round(row['avg_kills'] or 0, 1),
+            'avg_deaths': round(row['avg_deaths'] or 0, 1)
+        } for row in rows]
+
+    def time_statistics(self):
+        """Статистика по часам и дням недели в формате ответа get_time_statistics"""
+        def grouped(column, key):
+            rows = self.conn.execute(f"""
+                SELECT {column} AS bucket, COUNT(*) AS matches, SUM(result = 'W') AS wins
+                FROM matches
+                WHERE {column} IS NOT NULL
+                GROUP BY {column}
+                ORDER BY {column}
+            """).fetchall()
+            return [{
+                key: row['bucket'],
+                'matches': row['matches'],
+                'wins': row['wins'],
+                'win_rate': _win_rate(row['wins'], row['matches'])
+            } for row in rows]
+
+        with self.lock:
+            return {'hours': grouped('hour', 'hour'), 'days': grouped('weekday', 'day')}
@@ -0,0 +1,143 @@
+# local_store.py - локальное хранилище статистики
+#
+# Данные лежат в двух файлах:
+#   faceit_local.json          - компактный снимок всей статистики
+#   faceit_local.json.journal  - журнал изменений после снимка (JSON Lines)
+#
+# Новый матч дописывается в журнал одной строкой, а не переписывает весь файл.
+# Когда журнал разрастается, он сворачивается в новый снимок. Снимок
+# записывается во временный файл и подменяется через os.replace, поэтому
+# падение посреди записи не портит данные.
+import json
+import os
+
+# Служебное поле снимка: номер последней записи журнала, вошедшей в снимок
+SNAPSHOT_SEQ_KEY = '_journal_seq'
+
+
+class LocalStore:
+    """Снимок статистики + журнал изменений"""
+
+    def __init__(self, path, compact_every=200):
+        self.path = path
+        self.journal_path = path + '.journal'
+        self.compact_every = compact_every
+        self.seq = 0
+        self.journal_entries = 0
+
+    def load(self, default_stats):
+        """Загрузка снимка и применение журнала"""
+        stats = None
+        migrated = False
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    stats = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Ошибка чтения локальных данных: {e}")
+
+        if not isinstance(stats, dict):
+            stats = default_stats
+        elif SNAPSHOT_SEQ_KEY not in stats:
+            # Файл старого формата (полный JSON с отступами)
+            migrated = True
+
+        self.seq = stats.pop(SNAPSHOT_SEQ_KEY, 0)
+        self.journal_entries = 0
+
+        for record in self._read_journal():
+            if record.get('seq', 0) <= self.seq:
+                # Запись уже вошла в снимок (сбой между заменой снимка и очисткой журнала)
+                continue
+            self._apply(stats, record)
+            self.seq = record['seq']
+            self.journal_entries += 1
+
+        if migrated:
+            self.save(stats)
+
+        return stats
+
+    def append_match(self, stats, match):
+        """Запись нового матча (матч уже добавлен в stats)"""
+        self._append(stats, {
+            'type': 'match',
+            'match': match,
+            'summary': self._summary(stats)
+        })
+
+    def append_patch(self, stats, match_updates):
+        """Запись изменений полей матчей и сводки.
+
+        match_updates: {match_id: {поле: значение}}
+        """
+        self._append(stats, {
+            'type': 'patch',
+            'matches': match_updates,
+            'summary': self._summary(stats)
+        })
+
+    def save(self, stats):
+        """Запись полного снимка и очистка журнала"""
+        snapshot = dict(stats)
+        snapshot[SNAPSHOT_SEQ_KEY] = self.seq
+
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f, ensure_ascii=False, separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+        # Журнал очищаем только после того, как новый снимок на месте
+        with open(self.journal_path, 'w', encoding='utf-8'):
+            pass
+        self.journal_entries = 0
+
+    def _append(self, stats, record):
+        """Дописывание записи в журнал"""
+        self.seq += 1
+        record['seq'] = self.seq
+
+        line = json.dumps(record, ensure_ascii=False, separators=(',', ':'))
+        with open(self.journal_path, 'a', encoding='utf-8') as f:
+            f.write(line + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+        self.journal_entries += 1
+        if self.journal_entries >= self.compact_every:
+            self.save(stats)
+
+    def _read_journal(self):
+        """Чтение записей журнала; оборванная последняя строка игнорируется"""
+        if not os.path.exists(self.journal_path):
+            return []
+
+        records = []
+        with open(self.journal_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    break
+        return records
+
+    @staticmethod
+    def _summary(stats):
+        """Сводные поля статистики (все, кроме списков матчей)"""
+        return {key: value for key, value in stats.items()
+                if key not in ('match_details', 'match_history')}
+
+    @staticmethod
+    def _apply(stats, record):
+        """Применение записи журнала к статистике"""
+        if record.get('type') == 'match':
+            stats.setdefault('match_details', []).append(record['match'])
+        elif record.get('type') == 'patch':
+            updates = record.get('matches', {})
+            for match in stats.get('match_details', []):
+                if match.get('match_id') in updates:
+                    match.update(updates[match['match_id']])
+
+        stats.update(record.get('summary', {}))
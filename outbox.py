@@ -0,0 +1,100 @@
+# outbox.py - очередь запросов записи, ожидающих отправки на сервер
+#
+# Запрос, который не удалось отправить (нет соединения), сохраняется в файл
+# faceit_outbox.jsonl и отправляется при следующем подключении в том же
+# порядке. У каждого запроса есть idempotency_key: если сервер уже выполнил
+# запрос, а ответ потерялся, повторная отправка не создаст дубликат.
+#
+# Файл - журнал JSON Lines из записей двух видов:
+#   {"op": "add", "key": ..., "request": {...}, "created": ...}
+#   {"op": "done", "key": ...}
+# Когда все запросы отправлены, файл очищается.
+import json
+import os
+import threading
+import uuid
+from datetime import datetime
+
+
+class Outbox:
+    """Персистентная очередь запросов с ключами идемпотентности"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        # key -> запись, в порядке добавления
+        self.entries = {}
+        self._load()
+
+    def __len__(self):
+        with self.lock:
+            return len(self.entries)
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        torn = False
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Оборванная последняя строка
+                    torn = True
+                    break
+                if record.get('op') == 'add':
+                    self.entries[record['key']] = record
+                elif record.get('op') == 'done':
+                    self.entries.pop(record.get('key'), None)
+
+        if torn:
+            # Иначе новые записи приклеятся к оборванной строке
+            self._rewrite()
+
+    def _rewrite(self):
+        """Перезапись журнала только ожидающими запросами"""
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for record in self.entries.values():
+                f.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def _write(self, record):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def add(self, request):
+        """Постановка запроса в очередь; возвращает запрос с idempotency_key"""
+        request = dict(request)
+        request.setdefault('idempotency_key', uuid.uuid4().hex)
+        record = {
+            'op': 'add',
+            'key': request['idempotency_key'],
+            'request': request,
+            'created': datetime.now().strftime("%Y-%m-%d %H:%M")
+        }
+        with self.lock:
+            self._write(record)
+            self.entries[record['key']] = record
+        return request
+
+    def pending(self):
+        """Ожидающие запросы в порядке добавления"""
+        with self.lock:
+            return [dict(entry['request']) for entry in self.entries.values()]
+
+    def done(self, key):
+        """Запрос доставлен (или окончательно отклонен сервером)"""
+        with self.lock:
+            if self.entries.pop(key, None) is None:
+                return
+            if self.entries:
+                self._write({'op': 'done', 'key': key})
+            else:
+                # Очередь пуста - журнал больше не нужен
+                with open(self.path, 'w', encoding='utf-8'):
+                    pass
@@ -0,0 +1,188 @@
+# protocol.py - сетевой протокол клиента и сервера
+#
+# Каждое сообщение передается кадром: заголовок из 5 байт
+# (длина тела, 4 байта big-endian, и байт флагов формата) и тело.
+# Тело - JSON в UTF-8, флаги задают кодировку тела:
+#   0 - обычный JSON;
+#   1 - столбцовый JSON: списки словарей с одинаковыми ключами
+#       записываются как {"$c": [ключи], "$r": [[значения], ...]},
+#       то есть имена полей передаются один раз, а не в каждой строке.
+#       Обычный словарь, который выглядит как служебный ({"$c", "$r"}
+#       или {"$e"}), передается обернутым: {"$e": {...}}.
+# Старший бит флагов (0x80) означает, что тело сжато zlib. Сжимаются
+# только тела больше COMPRESS_THRESHOLD байт: маленькие ответы от сжатия
+# почти не уменьшаются, а время на него тратится.
+# Кодировку и сжатие, с которыми сервер отправляет ответы, клиент
+# выбирает запросом negotiate после ping. Принимающая сторона всегда
+# разбирает кадр по его флагам, поэтому старый клиент и старый сервер продолжают
+# работать с обычным JSON.
+import json
+import struct
+import zlib
+
+HEADER = struct.Struct('!IB')
+HEADER_SIZE = HEADER.size
+
+# Максимальный размер одного кадра (защита от мусора в потоке)
+MAX_FRAME_SIZE = 64 * 1024 * 1024
+
+FLAG_JSON = 0
+FLAG_COLUMNAR = 1
+FLAG_ZLIB = 0x80
+ENCODING_MASK = 0x7F
+
+# Минимальный размер тела для сжатия и уровень zlib
+COMPRESS_THRESHOLD = 4096
+COMPRESS_LEVEL = 6
+
+# Кодировки по названию (для negotiate), в порядке предпочтения
+ENCODINGS = {'columnar': FLAG_COLUMNAR, 'json': FLAG_JSON}
+
+# Поддерживаемые алгоритмы сжатия (для negotiate)
+COMPRESSIONS = {'zlib': FLAG_ZLIB}
+
+# Служебные ключи столбцовой таблицы
+COLUMNS_KEY = '$c'
+ROWS_KEY = '$r'
+ESCAPE_KEY = '$e'
+
+
+def _is_marker(value):
+    """Словарь с ключами служебной записи столбцового формата"""
+    return (len(value) == 2 and COLUMNS_KEY in value and ROWS_KEY in value) or \
+        (len(value) == 1 and ESCAPE_KEY in value)
+
+
+class ProtocolError(Exception):
+    """Ошибка разбора кадра"""
+
+
+def to_columnar(value):
+    """Замена списков однотипных словарей таблицами ключи + строки"""
+    if isinstance(value, dict):
+        converted = {key: to_columnar(item) for key, item in value.items()}
+        return {ESCAPE_KEY: converted} if _is_marker(value) else converted
+    if isinstance(value, (list, tuple)):
+        if len(value) > 1 and all(isinstance(item, dict) for item in value):
+            keys = list(value[0])
+            key_set = set(keys)
+            if all(len(item) == len(keys) and key_set.issuperset(item) for item in value):
+                return {COLUMNS_KEY: keys,
+                        ROWS_KEY: [[to_columnar(item[key]) for key in keys] for item in value]}
+        return [to_columnar(item) for item in value]
+    return value
+
+
+def from_columnar(value):
+    """Обратное преобразование таблиц в списки словарей"""
+    if isinstance(value, dict):
+        if len(value) == 1 and ESCAPE_KEY in value:
+            return {key: from_columnar(item) for key, item in value[ESCAPE_KEY].items()}
+        if len(value) == 2 and COLUMNS_KEY in value and ROWS_KEY in value:
+            keys = value[COLUMNS_KEY]
+            return [dict(zip(keys, map(from_columnar, row))) for row in value[ROWS_KEY]]
+        return {key: from_columnar(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [from_columnar(item) for item in value]
+    return value
+
+
+def encode_message(data, flags=FLAG_JSON):
+    """Упаковка сообщения в кадр в кодировке flags.
+    
+    С FLAG_ZLIB тело сжимается, только если оно больше порога.
+    """
+    encoding = flags & ENCODING_MASK
+    if encoding == FLAG_COLUMNAR:
+        data = to_columnar(data)
+    elif encoding != FLAG_JSON:
+        raise ProtocolError(f"Неизвестные флаги кадра: {flags}")
+    body = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    if len(body) > MAX_FRAME_SIZE:
+        raise ProtocolError(f"Слишком большое сообщение: {len(body)} байт")
+    if flags & FLAG_ZLIB and len(body) > COMPRESS_THRESHOLD:
+        body = zlib.compress(body, COMPRESS_LEVEL)
+        encoding |= FLAG_ZLIB
+    return HEADER.pack(len(body), encoding) + body
+
+
+def decompress_body(body):
+    """Распаковка тела с тем же ограничением размера, что и у кадра"""
+    decompressor = zlib.decompressobj()
+    try:
+        data = decompressor.decompress(body, MAX_FRAME_SIZE)
+    except zlib.error as e:
+        raise ProtocolError(f"Поврежденное сжатое тело: {e}")
+    if decompressor.unconsumed_tail:
+        raise ProtocolError("Слишком большое сжатое сообщение")
+    if not decompressor.eof:
+        raise ProtocolError("Обрезанное сжатое тело")
+    return data
+
+
+def decode_body(body, flags):
+    """Разбор тела кадра"""
+    encoding = flags & ENCODING_MASK
+    if encoding not in (FLAG_JSON, FLAG_COLUMNAR):
+        raise ProtocolError(f"Неизвестные флаги кадра: {flags}")
+    if flags & FLAG_ZLIB:
+        body = decompress_body(body)
+    try:
+        data = json.loads(body.decode('utf-8'))
+    except (UnicodeDecodeError, ValueError) as e:
+        raise ProtocolError(f"Некорректное тело кадра: {e}")
+    if encoding == FLAG_COLUMNAR:
+        data = from_columnar(data)
+    return data
+
+
+def choose_encoding(offered):
+    """Первая из предложенных кодировок, которую мы знаем"""
+    for name in offered or ():
+        if name in ENCODINGS:
+            return name
+    return 'json'
+
+
+def choose_compression(offered):
+    """Первый из предложенных алгоритмов сжатия, который мы знаем (или None)"""
+    for name in offered or ():
+        if name in COMPRESSIONS:
+            return name
+    return None
+
+
+def parse_header(header):
+    """Разбор заголовка кадра, возвращает (длина, флаги)"""
+    length, flags = HEADER.unpack(header)
+    if length > MAX_FRAME_SIZE:
+        raise ProtocolError(f"Слишком большой кадр: {length} байт")
+    return length, flags
+
+
+def recv_exact(sock, size):
+    """Чтение ровно size байт из сокета"""
+    buffer = bytearray()
+    while len(buffer) < size:
+        chunk = sock.recv(min(size - len(buffer), 65536))
+        if not chunk:
+            raise ConnectionError("Соединение закрыто сервером")
+        buffer.extend(chunk)
+    return bytes(buffer)
+
+
+def send_message(sock, data, flags=FLAG_JSON):
+    """Отправка сообщения в сокет"""
+    sock.sendall(encode_message(data, flags))
+
+
+def recv_message(sock):
+    """Чтение одного сообщения из сокета (блокирующее)"""
+    length, flags = parse_header(recv_exact(sock, HEADER_SIZE))
+    return decode_body(recv_exact(sock, length), flags)
+
+
+async def read_message(reader):
+    """Чтение одного сообщения из asyncio.StreamReader"""
+    length, flags = parse_header(await reader.readexactly(HEADER_SIZE))
+    return decode_body(await reader.readexactly(length), flags)
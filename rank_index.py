@@ -0,0 +1,138 @@
+# rank_index.py - индекс мест в скорборде
+#
+# Для каждого поля сортировки хранится индексируемый skip list с ключами
+# (-значение, ник) - тот же порядок, что ORDER BY поле DESC, nickname.
+# Место игрока, игрок на заданном месте, вставка и удаление - O(log n)
+# в среднем, без COUNT(*) по таблице игроков.
+import random
+
+
+class _Node:
+    __slots__ = ('key', 'next', 'width')
+
+    def __init__(self, key, levels):
+        self.key = key
+        self.next = [None] * levels
+        # width[i] - сколько элементов перешагивает ссылка next[i]
+        self.width = [1] * levels
+
+
+class IndexableSkipList:
+    """Упорядоченное множество с доступом по номеру и подсчетом меньших ключей"""
+
+    def __init__(self, max_levels=32):
+        self.max_levels = max_levels
+        self.head = _Node(None, max_levels)
+        self.size = 0
+        # Высота самого высокого узла: выше нее ссылок нет
+        self.levels = 1
+
+    def __len__(self):
+        return self.size
+
+    def _random_levels(self):
+        levels = 1
+        while levels < self.max_levels and random.random() < 0.5:
+            levels += 1
+        return levels
+
+    def _find(self, key):
+        """Предшественники key на каждом уровне и их позиции"""
+        chain = [self.head] * self.max_levels
+        positions = [0] * self.max_levels
+        node = self.head
+        position = 0
+        for level in reversed(range(self.levels)):
+            while node.next[level] is not None and node.next[level].key < key:
+                position += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+            positions[level] = position
+        return chain, positions
+
+    def insert(self, key):
+        chain, positions = self._find(key)
+        levels = self._random_levels()
+        self.levels = max(self.levels, levels)
+        node = _Node(key, levels)
+        position = positions[0] + 1
+        for level in range(levels):
+            prev = chain[level]
+            node.next[level] = prev.next[level]
+            prev.next[level] = node
+            node.width[level] = prev.width[level] - (position - positions[level]) + 1
+            prev.width[level] = position - positions[level]
+        for level in range(levels, self.levels):
+            chain[level].width[level] += 1
+        self.size += 1
+
+    def remove(self, key):
+        chain, _ = self._find(key)
+        node = chain[0].next[0]
+        if node is None or node.key != key:
+            raise KeyError(key)
+        for level in range(len(node.next)):
+            prev = chain[level]
+            prev.width[level] += node.width[level] - 1
+            prev.next[level] = node.next[level]
+        for level in range(len(node.next), self.levels):
+            chain[level].width[level] -= 1
+        self.size -= 1
+
+    def rank(self, key):
+        """Число ключей меньше key"""
+        return self._find(key)[1][0]
+
+    def __getitem__(self, index):
+        if not 0 <= index < self.size:
+            raise IndexError(index)
+        node = self.head
+        remaining = index + 1
+        for level in reversed(range(self.levels)):
+            while node.next[level] is not None and node.width[level] <= remaining:
+                remaining -= node.width[level]
+                node = node.next[level]
+        return node.key
+
+
+class RankIndex:
+    """Места игроков по каждому полю сортировки скорборда"""
+
+    def __init__(self, fields):
+        self.fields = tuple(fields)
+        self.lists = {field: IndexableSkipList() for field in self.fields}
+        # Ник -> ключи игрока в каждом списке
+        self.keys = {}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def update(self, nickname, values):
+        """Новые значения полей игрока; values=None - убрать игрока из рейтинга"""
+        old_keys = self.keys.pop(nickname, None)
+        if old_keys:
+            for field, key in old_keys.items():
+                self.lists[field].remove(key)
+        if values is None:
+            return
+
+        keys = {field: (-values[field], nickname) for field in self.fields}
+        for field, key in keys.items():
+            self.lists[field].insert(key)
+        self.keys[nickname] = keys
+
+    def rank(self, field, nickname):
+        """Место игрока с 0 или None, если его нет в рейтинге"""
+        keys = self.keys.get(nickname)
+        if keys is None:
+            return None
+        return self.lists[field].rank(keys[field])
+
+    def nickname_at(self, field, index):
+        return self.lists[field][index][1]
+
+    def window(self, field, start, stop):
+        """Ники игроков на местах [start, stop)"""
+        skip_list = self.lists[field]
+        stop = min(stop, len(skip_list))
+        return [skip_list[index][1] for index in range(max(0, start), stop)]
@@ -0,0 +1,1682 @@
+# server.py - эталонный сервер FaceIt Scoreboard
+#
+# Реализует все действия, которые отправляет client.py, поверх SQLite.
+# Сеть на asyncio: одно соединение - одна корутина, поэтому сервер
+# держит сотни клиентов в одном потоке. Нужен для локальной разработки
+# и нагрузочного тестирования без Radmin VPN.
+#
+# Хеш пароля (PBKDF2) при login и register считается в пуле потоков, чтобы
+# не задерживать остальные соединения. Это процессорная работа, поэтому
+# число входов в секунду все равно ограничено числом ядер и PASSWORD_ITERATIONS.
+#
+# Соединение запоминает игрока, под которым выполнен login или register.
+# Права модератора и игрок, от имени которого действует запрос (матчи,
+# чат, турниры), берутся из этого входа. Ники admin_nickname, nickname и
+# sender_nickname в запросе учитываются только при прямом вызове GameServer.
+#
+# Клиент может подписаться на каналы (subscribe) и получать по тому же
+# соединению push-сообщения без request_id:
+#   {'push': 'leaderboard', 'event': 'player_updated' | 'player_removed', 'data': {...}}
+#   {'push': 'chat', 'event': 'message', 'data': {'sender', 'receiver', 'text', 'time'}}
+#   {'push': 'tournaments', 'event': 'changed', 'data': {турнир}}
+#
+# Запуск:
+#   python server.py --host 0.0.0.0 --port 5555 --db faceit_server.db
+#   python server.py --create-admin admin secret
+#   python server.py --check-aggregates      # сверить агрегаты профилей с матчами
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+from datetime import datetime, timedelta
+
+from rank_index import RankIndex
+from stats_engine import finalize_summary
+from downsample import lttb_indices
+from protocol import (encode_message, read_message, choose_encoding, choose_compression, ProtocolError,
+                      ENCODINGS, COMPRESSIONS, FLAG_JSON)
+
+DATE_FORMAT = "%Y-%m-%d %H:%M"
+DEFAULT_ELO = 1050
+PASSWORD_ITERATIONS = 20000
+
+# Сводные поля статистики игрока
+SUMMARY_FIELDS = ('elo', 'wins', 'losses', 'ties', 'matches', 'avg_kd', 'avg_hs',
+                  'win_percentage', 'total_kills', 'total_deaths', 'avg_kills')
+
+LEADERBOARD_SORT_FIELDS = ('elo', 'wins', 'win_percentage', 'avg_kd', 'avg_kills')
+
+ROLES = ('player', 'moderator', 'admin')
+
+# Максимум матчей или игроков в одном массовом действии модератора
+MAX_BULK_ITEMS = 1000
+
+# Сколько дней хранятся ключи идемпотентности
+IDEMPOTENCY_TTL_DAYS = 30
+
+CHANNELS = ('leaderboard', 'chat', 'tournaments')
+
+# Подписчик, не успевающий читать push-сообщения, отключается
+MAX_PUSH_BUFFER = 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS players (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    nickname TEXT NOT NULL UNIQUE,
+    password_hash TEXT NOT NULL,
+    salt TEXT NOT NULL,
+    email TEXT DEFAULT '',
+    role TEXT NOT NULL DEFAULT 'player',
+    elo INTEGER NOT NULL DEFAULT 1050,
+    wins INTEGER NOT NULL DEFAULT 0,
+    losses INTEGER NOT NULL DEFAULT 0,
+    ties INTEGER NOT NULL DEFAULT 0,
+    matches INTEGER NOT NULL DEFAULT 0,
+    avg_kd REAL NOT NULL DEFAULT 0,
+    avg_hs REAL NOT NULL DEFAULT 0,
+    win_percentage REAL NOT NULL DEFAULT 0,
+    total_kills INTEGER NOT NULL DEFAULT 0,
+    total_deaths INTEGER NOT NULL DEFAULT 0,
+    avg_kills REAL NOT NULL DEFAULT 0,
+    is_banned INTEGER NOT NULL DEFAULT 0,
+    ban_reason TEXT,
+    banned_until TEXT,
+    premium_until TEXT,
+    version INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT NOT NULL
+);
+-- Индексы в порядке скорборда: страницы и подсчет места без сортировки
+DROP INDEX IF EXISTS idx_players_elo;
+DROP INDEX IF EXISTS idx_players_wins;
+DROP INDEX IF EXISTS idx_players_win_percentage;
+DROP INDEX IF EXISTS idx_players_avg_kd;
+DROP INDEX IF EXISTS idx_players_avg_kills;
+CREATE INDEX IF NOT EXISTS idx_players_rank_elo ON players(is_banned, elo DESC, nickname);
+CREATE INDEX IF NOT EXISTS idx_players_rank_wins ON players(is_banned, wins DESC, nickname);
+CREATE INDEX IF NOT EXISTS idx_players_rank_win_percentage ON players(is_banned, win_percentage DESC, nickname);
+CREATE INDEX IF NOT EXISTS idx_players_rank_avg_kd ON players(is_banned, avg_kd DESC, nickname);
+CREATE INDEX IF NOT EXISTS idx_players_rank_avg_kills ON players(is_banned, avg_kills DESC, nickname);
+
+CREATE TABLE IF NOT EXISTS matches (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    player_id INTEGER NOT NULL REFERENCES players(id),
+    match_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    result TEXT NOT NULL,
+    elo_before INTEGER,
+    elo_after INTEGER,
+    elo_change INTEGER NOT NULL DEFAULT 0,
+    kills INTEGER NOT NULL DEFAULT 0,
+    deaths INTEGER NOT NULL DEFAULT 0,
+    kd REAL NOT NULL DEFAULT 0,
+    hs REAL NOT NULL DEFAULT 0,
+    map TEXT,
+    date TEXT,
+    is_verified INTEGER NOT NULL DEFAULT 0,
+    UNIQUE (player_id, match_id)
+);
+CREATE INDEX IF NOT EXISTS idx_matches_player_seq ON matches(player_id, seq);
+-- Списки матчей для модерации: фильтр по игроку или статусу, новые первыми
+CREATE INDEX IF NOT EXISTS idx_matches_player_id ON matches(player_id, id);
+CREATE INDEX IF NOT EXISTS idx_matches_verified_id ON matches(is_verified, id);
+
+CREATE TABLE IF NOT EXISTS deleted_matches (
+    player_id INTEGER NOT NULL,
+    match_id TEXT NOT NULL,
+    version INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_deleted_matches_player ON deleted_matches(player_id, version);
+
+CREATE TABLE IF NOT EXISTS seasons (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    start_date TEXT NOT NULL,
+    end_date TEXT NOT NULL,
+    premium_reward INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS matches_2v2 (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    season_id INTEGER NOT NULL REFERENCES seasons(id),
+    player1_id INTEGER NOT NULL,
+    player2_id INTEGER NOT NULL,
+    player3_id INTEGER NOT NULL,
+    player4_id INTEGER NOT NULL,
+    team1_score INTEGER NOT NULL,
+    team2_score INTEGER NOT NULL,
+    date TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    sender_id INTEGER NOT NULL,
+    receiver_id INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    time TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_messages_pair ON messages(sender_id, receiver_id, id);
+CREATE INDEX IF NOT EXISTS idx_messages_receiver ON messages(receiver_id, id);
+
+CREATE TABLE IF NOT EXISTS tournaments (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    description TEXT,
+    start_date TEXT NOT NULL,
+    end_date TEXT NOT NULL,
+    max_players INTEGER NOT NULL DEFAULT 16,
+    prize_pool TEXT,
+    status TEXT NOT NULL DEFAULT 'planned',
+    created_by INTEGER
+);
+
+-- Ответы на запросы с idempotency_key: повтор запроса возвращает тот же ответ
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    key TEXT PRIMARY KEY,
+    action TEXT NOT NULL,
+    response TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_idempotency_keys_created ON idempotency_keys(created_at);
+
+CREATE TABLE IF NOT EXISTS tournament_players (
+    tournament_id INTEGER NOT NULL REFERENCES tournaments(id),
+    player_id INTEGER NOT NULL REFERENCES players(id),
+    registered_at TEXT NOT NULL,
+    PRIMARY KEY (tournament_id, player_id)
+);
+
+-- Агрегаты профиля, обновляемые при записи и удалении матчей:
+-- статистика по картам и по часам/дням недели читается без прохода по матчам
+CREATE TABLE IF NOT EXISTS player_map_stats (
+    player_id INTEGER NOT NULL REFERENCES players(id),
+    map TEXT NOT NULL,
+    matches INTEGER NOT NULL,
+    wins INTEGER NOT NULL,
+    losses INTEGER NOT NULL,
+    kills INTEGER NOT NULL,
+    deaths INTEGER NOT NULL,
+    PRIMARY KEY (player_id, map)
+);
+
+CREATE TABLE IF NOT EXISTS player_time_stats (
+    player_id INTEGER NOT NULL REFERENCES players(id),
+    kind TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    matches INTEGER NOT NULL,
+    wins INTEGER NOT NULL,
+    PRIMARY KEY (player_id, kind, bucket)
+);
+"""
+
+# Версия агрегатов в PRAGMA user_version: при смене формата они пересобираются
+AGGREGATES_VERSION = 1
+
+
+def now_str():
+    return datetime.now().strftime(DATE_FORMAT)
+
+
+def parse_date(value):
+    """Разбор даты в формате клиента, None при ошибке"""
+    try:
+        return datetime.strptime(value, DATE_FORMAT)
+    except (TypeError, ValueError):
+        return None
+
+
+def time_buckets(date):
+    """Корзины агрегатов по времени для даты матча: час и день недели (0 - воскресенье)"""
+    played = parse_date(date)
+    if played is None:
+        return ()
+    return (('hour', played.hour), ('day', (played.weekday() + 1) % 7))
+
+
+def bulk_items(items, convert):
+    """Список без повторов для массового действия (ValueError - если он некорректен)"""
+    if not isinstance(items, list) or not items:
+        raise ValueError("ожидается непустой список")
+    if len(items) > MAX_BULK_ITEMS:
+        raise ValueError(f"не больше {MAX_BULK_ITEMS} элементов за раз")
+    return list(dict.fromkeys(convert(item) for item in items))
+
+
+def chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def hash_password(password, salt):
+    return hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'),
+                               bytes.fromhex(salt), PASSWORD_ITERATIONS).hex()
+
+
+def content_match_id(match):
+    """Постоянный id матча без match_id (старые клиенты) по его содержимому"""
+    key = json.dumps([match.get(field) for field in ('date', 'map', 'result', 'kills', 'deaths',
+                                                      'elo_before', 'elo_after')])
+    return 'legacy-' + hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def error(message):
+    return {'success': False, 'message': message}
+
+
+def signed_elo_change(match):
+    """Изменение ELO со знаком (клиент хранит модуль изменения)"""
+    change = match['elo_change'] or 0
+    return change if match['result'] == 'W' else -change if match['result'] == 'L' else 0
+
+
+class Session:
+    """Игрок, под которым вошло сетевое соединение"""
+
+    def __init__(self):
+        self.nickname = None
+
+
+class GameServer:
+    """Обработчик действий клиента поверх SQLite"""
+
+    def __init__(self, db_path):
+        self.db = sqlite3.connect(db_path)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("PRAGMA foreign_keys=ON")
+        self.db.executescript(SCHEMA)
+        with self.db:
+            self.db.execute("DELETE FROM idempotency_keys WHERE created_at < ?",
+                            ((datetime.now() - timedelta(days=IDEMPOTENCY_TTL_DAYS)).strftime(DATE_FORMAT),))
+
+        # События для подписчиков, накопленные за текущий запрос
+        self.events = []
+        # Игроки, чьи места надо пересчитать после фиксации транзакции
+        self.changed_players = set()
+        # (пароль, соль, хеш), посчитанный сетевой частью до обработки запроса
+        self.prepared_password = None
+        # Сессия соединения, от которого пришел запрос (None - прямой вызов)
+        self.session = None
+        self.rank_index = RankIndex(LEADERBOARD_SORT_FIELDS)
+        self.rebuild_rank_index()
+
+        # База со старой версией (или без) агрегатов - строим их по матчам
+        if self.db.execute("PRAGMA user_version").fetchone()[0] < AGGREGATES_VERSION:
+            self.rebuild_aggregates()
+            self.db.execute(f"PRAGMA user_version = {AGGREGATES_VERSION}")
+
+    # ------------------------------------------------------------------
+    # Диспетчеризация
+    # ------------------------------------------------------------------
+
+    def handle(self, request, prepared_password=None, session=None):
+        """Обработка одного запроса в отдельной транзакции, всегда возвращает словарь.
+        
+        prepared_password - (пароль, соль, хеш) из prepare_password, посчитанный заранее.
+        session - Session соединения: права и игрок, от имени которого действует
+        запрос, берутся из нее, а не из полей запроса.
+        """
+        self.events = []
+        self.changed_players = set()
+        self.prepared_password = prepared_password
+        self.session = session
+        try:
+            with self.db:
+                response = self.dispatch(request)
+        except (KeyError, TypeError, ValueError) as e:
+            self.events = []
+            return error(f"Некорректные параметры: {e}")
+        except Exception:
+            # Транзакция откатилась - события публиковать нельзя
+            self.events = []
+            raise
+        finally:
+            self.prepared_password = None
+            self.session = None
+
+        # Индекс мест меняется только после успешной фиксации
+        self.update_rank_index(self.changed_players)
+        return response
+
+    def rebuild_rank_index(self):
+        """Построение индекса мест по таблице игроков"""
+        self.rank_index = RankIndex(LEADERBOARD_SORT_FIELDS)
+        for player in self.db.execute("SELECT * FROM players WHERE is_banned = 0"):
+            self.rank_index.update(player['nickname'], player)
+
+    def update_rank_index(self, player_ids):
+        for player_id in player_ids:
+            player = self.db.execute("SELECT * FROM players WHERE id = ?", (player_id,)).fetchone()
+            if player is not None:
+                self.rank_index.update(player['nickname'], None if player['is_banned'] else player)
+
+    def player_changed(self, player_id):
+        """Строка игрока в скорборде изменилась: пересчет места и push подписчикам"""
+        self.changed_players.add(player_id)
+        self.publish_player(player_id)
+
+    def publish(self, channel, event, data, recipients=None):
+        """Событие для подписчиков канала (recipients - только этим игрокам)"""
+        self.events.append((channel, {'push': channel, 'event': event, 'data': data}, recipients))
+
+    def pop_events(self):
+        events, self.events = self.events, []
+        return events
+
+    def publish_player(self, player_id):
+        """Публикация актуальной строки скорборда игрока"""
+        player = self.db.execute("SELECT * FROM players WHERE id = ?", (player_id,)).fetchone()
+        if player['is_banned']:
+            self.publish('leaderboard', 'player_removed', {'nickname': player['nickname']})
+        else:
+            self.publish('leaderboard', 'player_updated', self.player_stats(player))
+
+    def dispatch(self, request):
+        """Вызов обработчика действия"""
+        if not isinstance(request, dict):
+            return error("Некорректный запрос")
+
+        action = request.get('action')
+        handler = getattr(self, f"action_{action}", None) if isinstance(action, str) else None
+        if handler is None:
+            return error(f"Неизвестное действие: {action}")
+
+        # Повтор уже выполненного запроса (клиент не получил ответ) не выполняется заново
+        key = request.get('idempotency_key')
+        if key:
+            row = self.db.execute("SELECT response FROM idempotency_keys WHERE key = ?",
+                                  (str(key),)).fetchone()
+            if row:
+                return json.loads(row['response'])
+
+        response = handler(request)
+        if key and response.get('success'):
+            self.db.execute("INSERT INTO idempotency_keys (key, action, response, created_at) "
+                            "VALUES (?, ?, ?, ?)",
+                            (str(key), action, json.dumps(response, ensure_ascii=False), now_str()))
+        return response
+
+    def action_ping(self, request):
+        return {'success': True, 'message': 'pong', 'time': now_str()}
+
+    def action_batch(self, request):
+        """Несколько запросов в одном сообщении, результаты в том же порядке"""
+        requests = request.get('requests')
+        if not isinstance(requests, list):
+            return error("Ожидается список запросов")
+
+        # Точки сохранения вложены в общую транзакцию запроса
+        if not self.db.in_transaction:
+            self.db.execute("BEGIN")
+
+        results = []
+        for index, sub_request in enumerate(requests):
+            if isinstance(sub_request, dict) and sub_request.get('action') == 'batch':
+                results.append(error("Вложенный batch не поддерживается"))
+                continue
+
+            # Упавший подзапрос откатывается целиком, вместе с его событиями
+            savepoint = f"batch_{index}"
+            events_count = len(self.events)
+            changed_players = set(self.changed_players)
+            self.db.execute(f"SAVEPOINT {savepoint}")
+            try:
+                results.append(self.dispatch(sub_request))
+            except (KeyError, TypeError, ValueError) as e:
+                self.db.execute(f"ROLLBACK TO {savepoint}")
+                del self.events[events_count:]
+                self.changed_players = changed_players
+                results.append(error(f"Некорректные параметры: {e}"))
+            self.db.execute(f"RELEASE {savepoint}")
+        return {'success': True, 'results': results}
+
+    # ------------------------------------------------------------------
+    # Вспомогательные методы
+    # ------------------------------------------------------------------
+
+    def get_player(self, nickname):
+        if not nickname:
+            return None
+        return self.db.execute("SELECT * FROM players WHERE nickname = ?", (nickname,)).fetchone()
+
+    def acting_nickname(self, request, field='nickname'):
+        """Ник игрока, от имени которого выполняется запрос.
+        
+        По сети - только ник, под которым вошло соединение (None - вход не выполнен);
+        поле запроса используется лишь при прямом вызове (CLI, скрипты).
+        """
+        if self.session is None:
+            return request.get(field)
+        return self.session.nickname
+
+    def has_role(self, nickname, roles):
+        player = self.get_player(nickname)
+        return player is not None and player['role'] in roles
+
+    def is_premium(self, player):
+        until = parse_date(player['premium_until'])
+        return until is not None and until > datetime.now()
+
+    def player_stats(self, player):
+        stats = {field: player[field] for field in SUMMARY_FIELDS}
+        stats['nickname'] = player['nickname']
+        return stats
+
+    def match_to_dict(self, row):
+        return {
+            'match_id': row['match_id'],
+            'seq': row['seq'],
+            'result': row['result'],
+            'elo_before': row['elo_before'],
+            'elo_after': row['elo_after'],
+            'elo_change': row['elo_change'],
+            'kills': row['kills'],
+            'deaths': row['deaths'],
+            'kd': row['kd'],
+            'hs': row['hs'],
+            'map': row['map'],
+            'date': row['date']
+        }
+
+    def insert_match(self, player_id, match, seq):
+        """Сохранение матча игрока"""
+        kills = int(match.get('kills', 0))
+        deaths = int(match.get('deaths', 0))
+        result = match.get('result')
+        if result not in ('W', 'L', 'T'):
+            raise ValueError(f"Некорректный результат матча: {result}")
+
+        date = match.get('date') or now_str()
+
+        self.db.execute("""
+            INSERT INTO matches (player_id, match_id, seq, result, elo_before, elo_after,
+                                 elo_change, kills, deaths, kd, hs, map, date)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (player_id, match['match_id'], seq, result,
+              match.get('elo_before'), match.get('elo_after'), int(match.get('elo_change', 0)),
+              kills, deaths, float(match.get('kd', kills / deaths if deaths else kills)),
+              float(match.get('hs', 0)), match.get('map'), date))
+        self.apply_match_aggregates(player_id, {'result': result, 'kills': kills, 'deaths': deaths,
+                                                'map': match.get('map'), 'date': date})
+
+    # ------------------------------------------------------------------
+    # Агрегаты профиля (карты, часы, дни недели)
+    # ------------------------------------------------------------------
+
+    def apply_match_aggregates(self, player_id, match, sign=1):
+        """Учет матча (sign=1) или его удаления (sign=-1) в агрегатах игрока"""
+        won = sign * (match['result'] == 'W')
+        lost = sign * (match['result'] == 'L')
+
+        if match['map'] is not None:
+            self.db.execute("""
+                INSERT INTO player_map_stats (player_id, map, matches, wins, losses, kills, deaths)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (player_id, map) DO UPDATE SET
+                    matches = matches + excluded.matches, wins = wins + excluded.wins,
+                    losses = losses + excluded.losses, kills = kills + excluded.kills,
+                    deaths = deaths + excluded.deaths
+            """, (player_id, match['map'], sign, won, lost,
+                  sign * match['kills'], sign * match['deaths']))
+
+        for kind, bucket in time_buckets(match['date']):
+            self.db.execute("""
+                INSERT INTO player_time_stats (player_id, kind, bucket, matches, wins)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (player_id, kind, bucket) DO UPDATE SET
+                    matches = matches + excluded.matches, wins = wins + excluded.wins
+            """, (player_id, kind, bucket, sign, won))
+
+        if sign < 0:
+            self.db.execute("DELETE FROM player_map_stats WHERE player_id = ? AND matches <= 0", (player_id,))
+            self.db.execute("DELETE FROM player_time_stats WHERE player_id = ? AND matches <= 0", (player_id,))
+
+    def computed_aggregates(self, player_id):
+        """Агрегаты игрока, посчитанные заново по его матчам"""
+        maps = {}
+        times = {}
+        for row in self.db.execute("SELECT result, kills, deaths, map, date FROM matches WHERE player_id = ?",
+                                   (player_id,)):
+            won = int(row['result'] == 'W')
+            if row['map'] is not None:
+                entry = maps.setdefault(row['map'], [0, 0, 0, 0, 0])
+                entry[0] += 1
+                entry[1] += won
+                entry[2] += row['result'] == 'L'
+                entry[3] += row['kills']
+                entry[4] += row['deaths']
+            for key in time_buckets(row['date']):
+                entry = times.setdefault(key, [0, 0])
+                entry[0] += 1
+                entry[1] += won
+        return maps, times
+
+    def stored_aggregates(self, player_id):
+        """Агрегаты игрока из таблиц в том же виде, что и computed_aggregates"""
+        maps = {row['map']: [row['matches'], row['wins'], row['losses'], row['kills'], row['deaths']]
+                for row in self.db.execute("SELECT * FROM player_map_stats WHERE player_id = ?", (player_id,))}
+        times = {(row['kind'], row['bucket']): [row['matches'], row['wins']]
+                 for row in self.db.execute("SELECT * FROM player_time_stats WHERE player_id = ?", (player_id,))}
+        return maps, times
+
+    def rebuild_player_aggregates(self, player_id):
+        self.db.execute("DELETE FROM player_map_stats WHERE player_id = ?", (player_id,))
+        self.db.execute("DELETE FROM player_time_stats WHERE player_id = ?", (player_id,))
+        maps, times = self.computed_aggregates(player_id)
+        self.db.executemany("""
+            INSERT INTO player_map_stats (player_id, map, matches, wins, losses, kills, deaths)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, [(player_id, name, *entry) for name, entry in maps.items()])
+        self.db.executemany("""
+            INSERT INTO player_time_stats (player_id, kind, bucket, matches, wins)
+            VALUES (?, ?, ?, ?, ?)
+        """, [(player_id, kind, bucket, *entry) for (kind, bucket), entry in times.items()])
+
+    def aggregate_player_ids(self):
+        """Игроки, у которых есть матчи или строки агрегатов"""
+        return [row[0] for row in self.db.execute("""
+            SELECT player_id FROM matches UNION SELECT player_id FROM player_map_stats
+            UNION SELECT player_id FROM player_time_stats
+        """)]
+
+    def rebuild_aggregates(self):
+        """Пересборка агрегатов всех игроков по матчам"""
+        with self.db:
+            self.db.execute("DELETE FROM player_map_stats")
+            self.db.execute("DELETE FROM player_time_stats")
+            for player_id in self.aggregate_player_ids():
+                self.rebuild_player_aggregates(player_id)
+
+    def check_aggregates(self, repair=False):
+        """Сверка агрегатов с матчами; возвращает ники игроков с расхождениями.
+        
+        repair=True - агрегаты этих игроков пересобираются.
+        """
+        mismatched = []
+        with self.db:
+            for player_id in self.aggregate_player_ids():
+                if self.stored_aggregates(player_id) == self.computed_aggregates(player_id):
+                    continue
+                mismatched.append(player_id)
+                if repair:
+                    self.rebuild_player_aggregates(player_id)
+        return [row['nickname'] for player_id in mismatched
+                for row in self.db.execute("SELECT nickname FROM players WHERE id = ?", (player_id,))]
+
+    def recalculate_player_stats(self, player_id, elo_delta=0):
+        """Пересчет сводной статистики игрока по его матчам"""
+        totals = self.db.execute("""
+            SELECT COUNT(*) AS matches,
+                   COALESCE(SUM(result = 'W'), 0) AS wins,
+                   COALESCE(SUM(result = 'L'), 0) AS losses,
+                   COALESCE(SUM(result = 'T'), 0) AS ties,
+                   COALESCE(SUM(kills), 0) AS total_kills,
+                   COALESCE(SUM(deaths), 0) AS total_deaths,
+                   COALESCE(SUM(kd), 0) AS sum_kd,
+                   COALESCE(SUM(hs), 0) AS sum_hs
+            FROM matches WHERE player_id = ?
+        """, (player_id,)).fetchone()
+
+        # Округления те же, что и при пересчете на клиенте
+        summary = finalize_summary(totals['matches'], totals['wins'], totals['losses'], totals['ties'],
+                                   totals['total_kills'], totals['total_deaths'],
+                                   totals['sum_kd'], totals['sum_hs'])
+        assignments = ', '.join(f"{field} = ?" for field in summary)
+        self.db.execute(f"UPDATE players SET {assignments}, elo = elo + ? WHERE id = ?",
+                        (*summary.values(), elo_delta, player_id))
+
+    # ------------------------------------------------------------------
+    # Регистрация и вход
+    # ------------------------------------------------------------------
+
+    def prepare_password(self, request):
+        """(пароль, соль) запроса login или register, чтобы посчитать хеш вне цикла событий.
+        
+        PBKDF2 занимает десятки миллисекунд и в цикле событий задерживал бы все соединения.
+        """
+        if not isinstance(request, dict) or request.get('action') not in ('login', 'register'):
+            return None
+        if request['action'] == 'register':
+            salt = os.urandom(16).hex()
+        else:
+            player = self.get_player(request.get('nickname'))
+            if player is None:
+                return None
+            salt = player['salt']
+        return str(request.get('password', '')), salt
+
+    def salted_hash(self, password, salt=None):
+        """(соль, хеш пароля); без salt - новая соль.
+        
+        Хеш из prepared_password берется готовым, иначе (batch, create_admin) считается здесь.
+        """
+        prepared, self.prepared_password = self.prepared_password, None
+        if prepared and prepared[0] == password and salt in (None, prepared[1]):
+            return prepared[1], prepared[2]
+        salt = salt or os.urandom(16).hex()
+        return salt, hash_password(password, salt)
+
+    def action_register(self, request):
+        nickname = str(request.get('nickname', '')).strip()
+        password = str(request.get('password', ''))
+        if not nickname or not password:
+            return error("Введите ник и пароль")
+        if len(nickname) > 32:
+            return error("Слишком длинный ник")
+        if self.get_player(nickname):
+            return error("Игрок с таким ником уже существует")
+
+        salt, password_hash = self.salted_hash(password)
+        cursor = self.db.execute("""
+            INSERT INTO players (nickname, password_hash, salt, email, elo, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (nickname, password_hash, salt,
+              request.get('email', ''), DEFAULT_ELO, now_str()))
+        self.player_changed(cursor.lastrowid)
+        if self.session is not None:
+            self.session.nickname = nickname
+        return {'success': True, 'message': 'Регистрация успешна!'}
+
+    def action_login(self, request):
+        player = self.get_player(request.get('nickname'))
+        password = str(request.get('password', ''))
+        if player is None or self.salted_hash(password, player['salt'])[1] != player['password_hash']:
+            return error("Неверный ник или пароль")
+
+        if player['is_banned']:
+            until = parse_date(player['banned_until'])
+            if until is not None and until <= datetime.now():
+                self.db.execute("UPDATE players SET is_banned = 0, ban_reason = NULL, "
+                                "banned_until = NULL WHERE id = ?", (player['id'],))
+                self.player_changed(player['id'])
+            else:
+                reason = player['ban_reason'] or 'без причины'
+                term = f"до {player['banned_until']}" if until else "навсегда"
+                return error(f"Аккаунт заблокирован {term}: {reason}")
+
+        if self.session is not None:
+            self.session.nickname = player['nickname']
+        return {'success': True, 'message': 'Вход выполнен!', 'role': player['role']}
+
+    # ------------------------------------------------------------------
+    # Статистика игрока
+    # ------------------------------------------------------------------
+
+    def action_update_stats(self, request):
+        """Запись матчей игрока.
+
+        Режим delta: matches - только новые матчи.
+        Старый формат: stats - вся статистика вместе с match_details.
+        Сводка пересчитывается по матчам на сервере, присланная клиентом
+        (summary или поля stats) не используется.
+        """
+        player = self.get_player(self.acting_nickname(request))
+        if player is None:
+            return error("Игрок не найден")
+
+        if 'stats' in request:
+            stats = request.get('stats') or {}
+            matches = list(stats.get('match_details', []))
+            if request.get('match'):
+                matches.append(request['match'])
+        else:
+            matches = request.get('matches') or []
+
+        previous_version = player['version']
+        version = previous_version
+        elo_delta = 0
+        acked = {}
+
+        for match in matches:
+            # Без match_id повторная загрузка той же истории не должна дублировать матчи
+            match_id = match.get('match_id') or content_match_id(match)
+            existing = self.db.execute(
+                "SELECT seq FROM matches WHERE player_id = ? AND match_id = ?",
+                (player['id'], match_id)).fetchone()
+            if existing:
+                acked[match_id] = existing['seq']
+                continue
+
+            version += 1
+            self.insert_match(player['id'], dict(match, match_id=match_id), version)
+            elo_delta += signed_elo_change({'result': match.get('result'),
+                                            'elo_change': int(match.get('elo_change') or 0)})
+            acked[match_id] = version
+
+        self.db.execute("UPDATE players SET version = ? WHERE id = ?", (version, player['id']))
+        self.recalculate_player_stats(player['id'], elo_delta=elo_delta)
+        self.player_changed(player['id'])
+
+        return {
+            'success': True,
+            'message': 'Статистика обновлена',
+            'version': version,
+            'previous_version': previous_version,
+            'acked': acked
+        }
+
+    def action_get_stats(self, request):
+        """Статистика игрока; с since_version - только изменения после этой версии.
+        
+        Сводка доступна для любого игрока, история матчей - только своя.
+        """
+        player = self.get_player(request.get('nickname'))
+        if player is None:
+            return error("Игрок не найден")
+
+        response = {'success': True, 'stats': self.player_stats(player)}
+        if player['nickname'] != self.acting_nickname(request):
+            return response
+
+        since = request.get('since_version')
+        if since is None:
+            rows = self.db.execute("SELECT * FROM matches WHERE player_id = ? ORDER BY seq",
+                                   (player['id'],)).fetchall()
+            response['stats']['match_details'] = [self.match_to_dict(row) for row in rows]
+            return response
+
+        since = int(since)
+        rows = self.db.execute("SELECT * FROM matches WHERE player_id = ? AND seq > ? ORDER BY seq",
+                               (player['id'], since)).fetchall()
+        deleted = self.db.execute(
+            "SELECT match_id FROM deleted_matches WHERE player_id = ? AND version > ?",
+            (player['id'], since)).fetchall()
+
+        response['new_matches'] = [self.match_to_dict(row) for row in rows]
+        response['deleted_matches'] = [row['match_id'] for row in deleted]
+        response['version'] = player['version']
+        return response
+
+    def action_get_leaderboard(self, request):
+        """Страница скорборда.
+
+        offset - произвольный переход (прокрутка), after - курсор [значение, ник]
+        последней строки предыдущей страницы для последовательного чтения.
+        """
+        sort_by = request.get('sort_by', 'elo')
+        if sort_by not in LEADERBOARD_SORT_FIELDS:
+            return error(f"Нельзя сортировать по {sort_by}")
+        limit = max(1, min(int(request.get('limit', 100)), 1000))
+        offset = max(0, int(request.get('offset', 0)))
+        after = request.get('after')
+
+        if offset and not after and offset < len(self.rank_index):
+            # Глубокая страница: игрок перед offset берется из индекса мест,
+            # дальше читаем по курсору вместо пропуска offset строк
+            previous = self.get_player(self.rank_index.nickname_at(sort_by, offset - 1))
+            after = [previous[sort_by], previous['nickname']]
+
+        if after:
+            value, nickname = after
+            rows = self.db.execute(f"""
+                SELECT * FROM players
+                WHERE is_banned = 0 AND ({sort_by} < ? OR ({sort_by} = ? AND nickname > ?))
+                ORDER BY {sort_by} DESC, nickname
+                LIMIT ?
+            """, (value, value, nickname, limit)).fetchall()
+            if 'after' in request:
+                offset = None
+        else:
+            rows = self.db.execute(f"""
+                SELECT * FROM players WHERE is_banned = 0
+                ORDER BY {sort_by} DESC, nickname
+                LIMIT ? OFFSET ?
+            """, (limit, offset)).fetchall()
+
+        next_cursor = [rows[-1][sort_by], rows[-1]['nickname']] if len(rows) == limit else None
+        return {'success': True, 'leaderboard': [self.player_stats(row) for row in rows],
+                'total': len(self.rank_index), 'offset': offset, 'next_cursor': next_cursor}
+
+    def action_get_rank(self, request):
+        """Место игрока в скорборде (с 1) по индексу мест"""
+        sort_by = request.get('sort_by', 'elo')
+        if sort_by not in LEADERBOARD_SORT_FIELDS:
+            return error(f"Нельзя сортировать по {sort_by}")
+        player = self.get_player(request.get('nickname'))
+        if player is None:
+            return error("Игрок не найден")
+        rank = self.rank_index.rank(sort_by, player['nickname'])
+        if rank is None:
+            return error("Игрок заблокирован и не участвует в рейтинге")
+
+        return {'success': True, 'rank': rank + 1, 'total': len(self.rank_index),
+                'player': self.player_stats(player)}
+
+    def action_get_leaderboard_window(self, request):
+        """Игрок и его соседи по скорборду: radius мест выше и ниже"""
+        sort_by = request.get('sort_by', 'elo')
+        if sort_by not in LEADERBOARD_SORT_FIELDS:
+            return error(f"Нельзя сортировать по {sort_by}")
+        radius = max(0, min(int(request.get('radius', 5)), 100))
+        player = self.get_player(request.get('nickname'))
+        if player is None:
+            return error("Игрок не найден")
+        rank = self.rank_index.rank(sort_by, player['nickname'])
+        if rank is None:
+            return error("Игрок заблокирован и не участвует в рейтинге")
+
+        start = max(0, rank - radius)
+        nicknames = self.rank_index.window(sort_by, start, rank + radius + 1)
+        rows = self.db.execute(
+            f"SELECT * FROM players WHERE nickname IN ({', '.join('?' * len(nicknames))})",
+            nicknames).fetchall()
+        by_nickname = {row['nickname']: row for row in rows}
+        window = []
+        for position, nickname in enumerate(nicknames, start + 1):
+            entry = self.player_stats(by_nickname[nickname])
+            entry['rank'] = position
+            window.append(entry)
+        return {'success': True, 'rank': rank + 1, 'total': len(self.rank_index),
+                'window': window}
+
+    def action_get_detailed_player_profile(self, request):
+        player = self.get_player(request.get('nickname'))
+        if player is None:
+            return error("Игрок не найден")
+
+        profile = self.player_stats(player)
+        profile.update({
+            'role': player['role'],
+            'is_premium': self.is_premium(player),
+            'premium_until': player['premium_until'] or 'N/A',
+            'created_at': player['created_at']
+        })
+        return {'success': True, 'profile': profile}
+
+    def action_get_elo_history(self, request):
+        player = self.get_player(request.get('nickname'))
+        if player is None:
+            return error("Игрок не найден")
+        if request.get('points'):
+            return self.downsampled_elo_history(player['id'], request)
+        limit = max(1, min(int(request.get('limit', 100)), 10000))
+
+        rows = self.db.execute("""
+            SELECT elo_after, date FROM matches WHERE player_id = ?
+            ORDER BY seq DESC LIMIT ?
+        """, (player['id'], limit)).fetchall()
+        history = [{'elo': row['elo_after'], 'date': row['date']}
+                   for row in reversed(rows) if row['elo_after'] is not None]
+        return {'success': True, 'history': history}
+
+    def downsampled_elo_history(self, player_id, request):
+        """История ELO, прореженная до points точек (LTTB).
+        
+        Участок задается номерами матчей index_from и index_to (включительно)
+        и/или датами date_from и date_to. index - номер матча во всей истории
+        игрока в порядке seq, поэтому прореженные точки и точки приближенного
+        участка ложатся на одну ось, даже если даты идут не по порядку
+        (офлайн-матчи, синхронизированные позже).
+        """
+        points = max(3, min(int(request['points']), 5000))
+
+        conditions = []
+        params = [player_id]
+        for field, key, operator in (('idx', 'index_from', '>='), ('idx', 'index_to', '<='),
+                                     ('date', 'date_from', '>='), ('date', 'date_to', '<=')):
+            value = request.get(key)
+            if value is None or value == '':
+                continue
+            conditions.append(f"{field} {operator} ?")
+            params.append(int(value) if field == 'idx' else value)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        rows = self.db.execute(f"""
+            SELECT * FROM (
+                SELECT elo_after, date, ROW_NUMBER() OVER (ORDER BY seq) - 1 AS idx
+                FROM matches WHERE player_id = ? AND elo_after IS NOT NULL
+            ) {where}
+            ORDER BY idx
+        """, params).fetchall()
+
+        elos = [row['elo_after'] for row in rows]
+        selected = lttb_indices([row['idx'] for row in rows], elos, points)
+        history = [{'index': rows[i]['idx'], 'elo': elos[i], 'date': rows[i]['date']} for i in selected]
+        return {'success': True, 'history': history, 'total': len(rows),
+                'offset': rows[0]['idx'] if rows else 0,
+                'downsampled': len(selected) < len(rows)}
+
+    def action_get_map_statistics(self, request):
+        player = self.get_player(request.get('nickname'))
+        if player is None:
+            return error("Игрок не найден")
+
+        rows = self.db.execute("""
+            SELECT * FROM player_map_stats WHERE player_id = ?
+            ORDER BY matches DESC, map
+        """, (player['id'],)).fetchall()
+
+        stats = [{
+            'map': row['map'],
+            'total_matches': row['matches'],
+            'wins': row['wins'],
+            'losses': row['losses'],
+            'win_rate': round(row['wins'] / row['matches'] * 100, 1),
+            'avg_kills': round(row['kills'] / row['matches'], 1),
+            'avg_deaths': round(row['deaths'] / row['matches'], 1)
+        } for row in rows]
+        return {'success': True, 'stats': stats}
+
+    def action_get_time_statistics(self, request):
+        player = self.get_player(request.get('nickname'))
+        if player is None:
+            return error("Игрок не найден")
+
+        stats = {'hours': [], 'days': []}
+        for row in self.db.execute("""
+            SELECT * FROM player_time_stats WHERE player_id = ? ORDER BY kind, bucket
+        """, (player['id'],)):
+            key_name = 'hour' if row['kind'] == 'hour' else 'day'
+            stats[key_name + 's'].append({key_name: row['bucket'], 'matches': row['matches'], 'wins': row['wins'],
+                                          'win_rate': round(row['wins'] / row['matches'] * 100, 1)})
+        return {'success': True, 'stats': stats}
+
+    def action_get_season_comparison(self, request):
+        player = self.get_player(request.get('nickname'))
+        if player is None:
+            return error("Игрок не найден")
+
+        seasons = []
+        for season in self.db.execute("SELECT * FROM seasons ORDER BY start_date"):
+            row = self.db.execute("""
+                SELECT COUNT(*) AS matches, COALESCE(SUM(result = 'W'), 0) AS wins,
+                       COALESCE(AVG(elo_after), 0) AS avg_elo
+                FROM matches WHERE player_id = ? AND date >= ? AND date <= ?
+            """, (player['id'], season['start_date'], season['end_date'])).fetchone()
+            seasons.append({
+                'name': season['name'],
+                'matches': row['matches'],
+                'wins': row['wins'],
+                'win_rate': round(row['wins'] / row['matches'] * 100, 1) if row['matches'] else 0.0,
+                'avg_elo': row['avg_elo']
+            })
+        return {'success': True, 'seasons': seasons}
+
+    # ------------------------------------------------------------------
+    # Сезоны, премиум, игры 2 на 2
+    # ------------------------------------------------------------------
+
+    def action_get_active_seasons(self, request):
+        now = now_str()
+        rows = self.db.execute("SELECT * FROM seasons WHERE end_date >= ? ORDER BY start_date",
+                               (now,)).fetchall()
+        return {'success': True, 'seasons': [dict(row) for row in rows]}
+
+    def action_create_season(self, request):
+        if not self.has_role(self.acting_nickname(request, 'admin_nickname'), ('admin',)):
+            return error("Только для администраторов")
+
+        start, end = parse_date(request.get('start_date')), parse_date(request.get('end_date'))
+        if not request.get('name') or start is None or end is None:
+            return error("Некорректные данные сезона")
+        if end <= start:
+            return error("Дата окончания должна быть позже даты начала")
+
+        self.db.execute("""
+            INSERT INTO seasons (name, start_date, end_date, premium_reward) VALUES (?, ?, ?, ?)
+        """, (request['name'], start.strftime(DATE_FORMAT), end.strftime(DATE_FORMAT),
+              int(request.get('premium_reward', 0))))
+        return {'success': True, 'message': f"Сезон {request['name']} создан!"}
+
+    def action_grant_premium(self, request):
+        if not self.has_role(self.acting_nickname(request, 'admin_nickname'), ('admin', 'moderator')):
+            return error("Недостаточно прав")
+        player = self.get_player(request.get('nickname'))
+        if player is None:
+            return error("Игрок не найден")
+        days = int(request.get('days', 0))
+        if days <= 0:
+            return error("Некорректное количество дней")
+
+        current = parse_date(player['premium_until'])
+        start = current if current and current > datetime.now() else datetime.now()
+        until = (start + timedelta(days=days)).strftime(DATE_FORMAT)
+        self.db.execute("UPDATE players SET premium_until = ? WHERE id = ?", (until, player['id']))
+        return {'success': True, 'message': f"Премиум выдан игроку {player['nickname']} до {until}"}
+
+    def action_check_premium_status(self, request):
+        player = self.get_player(request.get('nickname'))
+        if player is None:
+            return error("Игрок не найден")
+        return {'success': True, 'premium_data': {
+            'is_premium': self.is_premium(player),
+            'premium_until': player['premium_until']
+        }}
+
+    def action_add_2v2_match(self, request):
+        player = self.get_player(self.acting_nickname(request))
+        if player is None:
+            return error("Игрок не найден")
+        if not self.is_premium(player):
+            return error("Игры 2 на 2 доступны только с премиумом")
+
+        season = self.db.execute("SELECT id FROM seasons WHERE id = ?",
+                                 (request.get('season_id'),)).fetchone()
+        if season is None:
+            return error("Сезон не найден")
+
+        others = []
+        for key in ('teammate_nickname', 'opponent1_nickname', 'opponent2_nickname'):
+            other = self.get_player(request.get(key))
+            if other is None:
+                return error(f"Игрок {request.get(key)} не найден")
+            others.append(other['id'])
+        if len({player['id'], *others}) != 4:
+            return error("Все четыре игрока должны быть разными")
+
+        self.db.execute("""
+            INSERT INTO matches_2v2 (season_id, player1_id, player2_id, player3_id, player4_id,
+                                     team1_score, team2_score, date)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, (season['id'], player['id'], *others,
+              int(request.get('team1_score', 0)), int(request.get('team2_score', 0)), now_str()))
+        return {'success': True, 'message': 'Игра 2 на 2 добавлена'}
+
+    # ------------------------------------------------------------------
+    # Чаты
+    # ------------------------------------------------------------------
+
+    def action_send_message(self, request):
+        sender = self.get_player(self.acting_nickname(request, 'sender_nickname'))
+        receiver = self.get_player(request.get('receiver_nickname'))
+        text = str(request.get('message_text', '')).strip()
+        if sender is None or receiver is None:
+            return error("Игрок не найден")
+        if not text:
+            return error("Пустое сообщение")
+        if len(text) > 2000:
+            return error("Слишком длинное сообщение")
+
+        time = now_str()
+        cursor = self.db.execute("INSERT INTO messages (sender_id, receiver_id, text, time) VALUES (?, ?, ?, ?)",
+                                 (sender['id'], receiver['id'], text, time))
+        self.publish('chat', 'message',
+                     {'id': cursor.lastrowid, 'sender': sender['nickname'], 'receiver': receiver['nickname'],
+                      'text': text, 'time': time},
+                     recipients={sender['nickname'], receiver['nickname']})
+        return {'success': True, 'message': 'Сообщение отправлено'}
+
+    def action_get_chat_messages(self, request):
+        player1 = self.get_player(self.acting_nickname(request, 'player1_nickname'))
+        player2 = self.get_player(request.get('player2_nickname'))
+        if player1 is None or player2 is None:
+            return error("Игрок не найден")
+        limit = max(1, min(int(request.get('limit', 50)), 500))
+
+        rows = self.db.execute("""
+            SELECT m.id, m.text, m.time, p.nickname AS sender FROM messages m
+            JOIN players p ON p.id = m.sender_id
+            WHERE (m.sender_id = ? AND m.receiver_id = ?) OR (m.sender_id = ? AND m.receiver_id = ?)
+            ORDER BY m.id DESC LIMIT ?
+        """, (player1['id'], player2['id'], player2['id'], player1['id'], limit)).fetchall()
+        messages = [{'id': row['id'], 'sender': row['sender'], 'text': row['text'], 'time': row['time']}
+                    for row in reversed(rows)]
+        return {'success': True, 'messages': messages}
+
+    def action_get_user_chats(self, request):
+        player = self.get_player(self.acting_nickname(request))
+        if player is None:
+            return error("Игрок не найден")
+
+        rows = self.db.execute("""
+            SELECT p.nickname AS other_player, MAX(m.id) AS last_id FROM messages m
+            JOIN players p ON p.id = CASE WHEN m.sender_id = ? THEN m.receiver_id ELSE m.sender_id END
+            WHERE m.sender_id = ? OR m.receiver_id = ?
+            GROUP BY p.id ORDER BY last_id DESC
+        """, (player['id'], player['id'], player['id'])).fetchall()
+        return {'success': True, 'chats': [{'other_player': row['other_player']} for row in rows]}
+
+    # ------------------------------------------------------------------
+    # Турниры
+    # ------------------------------------------------------------------
+
+    def tournament_status(self, row):
+        """Статус турнира по датам (отмененный остается отмененным)"""
+        if row['status'] == 'cancelled':
+            return 'cancelled'
+        now = now_str()
+        if now < row['start_date']:
+            return 'planned'
+        if now <= row['end_date']:
+            return 'ongoing'
+        return 'finished'
+
+    def action_create_tournament(self, request):
+        if not self.has_role(self.acting_nickname(request, 'admin_nickname'), ('admin', 'moderator')):
+            return error("Недостаточно прав")
+
+        start, end = parse_date(request.get('start_date')), parse_date(request.get('end_date'))
+        if not request.get('name') or start is None or end is None:
+            return error("Некорректные данные турнира")
+        if end <= start:
+            return error("Дата окончания должна быть позже даты начала")
+        max_players = int(request.get('max_players', 16))
+        if max_players < 2:
+            return error("Слишком мало участников")
+
+        creator = self.get_player(self.acting_nickname(request, 'admin_nickname'))
+        cursor = self.db.execute("""
+            INSERT INTO tournaments (name, description, start_date, end_date, max_players,
+                                     prize_pool, created_by)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (request['name'], request.get('description', ''), start.strftime(DATE_FORMAT),
+              end.strftime(DATE_FORMAT), max_players, request.get('prize_pool') or 'Нет',
+              creator['id']))
+        self.publish_tournament(cursor.lastrowid)
+        return {'success': True, 'message': f"Турнир {request['name']} создан!"}
+
+    def query_tournaments(self, tournament_id=None):
+        """Турниры с числом участников и актуальным статусом"""
+        where = "WHERE t.id = ?" if tournament_id is not None else ""
+        params = (tournament_id,) if tournament_id is not None else ()
+        rows = self.db.execute(f"""
+            SELECT t.*, COUNT(tp.player_id) AS current_players FROM tournaments t
+            LEFT JOIN tournament_players tp ON tp.tournament_id = t.id
+            {where}
+            GROUP BY t.id ORDER BY t.start_date
+        """, params).fetchall()
+
+        tournaments = []
+        for row in rows:
+            tournament = dict(row)
+            tournament['status'] = self.tournament_status(row)
+            tournament.pop('created_by', None)
+            tournaments.append(tournament)
+        return tournaments
+
+    def publish_tournament(self, tournament_id):
+        for tournament in self.query_tournaments(tournament_id):
+            self.publish('tournaments', 'changed', tournament)
+
+    def action_get_tournaments(self, request):
+        status_filter = request.get('status')
+        tournaments = [tournament for tournament in self.query_tournaments()
+                       if not status_filter or tournament['status'] == status_filter]
+        return {'success': True, 'tournaments': tournaments}
+
+    def action_register_for_tournament(self, request):
+        player = self.get_player(self.acting_nickname(request))
+        if player is None:
+            return error("Игрок не найден")
+        tournament = self.db.execute("SELECT * FROM tournaments WHERE id = ?",
+                                     (int(request.get('tournament_id')),)).fetchone()
+        if tournament is None:
+            return error("Турнир не найден")
+        if self.tournament_status(tournament) != 'planned':
+            return error("Регистрация на турнир закрыта")
+
+        registered = self.db.execute("SELECT COUNT(*) FROM tournament_players WHERE tournament_id = ?",
+                                     (tournament['id'],)).fetchone()[0]
+        if registered >= tournament['max_players']:
+            return error("Все места заняты")
+        if self.db.execute("SELECT 1 FROM tournament_players WHERE tournament_id = ? AND player_id = ?",
+                           (tournament['id'], player['id'])).fetchone():
+            return error("Вы уже зарегистрированы")
+
+        self.db.execute("INSERT INTO tournament_players (tournament_id, player_id, registered_at) "
+                        "VALUES (?, ?, ?)", (tournament['id'], player['id'], now_str()))
+        self.publish_tournament(tournament['id'])
+        return {'success': True, 'message': f"Вы зарегистрированы на турнир {tournament['name']}"}
+
+    # ------------------------------------------------------------------
+    # Администрирование
+    # ------------------------------------------------------------------
+
+    def action_admin_get_players(self, request):
+        if not self.has_role(self.acting_nickname(request, 'nickname'), ('admin', 'moderator')):
+            return error("Недостаточно прав")
+        limit = max(1, min(int(request.get('limit', 50)), 500))
+        offset = max(0, int(request.get('offset', 0)))
+        after = request.get('after')
+
+        if after:
+            # Курсор - ник последнего игрока предыдущей страницы
+            rows = self.db.execute("""
+                SELECT nickname, elo, role, matches, is_banned FROM players
+                WHERE nickname > ? ORDER BY nickname LIMIT ?
+            """, (after, limit)).fetchall()
+            offset = None
+        else:
+            rows = self.db.execute("""
+                SELECT nickname, elo, role, matches, is_banned FROM players
+                ORDER BY nickname LIMIT ? OFFSET ?
+            """, (limit, offset)).fetchall()
+
+        total = self.db.execute("SELECT COUNT(*) FROM players").fetchone()[0]
+        next_cursor = rows[-1]['nickname'] if len(rows) == limit else None
+        return {'success': True, 'players': [dict(row) for row in rows],
+                'total': total, 'offset': offset, 'next_cursor': next_cursor}
+
+    def action_admin_change_role(self, request):
+        if not self.has_role(self.acting_nickname(request, 'admin_nickname'), ('admin',)):
+            return error("Только для администраторов")
+        target = self.get_player(request.get('target_nickname'))
+        if target is None:
+            return error("Игрок не найден")
+        new_role = request.get('new_role')
+        if new_role not in ROLES:
+            return error(f"Неизвестная роль: {new_role}")
+        if target['nickname'] == self.acting_nickname(request, 'admin_nickname') and new_role != 'admin':
+            return error("Нельзя понизить самого себя")
+
+        self.db.execute("UPDATE players SET role = ? WHERE id = ?", (new_role, target['id']))
+        return {'success': True, 'message': f"Роль игрока {target['nickname']} изменена на {new_role}"}
+
+    def ban_players(self, admin_nickname, nicknames, days, reason):
+        """Бан игроков; возвращает (забаненные, {ник: причина отказа})"""
+        until = (datetime.now() + timedelta(days=days)).strftime(DATE_FORMAT) if days else None
+        banned = []
+        failed = {}
+        for nickname in nicknames:
+            target = self.get_player(nickname)
+            if target is None:
+                failed[nickname] = "Игрок не найден"
+                continue
+            if target['role'] == 'admin' or target['nickname'] == admin_nickname:
+                failed[nickname] = "Этого игрока нельзя забанить"
+                continue
+            self.db.execute("UPDATE players SET is_banned = 1, ban_reason = ?, banned_until = ? WHERE id = ?",
+                            (reason, until, target['id']))
+            self.player_changed(target['id'])
+            banned.append(target['nickname'])
+        return banned, failed
+
+    def unban_players(self, nicknames):
+        """Разбан игроков; возвращает (разбаненные, {ник: причина отказа})"""
+        unbanned = []
+        failed = {}
+        for nickname in nicknames:
+            target = self.get_player(nickname)
+            if target is None:
+                failed[nickname] = "Игрок не найден"
+                continue
+            self.db.execute("UPDATE players SET is_banned = 0, ban_reason = NULL, banned_until = NULL "
+                            "WHERE id = ?", (target['id'],))
+            self.player_changed(target['id'])
+            unbanned.append(target['nickname'])
+        return unbanned, failed
+
+    def action_admin_ban_player(self, request):
+        admin_nickname = self.acting_nickname(request, 'admin_nickname')
+        if not self.has_role(admin_nickname, ('admin', 'moderator')):
+            return error("Недостаточно прав")
+        days = int(request.get('days', 0))
+        if days < 0:
+            return error("Некорректный срок")
+
+        banned, failed = self.ban_players(admin_nickname, [request.get('target_nickname')], days,
+                                          request.get('reason', ''))
+        if failed:
+            return error(next(iter(failed.values())))
+        return {'success': True, 'message': f"Игрок {banned[0]} забанен"}
+
+    def action_admin_unban_player(self, request):
+        if not self.has_role(self.acting_nickname(request, 'admin_nickname'), ('admin', 'moderator')):
+            return error("Недостаточно прав")
+        unbanned, failed = self.unban_players([request.get('target_nickname')])
+        if failed:
+            return error(next(iter(failed.values())))
+        return {'success': True, 'message': f"Игрок {unbanned[0]} разбанен"}
+
+    def action_admin_ban_players(self, request):
+        """Бан списка игроков в одной транзакции"""
+        admin_nickname = self.acting_nickname(request, 'admin_nickname')
+        if not self.has_role(admin_nickname, ('admin', 'moderator')):
+            return error("Недостаточно прав")
+        nicknames = bulk_items(request.get('target_nicknames'), str)
+        days = int(request.get('days', 0))
+        if days < 0:
+            return error("Некорректный срок")
+
+        banned, failed = self.ban_players(admin_nickname, nicknames, days, request.get('reason', ''))
+        return {'success': True, 'message': f"Забанено игроков: {len(banned)}",
+                'banned': banned, 'failed': failed}
+
+    def action_admin_unban_players(self, request):
+        """Разбан списка игроков в одной транзакции"""
+        if not self.has_role(self.acting_nickname(request, 'admin_nickname'), ('admin', 'moderator')):
+            return error("Недостаточно прав")
+        unbanned, failed = self.unban_players(bulk_items(request.get('target_nicknames'), str))
+        return {'success': True, 'message': f"Разбанено игроков: {len(unbanned)}",
+                'unbanned': unbanned, 'failed': failed}
+
+    def action_admin_get_matches(self, request):
+        """Матчи для модерации, новые первыми.
+        
+        Фильтры: player, verified (true/false), map, result, date_from, date_to.
+        Страницы по курсору: after_id - id последнего матча предыдущей
+        страницы, в ответе next_cursor (None - страниц больше нет).
+        """
+        if not self.has_role(self.acting_nickname(request, 'nickname'), ('admin', 'moderator')):
+            return error("Недостаточно прав")
+        limit = max(1, min(int(request.get('limit', 30)), 500))
+
+        conditions = []
+        params = []
+        if request.get('player'):
+            player = self.get_player(request['player'])
+            if player is None:
+                return {'success': True, 'matches': [], 'next_cursor': None}
+            conditions.append("m.player_id = ?")
+            params.append(player['id'])
+        if request.get('verified') is not None:
+            conditions.append("m.is_verified = ?")
+            params.append(1 if request['verified'] else 0)
+        if request.get('map'):
+            conditions.append("m.map = ?")
+            params.append(request['map'])
+        if request.get('result'):
+            if request['result'] not in ('W', 'L', 'T'):
+                return error(f"Некорректный результат матча: {request['result']}")
+            conditions.append("m.result = ?")
+            params.append(request['result'])
+        if request.get('date_from'):
+            conditions.append("m.date >= ?")
+            params.append(request['date_from'])
+        if request.get('date_to'):
+            conditions.append("m.date <= ?")
+            params.append(request['date_to'])
+        if request.get('after_id') is not None:
+            conditions.append("m.id < ?")
+            params.append(int(request['after_id']))
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = self.db.execute(f"""
+            SELECT m.id, p.nickname AS player, m.result, m.kills, m.deaths,
+                   m.hs AS hs_percentage, m.is_verified, m.map, m.date
+            FROM matches m JOIN players p ON p.id = m.player_id
+            {where}
+            ORDER BY m.id DESC LIMIT ?
+        """, (*params, limit)).fetchall()
+        matches = [dict(row, is_verified=bool(row['is_verified'])) for row in rows]
+        next_cursor = rows[-1]['id'] if len(rows) == limit else None
+        return {'success': True, 'matches': matches, 'next_cursor': next_cursor}
+
+    def verify_matches(self, match_ids, verify):
+        """Смена статуса проверки матчей; возвращает id, которых нет в базе"""
+        found = set()
+        for chunk in chunks(match_ids, 500):
+            placeholders = ', '.join('?' * len(chunk))
+            found.update(row[0] for row in self.db.execute(
+                f"SELECT id FROM matches WHERE id IN ({placeholders})", chunk))
+            self.db.execute(f"UPDATE matches SET is_verified = ? WHERE id IN ({placeholders})",
+                            (1 if verify else 0, *chunk))
+        return [match_id for match_id in match_ids if match_id not in found]
+
+    def delete_matches(self, match_ids):
+        """Удаление матчей; возвращает (удаленные матчи, id, которых нет в базе, ники их игроков).
+        
+        Версия, сводная статистика и место игрока пересчитываются один раз
+        на игрока, сколько бы его матчей ни удалялось.
+        """
+        matches = []
+        for chunk in chunks(match_ids, 500):
+            placeholders = ', '.join('?' * len(chunk))
+            matches.extend(self.db.execute(f"SELECT * FROM matches WHERE id IN ({placeholders})", chunk))
+        found = {match['id'] for match in matches}
+
+        by_player = {}
+        for match in matches:
+            by_player.setdefault(match['player_id'], []).append(match)
+
+        nicknames = []
+        for player_id, player_matches in by_player.items():
+            # Удаление видно клиентам через дельта-синхронизацию
+            player = self.db.execute("SELECT nickname, version FROM players WHERE id = ?",
+                                     (player_id,)).fetchone()
+            nicknames.append(player['nickname'])
+            version = player['version'] + 1
+            self.db.executemany("DELETE FROM matches WHERE id = ?", [(match['id'],) for match in player_matches])
+            self.db.executemany("INSERT INTO deleted_matches (player_id, match_id, version) VALUES (?, ?, ?)",
+                                [(player_id, match['match_id'], version) for match in player_matches])
+            for match in player_matches:
+                self.apply_match_aggregates(player_id, match, sign=-1)
+            self.db.execute("UPDATE players SET version = ? WHERE id = ?", (version, player_id))
+            self.recalculate_player_stats(
+                player_id, elo_delta=-sum(signed_elo_change(match) for match in player_matches))
+            self.player_changed(player_id)
+
+        return matches, [match_id for match_id in match_ids if match_id not in found], sorted(nicknames)
+
+    def action_admin_verify_match(self, request):
+        if not self.has_role(self.acting_nickname(request, 'admin_nickname'), ('admin', 'moderator')):
+            return error("Недостаточно прав")
+        if self.verify_matches([int(request.get('match_id'))], request.get('verify', True)):
+            return error("Матч не найден")
+        return {'success': True, 'message': 'Статус матча обновлен'}
+
+    def action_admin_delete_match(self, request):
+        if not self.has_role(self.acting_nickname(request, 'admin_nickname'), ('admin', 'moderator')):
+            return error("Недостаточно прав")
+        _, missing, _ = self.delete_matches([int(request.get('match_id'))])
+        if missing:
+            return error("Матч не найден")
+        return {'success': True, 'message': 'Матч удален'}
+
+    def action_admin_verify_matches(self, request):
+        """Подтверждение или отклонение списка матчей в одной транзакции"""
+        if not self.has_role(self.acting_nickname(request, 'admin_nickname'), ('admin', 'moderator')):
+            return error("Недостаточно прав")
+        match_ids = bulk_items(request.get('match_ids'), int)
+        missing = self.verify_matches(match_ids, request.get('verify', True))
+        updated = len(match_ids) - len(missing)
+        return {'success': True, 'message': f"Обновлено матчей: {updated}",
+                'updated': updated, 'missing': missing}
+
+    def action_admin_delete_matches(self, request):
+        """Удаление списка матчей в одной транзакции"""
+        if not self.has_role(self.acting_nickname(request, 'admin_nickname'), ('admin', 'moderator')):
+            return error("Недостаточно прав")
+        matches, missing, players = self.delete_matches(bulk_items(request.get('match_ids'), int))
+        return {'success': True, 'message': f"Удалено матчей: {len(matches)}",
+                'deleted': len(matches), 'missing': missing, 'players': players}
+
+    def action_admin_get_stats(self, request):
+        if not self.has_role(self.acting_nickname(request, 'nickname'), ('admin', 'moderator')):
+            return error("Недостаточно прав")
+
+        def count(query, *params):
+            return self.db.execute(query, params).fetchone()[0]
+
+        roles = self.db.execute("SELECT role, COUNT(*) AS count FROM players GROUP BY role").fetchall()
+        return {'success': True, 'stats': {
+            'total_players': count("SELECT COUNT(*) FROM players"),
+            'active_players': count("SELECT COUNT(*) FROM players WHERE is_banned = 0 AND matches > 0"),
+            'banned_players': count("SELECT COUNT(*) FROM players WHERE is_banned = 1"),
+            'total_matches': count("SELECT COUNT(*) FROM matches"),
+            'unverified_matches': count("SELECT COUNT(*) FROM matches WHERE is_verified = 0"),
+            'roles_distribution': {row['role']: row['count'] for row in roles}
+        }}
+
+    # ------------------------------------------------------------------
+    # Служебное
+    # ------------------------------------------------------------------
+
+    def action_admin_check_aggregates(self, request):
+        """Сверка агрегатов профилей с матчами (repair - пересобрать расходящиеся)"""
+        if not self.has_role(self.acting_nickname(request, 'admin_nickname'), ('admin',)):
+            return error("Только для администраторов")
+        repair = bool(request.get('repair'))
+        mismatched = self.check_aggregates(repair=repair)
+        return {'success': True, 'mismatched': mismatched, 'repaired': repair and bool(mismatched)}
+
+    def create_admin(self, nickname, password):
+        """Создание администратора (или повышение существующего игрока)"""
+        with self.db:
+            if self.get_player(nickname) is None:
+                self.action_register({'nickname': nickname, 'password': password})
+            self.db.execute("UPDATE players SET role = 'admin' WHERE nickname = ?", (nickname,))
+        self.update_rank_index(self.changed_players)
+
+
+class ServerProtocolHandler:
+    """Сетевая часть сервера на asyncio"""
+
+    def __init__(self, game):
+        self.game = game
+        self.clients = 0
+        # Подписки: канал -> {writer: никнейм подписчика}
+        self.subscribers = {channel: {} for channel in CHANNELS}
+        # Флаги кодировки и сжатия ответов для каждого соединения (после negotiate)
+        self.encodings = {}
+        # Игрок, под которым вошло каждое соединение
+        self.sessions = {}
+
+    def negotiate(self, writer, request):
+        """Выбор кодировки и сжатия ответов из предложенных клиентом"""
+        encoding = choose_encoding(request.get('encodings'))
+        compression = choose_compression(request.get('compression'))
+        flags = ENCODINGS[encoding]
+        if compression:
+            flags |= COMPRESSIONS[compression]
+        self.encodings[writer] = flags
+        return {'success': True, 'encoding': encoding, 'compression': compression}
+
+    def subscribe(self, writer, request):
+        """Подписка соединения на канал"""
+        channel = request.get('channel')
+        if channel not in CHANNELS:
+            return error(f"Неизвестный канал: {channel}")
+        nickname = request.get('nickname')
+        if channel == 'chat':
+            # Личные сообщения получает только тот, под кем вошло соединение
+            session_nickname = self.sessions[writer].nickname
+            if not session_nickname:
+                return error("Для подписки на чат нужно войти")
+            if nickname and nickname != session_nickname:
+                return error("Можно подписаться только на свой чат")
+            nickname = session_nickname
+        self.subscribers[channel][writer] = nickname
+        return {'success': True, 'channel': channel}
+
+    def unsubscribe(self, writer, request):
+        channel = request.get('channel')
+        channels = [channel] if channel in CHANNELS else CHANNELS
+        for name in channels:
+            self.subscribers[name].pop(writer, None)
+        return {'success': True}
+
+    def broadcast(self, events):
+        """Рассылка событий подписчикам без ожидания медленных клиентов"""
+        for channel, message, recipients in events:
+            # Кадр в каждой кодировке собираем один раз
+            frames = {}
+            for writer, nickname in list(self.subscribers[channel].items()):
+                if recipients is not None and nickname not in recipients:
+                    continue
+                if writer.is_closing():
+                    self.drop_subscriber(writer)
+                    continue
+                if writer.transport.get_write_buffer_size() > MAX_PUSH_BUFFER:
+                    print(f"[!] {writer.get_extra_info('peername')}: подписчик не успевает, отключаем")
+                    self.drop_subscriber(writer)
+                    writer.close()
+                    continue
+                flags = self.encodings.get(writer, FLAG_JSON)
+                if flags not in frames:
+                    frames[flags] = encode_message(message, flags)
+                writer.write(frames[flags])
+
+    def drop_subscriber(self, writer):
+        for subscribers in self.subscribers.values():
+            subscribers.pop(writer, None)
+
+    async def handle_client(self, reader, writer):
+        peer = writer.get_extra_info('peername')
+        self.clients += 1
+        self.sessions[writer] = Session()
+        try:
+            while True:
+                try:
+                    request = await read_message(reader)
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except ProtocolError as e:
+                    print(f"[!] {peer}: {e}")
+                    break
+
+                request_id = request.get('request_id') if isinstance(request, dict) else None
+                action = request.get('action') if isinstance(request, dict) else None
+                events = []
+                flags = self.encodings.get(writer, FLAG_JSON)
+                try:
+                    if action == 'negotiate':
+                        # Ответ на negotiate еще в прежней кодировке
+                        response = self.negotiate(writer, request)
+                    elif action == 'subscribe':
+                        response = self.subscribe(writer, request)
+                    elif action == 'unsubscribe':
+                        response = self.unsubscribe(writer, request)
+                    else:
+                        prepared = self.game.prepare_password(request)
+                        if prepared:
+                            # Хеш пароля считается в пуле потоков, цикл событий обслуживает остальных
+                            password_hash = await asyncio.get_running_loop().run_in_executor(
+                                None, hash_password, *prepared)
+                            prepared = (*prepared, password_hash)
+                        session = self.sessions[writer]
+                        response = self.game.handle(request, prepared, session)
+                        events = self.game.pop_events()
+                        # Вход под другим игроком - чат прежнего игрока больше не приходит
+                        if self.subscribers['chat'].get(writer, session.nickname) != session.nickname:
+                            self.subscribers['chat'].pop(writer)
+                except Exception as e:
+                    print(f"[!] Ошибка обработки {action or request}: {e}")
+                    response = error("Внутренняя ошибка сервера")
+
+                if request_id is not None:
+                    response['request_id'] = request_id
+                writer.write(encode_message(response, flags))
+                # Ответ автору изменения уходит раньше push-сообщений
+                if events:
+                    self.broadcast(events)
+                await writer.drain()
+        finally:
+            self.clients -= 1
+            self.drop_subscriber(writer)
+            self.encodings.pop(writer, None)
+            self.sessions.pop(writer, None)
+            writer.close()
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle_client, host, port, backlog=1024)
+        addresses = ', '.join(str(sock.getsockname()) for sock in server.sockets)
+        print(f"[*] Сервер запущен на {addresses}")
+        async with server:
+            await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Эталонный сервер FaceIt Scoreboard")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5555)
+    parser.add_argument('--db', default='faceit_server.db')
+    parser.add_argument('--create-admin', nargs=2, metavar=('NICKNAME', 'PASSWORD'),
+                        help="создать администратора и выйти")
+    parser.add_argument('--check-aggregates', action='store_true',
+                        help="сверить агрегаты профилей с матчами, пересобрать расходящиеся и выйти")
+    args = parser.parse_args()
+
+    game = GameServer(args.db)
+    if args.create_admin:
+        game.create_admin(*args.create_admin)
+        print(f"[*] Администратор {args.create_admin[0]} создан")
+        return
+    if args.check_aggregates:
+        mismatched = game.check_aggregates(repair=True)
+        if mismatched:
+            print(f"[!] Агрегаты пересобраны для {len(mismatched)} игроков: {', '.join(mismatched)}")
+        else:
+            print("[*] Агрегаты совпадают с матчами")
+        return
+
+    try:
+        asyncio.run(ServerProtocolHandler(game).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        print("[*] Сервер остановлен")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+# stats_engine.py - пересчет сводной статистики по списку матчей
+#
+# История матчей раскладывается по столбцам (результат, убийства, смерти,
+# K/D, HS%, карта), и все агрегаты считаются за один проход по столбцам:
+# суммы, средние, процент побед и разбивка по картам. Средние считаются
+# от точных сумм, а не накапливаются округленными, поэтому не "плывут".
+#
+# С NumPy столбцы - массивы и проход векторизован, без NumPy те же
+# формулы считаются обычными циклами.
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+RESULT_CODES = {'W': 0, 'L': 1, 'T': 2}
+
+
+def finalize_summary(matches, wins, losses, ties, total_kills, total_deaths, sum_kd, sum_hs):
+    """Сводка игрока из точных сумм (те же округления, что и на сервере)"""
+    return {
+        'matches': matches,
+        'wins': wins,
+        'losses': losses,
+        'ties': ties,
+        'total_kills': total_kills,
+        'total_deaths': total_deaths,
+        'avg_kd': round(sum_kd / matches, 2) if matches else 0.0,
+        'avg_hs': round(sum_hs / matches, 1) if matches else 0.0,
+        'avg_kills': round(total_kills / matches, 1) if matches else 0.0,
+        'win_percentage': round(wins / matches * 100, 1) if matches else 0.0
+    }
+
+
+def _map_entry(name, matches, wins, losses, kills, deaths):
+    return {
+        'map': name,
+        'total_matches': matches,
+        'wins': wins,
+        'losses': losses,
+        'win_rate': round(wins / matches * 100, 1) if matches else 0.0,
+        'avg_kills': round(kills / matches, 1) if matches else 0.0,
+        'avg_deaths': round(deaths / matches, 1) if matches else 0.0
+    }
+
+
+class MatchColumns:
+    """История матчей в виде столбцов"""
+
+    def __init__(self, results, kills, deaths, kd, hs, maps, map_names):
+        self.results = results
+        self.kills = kills
+        self.deaths = deaths
+        self.kd = kd
+        self.hs = hs
+        # Код карты для каждого матча (-1 - карта не указана) и названия кодов
+        self.maps = maps
+        self.map_names = map_names
+
+    @classmethod
+    def from_matches(cls, matches):
+        map_codes = {}
+        map_column = []
+        for match in matches:
+            name = match.get('map')
+            map_column.append(map_codes.setdefault(name, len(map_codes)) if name else -1)
+
+        columns = (
+            [RESULT_CODES.get(match.get('result'), RESULT_CODES['T']) for match in matches],
+            [match.get('kills') or 0 for match in matches],
+            [match.get('deaths') or 0 for match in matches],
+            [match.get('kd') or 0.0 for match in matches],
+            [match.get('hs') or 0.0 for match in matches],
+            map_column
+        )
+        if NUMPY_AVAILABLE:
+            dtypes = (np.int8, np.int64, np.int64, np.float64, np.float64, np.int64)
+            columns = [np.asarray(column, dtype=dtype) for column, dtype in zip(columns, dtypes)]
+        return cls(*columns, map_names=list(map_codes))
+
+    def __len__(self):
+        return len(self.results)
+
+    def aggregates(self):
+        """Сводка и разбивка по картам за один проход"""
+        if NUMPY_AVAILABLE:
+            return self._aggregates_numpy()
+        return self._aggregates_python()
+
+    def _aggregates_numpy(self):
+        matches = len(self.results)
+        outcome = np.bincount(self.results, minlength=3)
+        summary = finalize_summary(
+            matches, int(outcome[0]), int(outcome[1]), int(outcome[2]),
+            int(self.kills.sum()), int(self.deaths.sum()),
+            float(self.kd.sum()), float(self.hs.sum()))
+
+        maps = []
+        if self.map_names:
+            known = self.maps >= 0
+            codes = self.maps[known]
+            size = len(self.map_names)
+            counts = np.bincount(codes, minlength=size)
+            wins = np.bincount(codes, weights=(self.results[known] == 0), minlength=size)
+            losses = np.bincount(codes, weights=(self.results[known] == 1), minlength=size)
+            kills = np.bincount(codes, weights=self.kills[known], minlength=size)
+            deaths = np.bincount(codes, weights=self.deaths[known], minlength=size)
+            for code, name in enumerate(self.map_names):
+                maps.append(_map_entry(name, int(counts[code]), int(wins[code]), int(losses[code]),
+                                       float(kills[code]), float(deaths[code])))
+
+        maps.sort(key=lambda entry: entry['total_matches'], reverse=True)
+        return {'summary': summary, 'maps': maps}
+
+    def _aggregates_python(self):
+        outcome = [0, 0, 0]
+        # Код карты -> [матчи, победы, поражения, убийства, смерти]
+        per_map = [[0, 0, 0, 0, 0] for _ in self.map_names]
+        for result, kills, deaths, code in zip(self.results, self.kills, self.deaths, self.maps):
+            outcome[result] += 1
+            if code >= 0:
+                entry = per_map[code]
+                entry[0] += 1
+                entry[1] += result == 0
+                entry[2] += result == 1
+                entry[3] += kills
+                entry[4] += deaths
+
+        summary = finalize_summary(len(self.results), outcome[0], outcome[1], outcome[2],
+                                   sum(self.kills), sum(self.deaths), sum(self.kd), sum(self.hs))
+        maps = [_map_entry(name, *per_map[code]) for code, name in enumerate(self.map_names)]
+        maps.sort(key=lambda entry: entry['total_matches'], reverse=True)
+        return {'summary': summary, 'maps': maps}
+
+
+def compute_aggregates(matches):
+    """Точная сводка и статистика по картам по списку матчей"""
+    return MatchColumns.from_matches(matches).aggregates()
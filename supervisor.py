@@ -0,0 +1,125 @@
+# supervisor.py - поддержание соединения с сервером
+#
+# Фоновый поток следит за соединением: пока оно есть, раз в
+# heartbeat_interval секунд отправляет ping; при разрыве переподключается
+# с экспоненциальной задержкой (1, 2, 4 ... max_delay секунд) со случайным
+# разбросом, чтобы клиенты после сбоя VPN не переподключались одновременно.
+import random
+import threading
+
+# Действия, которые можно безопасно повторить после разрыва
+IDEMPOTENT_ACTIONS = {
+    'ping', 'login', 'get_stats', 'get_leaderboard', 'get_rank', 'get_leaderboard_window',
+    'get_detailed_player_profile', 'get_elo_history', 'get_map_statistics', 'get_time_statistics',
+    'get_season_comparison', 'get_active_seasons', 'check_premium_status', 'get_chat_messages',
+    'get_user_chats', 'get_tournaments', 'admin_get_players', 'admin_get_matches', 'admin_get_stats',
+    'subscribe', 'unsubscribe'
+}
+
+
+def is_idempotent(request):
+    """Можно ли повторить запрос, не рискуя выполнить его дважды"""
+    action = request.get('action')
+    if request.get('idempotency_key') or action in IDEMPOTENT_ACTIONS:
+        return True
+    if action == 'update_stats' and request.get('mode') == 'delta':
+        # Матчи принимаются по match_id, сводка просто перезаписывается
+        return True
+    if action == 'batch':
+        return all(is_idempotent(sub_request) for sub_request in request.get('requests', []))
+    return False
+
+
+class ConnectionSupervisor:
+    """Фоновое переподключение и проверка соединения"""
+
+    def __init__(self, connect, ping, on_state=None, heartbeat_interval=10.0,
+                 base_delay=1.0, max_delay=60.0):
+        """connect() -> bool - открыть соединение (и восстановить сессию),
+        ping() -> bool - проверить живое соединение,
+        on_state(connected, retry_delay) - вызывается из фонового потока.
+        """
+        self.connect = connect
+        self.ping = ping
+        self.on_state = on_state
+        self.heartbeat_interval = heartbeat_interval
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self.attempt = 0
+        self.connected = threading.Event()
+        self._wake = threading.Event()
+        self._stopped = False
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="connection-supervisor")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stopped = True
+        self._wake.set()
+
+    def connection_lost(self):
+        """Сообщение о разрыве соединения (из любого потока)"""
+        if self.connected.is_set():
+            self.connected.clear()
+            self._notify(False, None)
+        self._wake.set()
+
+    def reconnect_now(self):
+        """Немедленное переподключение без накопленной задержки"""
+        self.attempt = 0
+        self.connected.clear()
+        self._wake.set()
+
+    def wait_connected(self, timeout):
+        return self.connected.wait(timeout)
+
+    def backoff_delay(self):
+        """Задержка перед следующей попыткой: половина фиксированная, половина случайная"""
+        delay = min(self.max_delay, self.base_delay * 2 ** self.attempt)
+        return random.uniform(delay / 2, delay)
+
+    def _notify(self, connected, retry_delay):
+        if self.on_state:
+            try:
+                self.on_state(connected, retry_delay)
+            except Exception as e:
+                print(f"Ошибка обработки состояния соединения: {e}")
+
+    def _run(self):
+        while not self._stopped:
+            if self.connected.is_set():
+                woken = self._wake.wait(self.heartbeat_interval)
+                self._wake.clear()
+                if self._stopped or woken:
+                    # Разбудили из-за разрыва или ручного переподключения
+                    continue
+                if not self._safe(self.ping):
+                    self.connection_lost()
+                continue
+
+            if self._safe(self.connect):
+                self.attempt = 0
+                self.connected.set()
+                self._notify(True, None)
+                continue
+
+            delay = self.backoff_delay()
+            self.attempt += 1
+            self._notify(False, delay)
+            self._wake.wait(delay)
+            self._wake.clear()
+
+    @staticmethod
+    def _safe(func):
+        try:
+            return bool(func())
+        except Exception as e:
+            print(f"[!] Ошибка соединения: {e}")
+            return False
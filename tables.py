@@ -0,0 +1,218 @@
+# tables.py - точечное обновление таблиц ttk.Treeview
+#
+# Вместо "удалить все строки и вставить заново" таблица сравнивается с новым
+# списком строк по ключу (iid строки): изменившиеся строки обновляются,
+# переставленные - перемещаются, лишние удаляются, новые вставляются.
+# Строки, которые не изменились, Tk не трогает, поэтому таблица не мерцает
+# и сохраняет выделение и прокрутку.
+#
+# VirtualTable поверх этого показывает в Treeview только видимое окно большой
+# серверной таблицы: строки подгружаются страницами по мере прокрутки, а
+# загруженные страницы хранятся в ограниченном LRU-кэше.
+from collections import OrderedDict
+
+
+class TableReconciler:
+    """Синхронизация строк Treeview со списком (ключ, значения, теги)"""
+
+    def __init__(self, tree, parent=""):
+        self.tree = tree
+        self.parent = parent
+        # Последние записанные значения: ключ -> (values, tags)
+        self.rows = {}
+
+    def update(self, rows):
+        """Приведение таблицы к rows: [(key, values, tags), ...] в нужном порядке.
+
+        Возвращает число вызовов Tk, изменивших таблицу.
+        """
+        tree = self.tree
+        wanted = {}
+        for key, values, tags in rows:
+            wanted[str(key)] = (tuple(values), tuple(tags or ()))
+
+        changes = 0
+        current = list(tree.get_children(self.parent))
+        obsolete = [iid for iid in current if iid not in wanted]
+        if obsolete:
+            tree.delete(*obsolete)
+            changes += 1
+            current = [iid for iid in current if iid in wanted]
+        # Строки могли удалить в обход (например, tree.delete после запроса)
+        self.rows = {iid: row for iid, row in self.rows.items() if iid in wanted and tree.exists(iid)}
+
+        # Строки до index уже стоят на своих местах, поэтому достаточно
+        # сравнить ключ с тем, что сейчас стоит на позиции index
+        present = set(current)
+        for index, (key, row) in enumerate(wanted.items()):
+            values, tags = row
+            if key not in present:
+                tree.insert(self.parent, index, iid=key, values=values, tags=tags)
+                current.insert(index, key)
+                changes += 1
+            else:
+                if self.rows.get(key) != row:
+                    tree.item(key, values=values, tags=tags)
+                    changes += 1
+                if current[index] != key:
+                    tree.move(key, self.parent, index)
+                    current.remove(key)
+                    current.insert(index, key)
+                    changes += 1
+            self.rows[key] = row
+
+        return changes
+
+    def clear(self):
+        children = self.tree.get_children(self.parent)
+        if children:
+            self.tree.delete(*children)
+        self.rows = {}
+
+
+class VirtualTable:
+    """Виртуальная прокрутка таблицы, данные которой лежат на сервере"""
+
+    def __init__(self, tree, scrollbar, load_page, make_row, page_size=50, max_pages=20):
+        """load_page(offset, limit, callback, fresh) - асинхронная загрузка страницы,
+        callback(items, total) вызывается в главном потоке (items=None при ошибке);
+        fresh=True - после refresh(), данные нужны в обход кэша ответов.
+        make_row(index, item) -> (ключ, значения, теги) для строки index.
+        """
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.load_page = load_page
+        self.make_row = make_row
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.table = TableReconciler(tree)
+
+        self.total = 0
+        self.first = 0
+        # Номер страницы -> (поколение, строки), порядок - от давно использованных
+        self.pages = OrderedDict()
+        self.loading = set()
+        # reset() отбрасывает ответы на старые запросы, refresh() лишь помечает страницы устаревшими
+        self.epoch = 0
+        self.generation = 0
+        # Поколение на момент reset(): страницы более новых поколений загружаются после refresh()
+        self.reset_generation = 0
+        self.highlight_key = None
+
+        scrollbar.configure(command=self.on_scroll)
+        tree.bind("<MouseWheel>", self.on_mouse_wheel)
+        tree.bind("<Button-4>", lambda event: self.scroll_by(-3))
+        tree.bind("<Button-5>", lambda event: self.scroll_by(3))
+
+    @property
+    def visible_rows(self):
+        return max(1, int(self.tree.cget('height')))
+
+    def reset(self):
+        """Полная перезагрузка (например, при смене сортировки)"""
+        self.epoch += 1
+        self.reset_generation = self.generation
+        self.pages.clear()
+        self.loading.clear()
+        self.first = 0
+        self.highlight_key = None
+        self.render()
+
+    def refresh(self):
+        """Перезагрузка видимых страниц без сброса позиции и мерцания"""
+        self.generation += 1
+        self.render()
+
+    def scroll_to(self, index, key=None):
+        """Переход к строке index (с 0) и ее выделение по ключу"""
+        self.first = max(0, index - self.visible_rows // 2)
+        self.highlight_key = str(key) if key is not None else None
+        self.render()
+
+    def scroll_by(self, rows):
+        self.first += rows
+        self.render()
+        return "break"
+
+    def on_mouse_wheel(self, event):
+        return self.scroll_by(-3 if event.delta > 0 else 3)
+
+    def on_scroll(self, *args):
+        """Команда полосы прокрутки: moveto <доля> или scroll <n> units|pages"""
+        if args[0] == 'moveto':
+            self.first = int(float(args[1]) * self.total)
+        elif args[0] == 'scroll':
+            step = self.visible_rows if args[2] == 'pages' else 1
+            self.first += int(args[1]) * step
+        self.render()
+
+    def cached_items(self):
+        """Все загруженные строки по порядку: [(индекс, данные)]"""
+        items = []
+        for page in sorted(self.pages):
+            start = page * self.page_size
+            items.extend(enumerate(self.pages[page][1], start))
+        return items
+
+    def render(self):
+        """Отрисовка видимого окна и подгрузка недостающих страниц"""
+        self.first = max(0, min(self.first, self.total - self.visible_rows))
+        last = min(self.total, self.first + self.visible_rows)
+
+        # Пока размер неизвестен (total = 0), запрашивается первая страница
+        first_page = self.first // self.page_size
+        last_page = max(first_page, (last - 1) // self.page_size)
+        for page in range(first_page, last_page + 1):
+            self.request_page(page)
+
+        rows = []
+        for index in range(self.first, last):
+            page = self.pages.get(index // self.page_size)
+            items = page[1] if page else []
+            offset = index % self.page_size
+            if offset < len(items):
+                rows.append(self.make_row(index, items[offset]))
+            else:
+                rows.append((f"__loading_{index}", (index + 1, "…"), ()))
+
+        self.table.update(rows)
+        if self.total:
+            self.scrollbar.set(self.first / self.total, last / self.total)
+        else:
+            self.scrollbar.set(0, 1)
+
+        if self.highlight_key and self.tree.exists(self.highlight_key):
+            self.tree.selection_set(self.highlight_key)
+            self.tree.see(self.highlight_key)
+            self.highlight_key = None
+
+    def request_page(self, page):
+        """Загрузка страницы, если ее нет в кэше или она устарела"""
+        cached = self.pages.get(page)
+        if cached is not None:
+            self.pages.move_to_end(page)
+            if cached[0] == self.generation:
+                return
+        if (page, self.epoch, self.generation) in self.loading:
+            return
+
+        request = (page, self.epoch, self.generation)
+        self.loading.add(request)
+
+        def on_loaded(items, total):
+            self.loading.discard(request)
+            if request[1] != self.epoch or items is None:
+                return
+            self.pages[page] = (request[2], items)
+            self.pages.move_to_end(page)
+            while len(self.pages) > self.max_pages:
+                self.pages.popitem(last=False)
+            self.total = total if total is not None else max(self.total, page * self.page_size + len(items))
+            self.render()
+
+        self.load_page(page * self.page_size, self.page_size, on_loaded,
+                       self.generation != self.reset_generation)
+
+    @property
+    def is_loading(self):
+        return bool(self.loading)
@@ -0,0 +1,48 @@
+import math
+import random
+
+import pytest
+
+from downsample import lttb_indices
+
+
+def series(size, seed=1):
+    rng = random.Random(seed)
+    elo = 1000
+    ys = []
+    for _ in range(size):
+        elo += rng.randint(-30, 30)
+        ys.append(elo)
+    return list(range(size)), ys
+
+
+@pytest.mark.parametrize('size, threshold', [(1000, 100), (1000, 3), (101, 50), (5000, 400), (10, 9)])
+def test_count_and_endpoints(size, threshold):
+    xs, ys = series(size)
+    selected = lttb_indices(xs, ys, threshold)
+    assert len(selected) == threshold
+    assert selected[0] == 0
+    assert selected[-1] == size - 1
+    # Индексы строго возрастают и не повторяются
+    assert all(a < b for a, b in zip(selected, selected[1:]))
+
+
+@pytest.mark.parametrize('size, threshold', [(0, 10), (1, 10), (5, 5), (5, 10), (100, 2), (100, 0)])
+def test_short_series_is_kept(size, threshold):
+    xs, ys = series(size)
+    assert lttb_indices(xs, ys, threshold) == list(range(size))
+
+
+def test_peak_is_kept():
+    xs = list(range(1000))
+    ys = [math.sin(x / 50) for x in xs]
+    ys[437] = 100
+    assert 437 in lttb_indices(xs, ys, 50)
+
+
+def test_non_contiguous_x():
+    xs = [x * x for x in range(200)]
+    ys = [x % 7 for x in range(200)]
+    selected = lttb_indices(xs, ys, 20)
+    assert len(selected) == 20
+    assert selected[0] == 0 and selected[-1] == 199
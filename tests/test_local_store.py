@@ -0,0 +1,92 @@
+import json
+
+from local_store import LocalStore, SNAPSHOT_SEQ_KEY
+
+
+def default_stats():
+    return {'elo': 1050, 'matches': 0, 'match_details': []}
+
+
+def add_match(store, stats, match_id, elo):
+    stats['match_details'].append({'match_id': match_id, 'elo_after': elo})
+    stats['elo'] = elo
+    stats['matches'] += 1
+    store.append_match(stats, stats['match_details'][-1])
+
+
+def test_journal_replay(tmp_path):
+    path = str(tmp_path / 'local.json')
+    store = LocalStore(path)
+    stats = store.load(default_stats())
+    for i in range(3):
+        add_match(store, stats, f'm{i}', 1060 + i)
+    store.append_patch(stats, {'m1': {'seq': 7}})
+
+    loaded = LocalStore(path).load(default_stats())
+    assert [m['match_id'] for m in loaded['match_details']] == ['m0', 'm1', 'm2']
+    assert loaded['match_details'][1]['seq'] == 7
+    assert loaded['elo'] == 1062
+    assert loaded['matches'] == 3
+
+
+def test_truncated_last_line_is_ignored(tmp_path):
+    path = str(tmp_path / 'local.json')
+    store = LocalStore(path)
+    stats = store.load(default_stats())
+    add_match(store, stats, 'm0', 1060)
+    add_match(store, stats, 'm1', 1070)
+
+    # Сбой посреди записи последней строки
+    with open(store.journal_path, 'r+', encoding='utf-8') as f:
+        content = f.read()
+        f.seek(0)
+        f.truncate()
+        f.write(content[:-15])
+
+    loaded = LocalStore(path).load(default_stats())
+    assert [m['match_id'] for m in loaded['match_details']] == ['m0']
+    assert loaded['elo'] == 1060
+
+
+def test_compaction(tmp_path):
+    path = str(tmp_path / 'local.json')
+    store = LocalStore(path, compact_every=5)
+    stats = store.load(default_stats())
+    for i in range(12):
+        add_match(store, stats, f'm{i}', 1000 + i)
+
+    # Два сворачивания: в журнале остались только записи после последнего снимка
+    with open(store.journal_path, encoding='utf-8') as f:
+        assert len(f.readlines()) == 2
+    with open(path, encoding='utf-8') as f:
+        assert json.load(f)[SNAPSHOT_SEQ_KEY] == 10
+
+    loaded = LocalStore(path).load(default_stats())
+    assert len(loaded['match_details']) == 12
+    assert loaded['elo'] == 1011
+
+
+def test_records_already_in_snapshot_are_skipped(tmp_path):
+    path = str(tmp_path / 'local.json')
+    store = LocalStore(path)
+    stats = store.load(default_stats())
+    add_match(store, stats, 'm0', 1060)
+    with open(store.journal_path, encoding='utf-8') as f:
+        journal = f.read()
+
+    # Сбой между заменой снимка и очисткой журнала
+    store.save(stats)
+    with open(store.journal_path, 'w', encoding='utf-8') as f:
+        f.write(journal)
+
+    loaded = LocalStore(path).load(default_stats())
+    assert [m['match_id'] for m in loaded['match_details']] == ['m0']
+
+
+def test_old_format_is_migrated(tmp_path):
+    path = tmp_path / 'local.json'
+    path.write_text(json.dumps({'elo': 1200, 'match_details': []}, indent=4), encoding='utf-8')
+
+    loaded = LocalStore(str(path)).load(default_stats())
+    assert loaded['elo'] == 1200
+    assert json.loads(path.read_text(encoding='utf-8'))[SNAPSHOT_SEQ_KEY] == 0
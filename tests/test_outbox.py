@@ -0,0 +1,61 @@
+from outbox import Outbox
+from server import GameServer
+
+
+def test_pending_keeps_order_across_restart(tmp_path):
+    path = str(tmp_path / 'outbox.jsonl')
+    outbox = Outbox(path)
+    keys = [outbox.add({'action': 'send_message', 'message_text': str(i)})['idempotency_key']
+            for i in range(5)]
+    outbox.done(keys[1])
+
+    reloaded = Outbox(path)
+    assert [r['message_text'] for r in reloaded.pending()] == ['0', '2', '3', '4']
+    assert [r['idempotency_key'] for r in reloaded.pending()] == [keys[0]] + keys[2:]
+
+
+def test_same_key_is_queued_once(tmp_path):
+    outbox = Outbox(str(tmp_path / 'outbox.jsonl'))
+    request = outbox.add({'action': 'send_message'})
+    outbox.add(request)
+    assert len(outbox) == 1
+    assert len(Outbox(outbox.path)) == 1
+
+
+def test_torn_line_is_dropped(tmp_path):
+    path = tmp_path / 'outbox.jsonl'
+    outbox = Outbox(str(path))
+    outbox.add({'action': 'a'})
+    outbox.add({'action': 'b'})
+    path.write_text(path.read_text(encoding='utf-8')[:-10], encoding='utf-8')
+
+    reloaded = Outbox(str(path))
+    assert [r['action'] for r in reloaded.pending()] == ['a']
+    # Новые записи не приклеиваются к оборванной строке
+    reloaded.add({'action': 'c'})
+    assert [r['action'] for r in Outbox(str(path)).pending()] == ['a', 'c']
+
+
+def test_file_is_emptied_when_all_done(tmp_path):
+    path = tmp_path / 'outbox.jsonl'
+    outbox = Outbox(str(path))
+    key = outbox.add({'action': 'a'})['idempotency_key']
+    outbox.done(key)
+    assert path.read_text(encoding='utf-8') == ''
+
+
+def test_replayed_request_is_executed_once(tmp_path):
+    game = GameServer(str(tmp_path / 'server.db'))
+    for nickname in ('a', 'b'):
+        game.handle({'action': 'register', 'nickname': nickname, 'password': 'pw'})
+    outbox = Outbox(str(tmp_path / 'outbox.jsonl'))
+    request = outbox.add({'action': 'send_message', 'sender_nickname': 'a',
+                          'receiver_nickname': 'b', 'message_text': 'привет'})
+
+    # Ответ на первую отправку потерялся - запрос отправляется повторно
+    first = game.handle(request)
+    second = game.handle(outbox.pending()[0])
+    assert first == second
+    messages = game.handle({'action': 'get_chat_messages', 'player1_nickname': 'a',
+                            'player2_nickname': 'b'})['messages']
+    assert [m['text'] for m in messages] == ['привет']
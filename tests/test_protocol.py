@@ -0,0 +1,88 @@
+import socket
+import zlib
+
+import pytest
+
+import protocol
+from protocol import (FLAG_COLUMNAR, FLAG_JSON, FLAG_ZLIB, HEADER, COMPRESS_THRESHOLD, ProtocolError,
+                      decode_body, encode_message, from_columnar, parse_header, recv_message,
+                      send_message, to_columnar)
+
+MESSAGE = {
+    'success': True,
+    'leaderboard': [{'nickname': f'player{i}', 'elo': 1000 + i, 'level': None} for i in range(300)],
+    'text': 'Привет',
+}
+
+
+def decode_frame(frame):
+    length, flags = parse_header(frame[:HEADER.size])
+    body = frame[HEADER.size:]
+    assert len(body) == length
+    return decode_body(body, flags), flags
+
+
+@pytest.mark.parametrize('flags', [FLAG_JSON, FLAG_COLUMNAR, FLAG_JSON | FLAG_ZLIB, FLAG_COLUMNAR | FLAG_ZLIB])
+def test_frame_round_trip(flags):
+    data, frame_flags = decode_frame(encode_message(MESSAGE, flags))
+    assert data == MESSAGE
+    assert frame_flags == flags
+
+
+def test_small_body_is_not_compressed():
+    frame = encode_message({'action': 'ping'}, FLAG_JSON | FLAG_ZLIB)
+    assert len(frame) - HEADER.size < COMPRESS_THRESHOLD
+    assert decode_frame(frame) == ({'action': 'ping'}, FLAG_JSON)
+
+
+def test_socket_round_trip():
+    left, right = socket.socketpair()
+    try:
+        send_message(left, MESSAGE, FLAG_COLUMNAR | FLAG_ZLIB)
+        send_message(left, {'action': 'ping'})
+        assert recv_message(right) == MESSAGE
+        assert recv_message(right) == {'action': 'ping'}
+    finally:
+        left.close()
+        right.close()
+
+
+@pytest.mark.parametrize('value', [
+    {'$c': ['a'], '$r': [[1]]},
+    {'$e': {'x': 1}},
+    [{'$c': 1, '$r': 2}, {'$c': 3, '$r': 4}],
+    {'rows': [{'a': 1, 'b': [{'c': 1}, {'c': 2}]}, {'a': 2, 'b': []}]},
+    [{'a': 1}, {'b': 2}],
+    [],
+])
+def test_columnar_round_trip(value):
+    assert from_columnar(to_columnar(value)) == value
+
+
+def test_columnar_sends_keys_once():
+    encoded = to_columnar([{'a': 1, 'b': 2}, {'a': 3, 'b': 4}])
+    assert encoded == {'$c': ['a', 'b'], '$r': [[1, 2], [3, 4]]}
+
+
+def test_oversized_frame_header_rejected():
+    with pytest.raises(ProtocolError):
+        parse_header(HEADER.pack(protocol.MAX_FRAME_SIZE + 1, FLAG_JSON))
+
+
+def test_zlib_bomb_rejected(monkeypatch):
+    monkeypatch.setattr(protocol, 'MAX_FRAME_SIZE', 1024)
+    bomb = zlib.compress(b'[' + b'0,' * 10000 + b'0]')
+    with pytest.raises(ProtocolError):
+        decode_body(bomb, FLAG_JSON | FLAG_ZLIB)
+
+
+@pytest.mark.parametrize('body, flags', [
+    (zlib.compress(b'{"a":1}')[:-4], FLAG_JSON | FLAG_ZLIB),
+    (b'not zlib', FLAG_JSON | FLAG_ZLIB),
+    (b'{"a":', FLAG_JSON),
+    (b'\xff\xfe', FLAG_JSON),
+    (b'{}', 0x05),
+])
+def test_malformed_body_rejected(body, flags):
+    with pytest.raises(ProtocolError):
+        decode_body(body, flags)
@@ -0,0 +1,58 @@
+import bisect
+import random
+
+import pytest
+
+from rank_index import IndexableSkipList, RankIndex
+
+
+def test_skip_list_matches_sorted_list():
+    rng = random.Random(1)
+    skip_list = IndexableSkipList()
+    expected = []
+    for _ in range(2000):
+        key = rng.randint(0, 500)
+        if key in expected and rng.random() < 0.5:
+            skip_list.remove(key)
+            expected.remove(key)
+        elif key not in expected:
+            skip_list.insert(key)
+            bisect.insort(expected, key)
+
+    assert len(skip_list) == len(expected)
+    assert [skip_list[i] for i in range(len(skip_list))] == expected
+    for key in expected:
+        assert skip_list.rank(key) == bisect.bisect_left(expected, key)
+    # Ранг отсутствующего ключа - число меньших
+    assert skip_list.rank(-1) == 0
+    assert skip_list.rank(10 ** 6) == len(expected)
+
+
+def test_skip_list_index_out_of_range():
+    skip_list = IndexableSkipList()
+    skip_list.insert(1)
+    with pytest.raises(IndexError):
+        skip_list[1]
+    with pytest.raises(IndexError):
+        skip_list[-1]
+
+
+def test_rank_index_order_and_window():
+    index = RankIndex(('elo', 'wins'))
+    players = {'a': {'elo': 1200, 'wins': 5}, 'b': {'elo': 1500, 'wins': 5},
+               'c': {'elo': 1200, 'wins': 9}, 'd': {'elo': 900, 'wins': 1}}
+    for nickname, values in players.items():
+        index.update(nickname, values)
+
+    # ORDER BY поле DESC, nickname
+    assert index.window('elo', 0, 10) == ['b', 'a', 'c', 'd']
+    assert index.window('wins', 1, 3) == ['a', 'b']
+    assert index.rank('elo', 'c') == 2
+    assert index.nickname_at('wins', 0) == 'c'
+
+    index.update('d', {'elo': 2000, 'wins': 1})
+    assert index.rank('elo', 'd') == 0
+    index.update('b', None)
+    assert index.rank('elo', 'b') is None
+    assert len(index) == 3
+    assert index.window('elo', -5, 100) == ['d', 'a', 'c']